@@ -1,11 +1,17 @@
+# STARTUP_PROFILE=true: time every import below and the create_app phases (printed once ready)
+from app.observability import startup
+startup.enable_from_env()
+
 import os
 from flask import Flask, redirect, url_for, session
 from config import Config
-from app.firebase.firebase_admin import FirebaseLoader
+from app.registry import ClientRegistry
 from whitenoise import WhiteNoise
+from flask_compress import Compress
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 def create_app(config_class=Config):
+    startup.mark("imports (app package)")
     app = Flask(__name__,
                 static_folder='static',
                 template_folder='templates')
@@ -19,10 +25,43 @@ def create_app(config_class=Config):
     # The root should point to where your 'static' folder is located
     app.wsgi_app = WhiteNoise(app.wsgi_app, root='app/static/', prefix='static/')
 
-    # Initialize Firebase
-    FirebaseLoader.get_instance(
-        app.config['FIREBASE_SERVICE_ACCOUNT']
-    )
+    # 3. COMPRESSION: br/gzip for HTML and JSON responses above COMPRESS_MIN_SIZE
+    Compress(app)
+    startup.mark("flask + middleware")
+
+    # 4. OBSERVABILITY: trace id per request, request timings and structured request logs
+    from app.observability import tracing
+    tracing.init_app(app)
+
+    # LLM response cache shared by the Outline/Content/Category agents
+    from app.llm.cache import LLMCache
+    LLMCache.configure(app.config)
+
+    # Rate limit, retries and circuit breaker around every Gemini call
+    from app.llm.gateway import LLMGateway
+    LLMGateway.configure(app.config)
+
+    # Event loop that async generation jobs and streams await Gemini on (started on first use)
+    from app.llm.event_loop import EventLoopThread
+    EventLoopThread.configure(app.config)
+    startup.mark("llm cache + gateway")
+
+    # Firebase + Gemini clients, shared by the whole process (created on first use)
+    registry = ClientRegistry.configure(app.config)
+    app.extensions['registry'] = registry
+    if app.config['WARMUP_ON_START']:
+        registry.warm_up_in_background()
+
+    # Local nearest-centroid categorizer (snapshot or trained from Firestore, off the startup path)
+    from app.ml.categorizer import LocalCategorizer
+    categorizer = LocalCategorizer.configure(app.config, registry.db_service)
+    registry.after_storage_use(categorizer.load_in_background, "categorizer-start")
+
+    # Full-text search index (snapshot + catch-up, or built from Firestore, off the startup path)
+    from app.search.index import SearchIndex
+    search_index = SearchIndex.configure(app.config, registry.db_service)
+    registry.after_storage_use(search_index.load_in_background, "search-index-start")
+    startup.mark("registry + categorizer + search index")
 
     @app.route('/')
     def index():
@@ -36,5 +75,26 @@ def create_app(config_class=Config):
 
     from app.routes.auth import auth_bp
     app.register_blueprint(auth_bp)
-        
+    startup.mark("blueprints")
+
+    if app.config['METRICS_ENABLED']:
+        from app.observability.instrument import register_gauges
+        register_gauges()
+        from app.routes.metrics import metrics_bp
+        app.register_blueprint(metrics_bp)
+
+    # Maintenance commands (flask reconcile-stats, ...)
+    from app.cli import register_commands
+    register_commands(app)
+
+    # Background generation workers (also picks up jobs left over by a restart)
+    from app.jobs.job_queue import JobQueue
+    registry.after_storage_use(JobQueue.get_instance(app).resume_unfinished, "job-resume")
+
+    from app.jobs.batch_runner import BatchRunner
+    registry.after_storage_use(BatchRunner.get_instance(app).resume_unfinished, "batch-resume")
+    startup.mark("metrics, cli, job queues")
+
+    if app.config['STARTUP_PROFILE']:
+        startup.report()
     return app
\ No newline at end of file
@@ -1,8 +1,8 @@
-from app.firebase.firestore_service import FirestoreService
+from app.registry import ClientRegistry
 
 class ApprovalAgent:
-    def __init__(self):
-        self.db_service = FirestoreService()
+    def __init__(self, db_service=None):
+        self.db_service = db_service or ClientRegistry.get_instance().db_service
 
     def create_initial_review(self, blog_data, user_id):
         """
@@ -1,26 +1,57 @@
+import asyncio
+import copy
+
+from flask import current_app
+
 from app.agents.outline_agent import OutlineAgent
 from app.agents.content_agent import ContentAgent
+from app.jobs.single_flight import AsyncSingleFlight, SingleFlight
+from app.llm.event_loop import EventLoopThread
+from app.observability.instrument import stage
+
+# Pipelines currently running in this process, keyed by model + normalized prompt
+_pipelines = SingleFlight()
+# The same for pipelines awaited on the event loop (app/llm/event_loop.py)
+_async_pipelines = AsyncSingleFlight()
+
+
+async def _notify(on_stage, name):
+    # Stage callbacks write to storage: keep them off the event loop
+    if on_stage:
+        await asyncio.to_thread(on_stage, name)
 
 
 class BlogAgent:
-    def __init__(self):
-        self.outline_agent = OutlineAgent()
-        self.content_agent = ContentAgent()
+    def __init__(self, force_fresh=False, model=None):
+        # force_fresh: bypass the LLM response cache for this run
+        self.force_fresh = force_fresh
+        self.outline_agent = OutlineAgent(force_fresh=force_fresh, model=model)
+        self.content_agent = ContentAgent(force_fresh=force_fresh, model=model)
 
-    def run_pipeline(self, user_prompt):
+    def run_pipeline(self, user_prompt, on_stage=None):
+        """
+        Runs outline + content generation.
+        on_stage: optional callback, called with the stage name as the pipeline advances.
+        """
         print(f"--- Starting Full AI Pipeline ---")
         
         try:
             # Step 1: Generate Outline
             print("Generating Outline...")
-            outline = self.outline_agent.generate_outline(user_prompt)
+            if on_stage:
+                on_stage("OUTLINE")
+            with stage("outline"):
+                outline = self.outline_agent.generate_outline(user_prompt)
             
             if not outline or not isinstance(outline, list):
                 raise ValueError("Outline generation failed or returned empty data.")
 
             # Step 2: Generate Full Content
             print("Expanding into Full Blog...")
-            content_data = self.content_agent.generate_full_blog(outline)
+            if on_stage:
+                on_stage("CONTENT")
+            with stage("content"):
+                content_data = self.content_agent.generate_full_blog(outline)
             
             if not content_data or 'markdown' not in content_data:
                 raise KeyError("Content agent failed to return 'markdown' data.")
@@ -28,19 +59,61 @@ class BlogAgent:
 
             # Step 4: Package for Firestore
             print("Packaging data...")
-            markdown_text = content_data['markdown']
-            word_count = len(markdown_text.split())
-            
+            return self.package(user_prompt, outline, content_data)
+
+        except (IndexError, KeyError, ValueError) as e:
+            print(f"❌ Pipeline Error: {e}")
             return {
-                "title": user_prompt.title(),
-                "outline": outline,
-                "content": content_data,
-                "metadata": {
-                    "word_count": word_count,
-                    "model_used": "gemini-3-flash",
-                    "status": "success"
-                }
+                "error": str(e),
+                "status": "failed",
+                "partial_outline": outline if 'outline' in locals() else None
             }
+        except Exception as e:
+            print(f"❌ Unexpected Error: {e}")
+            return {"error": "An unexpected system error occurred.", "status": "failed"}
+
+    def run_pipeline_shared(self, user_prompt, on_stage=None):
+        """
+        run_pipeline, except that concurrent calls for the same prompt in
+        this process share one run. Every caller gets its own copy of the
+        result (callers go on to mutate it while saving).
+        force_fresh runs always generate on their own.
+        """
+        if self.force_fresh:
+            return self.run_pipeline(user_prompt, on_stage=on_stage)
+
+        key = (self.content_agent.model.model_name, " ".join(user_prompt.lower().split()))
+        result, shared = _pipelines.do(
+            key, lambda stage_cb: self.run_pipeline(user_prompt, on_stage=stage_cb), on_stage
+        )
+        if shared:
+            print(f"--- Joined in-flight pipeline for '{user_prompt}' ---")
+        return copy.deepcopy(result)
+
+    async def run_pipeline_async(self, user_prompt, on_stage=None):
+        """
+        run_pipeline for coroutines on the event loop: the Gemini calls are
+        awaited, so a generation holds no thread while it waits. on_stage
+        is a plain function (run in a thread). Cancellation is not caught.
+        """
+        print(f"--- Starting Full AI Pipeline (async) ---")
+
+        try:
+            await _notify(on_stage, "OUTLINE")
+            with stage("outline"):
+                outline = await self.outline_agent.generate_outline_async(user_prompt)
+
+            if not outline or not isinstance(outline, list):
+                raise ValueError("Outline generation failed or returned empty data.")
+
+            await _notify(on_stage, "CONTENT")
+            with stage("content"):
+                content_data = await self.content_agent.generate_full_blog_async(outline)
+
+            if not content_data or 'markdown' not in content_data:
+                raise KeyError("Content agent failed to return 'markdown' data.")
+
+            return self.package(user_prompt, outline, content_data)
 
         except (IndexError, KeyError, ValueError) as e:
             print(f"❌ Pipeline Error: {e}")
@@ -51,4 +124,89 @@ class BlogAgent:
             }
         except Exception as e:
             print(f"❌ Unexpected Error: {e}")
-            return {"error": "An unexpected system error occurred.", "status": "failed"}
\ No newline at end of file
+            return {"error": "An unexpected system error occurred.", "status": "failed"}
+
+    async def run_pipeline_shared_async(self, user_prompt, on_stage=None):
+        """run_pipeline_shared for coroutines: identical prompts in flight share one run."""
+        if self.force_fresh:
+            return await self.run_pipeline_async(user_prompt, on_stage=on_stage)
+
+        key = (self.content_agent.model.model_name, " ".join(user_prompt.lower().split()))
+        result, shared = await _async_pipelines.do(
+            key, lambda stage_cb: self.run_pipeline_async(user_prompt, on_stage=stage_cb), on_stage
+        )
+        if shared:
+            print(f"--- Joined in-flight pipeline for '{user_prompt}' ---")
+        return copy.deepcopy(result)
+
+    def package(self, user_prompt, outline, content_data):
+        """Builds the blog document that DraftsAgent saves."""
+        markdown_text = content_data['markdown']
+        word_count = len(markdown_text.split())
+
+        return {
+            "title": user_prompt.title(),
+            "outline": outline,
+            "content": content_data,
+            "metadata": {
+                "word_count": word_count,
+                "model_used": "gemini-3-flash",
+                "status": "success"
+            }
+        }
+
+    def stream_pipeline(self, user_prompt):
+        """
+        Streaming variant of run_pipeline. Yields events as dicts:
+        {"type": "stage"}, {"type": "chunk", "text": ...} while the content
+        is written, then a final {"type": "result", "data": <blog document>}.
+        Errors are raised to the caller.
+        With GENERATION_ASYNC the calls run on the event loop, and closing
+        this generator (the client went away) cancels them.
+        """
+        if current_app.config['GENERATION_ASYNC']:
+            yield from EventLoopThread.get_instance().iterate(self.stream_pipeline_async(user_prompt))
+            return
+
+        yield {"type": "stage", "stage": "OUTLINE"}
+        with stage("outline"):
+            outline = self.outline_agent.generate_outline(user_prompt)
+        if not outline or not isinstance(outline, list):
+            raise ValueError("Outline generation failed or returned empty data.")
+
+        yield {"type": "stage", "stage": "CONTENT"}
+        parts = []
+        # Includes the time the client takes to read the chunks
+        with stage("content_stream"):
+            for text in self.content_agent.stream_full_blog(outline):
+                parts.append(text)
+                yield {"type": "chunk", "text": text}
+
+        markdown_text = "".join(parts)
+        if not markdown_text.strip():
+            raise ValueError("Content generation returned no text.")
+
+        content_data = self.content_agent.package(markdown_text)
+        yield {"type": "result", "data": self.package(user_prompt, outline, content_data)}
+
+    async def stream_pipeline_async(self, user_prompt):
+        """Async counterpart of stream_pipeline (same events)."""
+        yield {"type": "stage", "stage": "OUTLINE"}
+        with stage("outline"):
+            outline = await self.outline_agent.generate_outline_async(user_prompt)
+        if not outline or not isinstance(outline, list):
+            raise ValueError("Outline generation failed or returned empty data.")
+
+        yield {"type": "stage", "stage": "CONTENT"}
+        parts = []
+        with stage("content_stream"):
+            async for text in self.content_agent.stream_full_blog_async(outline):
+                parts.append(text)
+                yield {"type": "chunk", "text": text}
+
+        markdown_text = "".join(parts)
+        if not markdown_text.strip():
+            raise ValueError("Content generation returned no text.")
+
+        content_data = self.content_agent.package(markdown_text)
+        yield {"type": "result", "data": self.package(user_prompt, outline, content_data)}
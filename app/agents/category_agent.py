@@ -1,23 +1,80 @@
-import google.generativeai as genai
-import os
-from app.firebase.firestore_service import FirestoreService
+import asyncio
+from flask import current_app
+from app.llm.cache import generate_text, generate_text_async
+from app.ml.categorizer import LocalCategorizer
+from app.registry import ClientRegistry
 
 class CategoryAgent:
-    def __init__(self):
-        self.db_service = FirestoreService()
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-3-flash-preview')
+    def __init__(self, force_fresh=False, model=None, db_service=None):
+        # Shared clients come from the registry unless injected
+        registry = ClientRegistry.get_instance() if model is None or db_service is None else None
+        self.db_service = db_service or registry.db_service
+        self.model = model or registry.model()
+        self.force_fresh = force_fresh  # Skip the LLM response cache
+        self.threshold = current_app.config['CATEGORIZER_THRESHOLD']
+        self.top_k = current_app.config['CATEGORIZER_TOP_K']
 
     def categorize_blog(self, title, content_body):
         """Analyzes context and returns a single category name."""
-        # 1. Fetch current categories to maintain consistency
+        category, _, _ = self.categorize_with_confidence(title, content_body)
+        return category
+
+    def categorize_with_confidence(self, title, content_body):
+        """
+        Returns (category, confidence, source). The local nearest-centroid
+        classifier decides when its best similarity reaches the threshold;
+        otherwise the LLM picks from the top-k local candidates (or creates
+        a new category). confidence is the local similarity of the answer.
+        """
+        # 1. Local classifier
+        candidates, existing_cats = self._local_candidates(title, content_body)
+        if candidates and candidates[0][1] >= self.threshold:
+            return candidates[0][0], round(candidates[0][1], 3), "local"
+
+        # 2. LLM fallback
+        prompt = self._build_prompt(title, content_body, candidates, existing_cats)
+        try:
+            category = generate_text(self.model, prompt, "category", bypass=self.force_fresh).strip()
+            confidence = dict(candidates).get(category, 0.0)
+            return category, round(confidence, 3), "llm"
+        except Exception as e:
+            print(f"❌ CategoryAgent Error: {e}")
+            return "General", 0.0, "fallback"
+
+    async def categorize_with_confidence_async(self, title, content_body):
+        """categorize_with_confidence for coroutines: the LLM fallback is awaited on the event loop."""
+        # Category list and local scoring may read storage: off the loop's thread
+        candidates, existing_cats = await asyncio.to_thread(self._local_candidates, title, content_body)
+        if candidates and candidates[0][1] >= self.threshold:
+            return candidates[0][0], round(candidates[0][1], 3), "local"
+
+        prompt = self._build_prompt(title, content_body, candidates, existing_cats)
+        try:
+            category = (await generate_text_async(self.model, prompt, "category", bypass=self.force_fresh)).strip()
+            confidence = dict(candidates).get(category, 0.0)
+            return category, round(confidence, 3), "llm"
+        except Exception as e:
+            print(f"❌ CategoryAgent Error: {e}")
+            return "General", 0.0, "fallback"
+
+    def _local_candidates(self, title, content_body):
+        """([(name, similarity)] from the local classifier, existing category names)."""
+        # Restricted to categories that still exist
         existing_cats = [cat['name'] for cat in self.db_service.get_all_categories()]
-        
-        prompt = f"""
+        candidates = LocalCategorizer.get_instance().predict(
+            title, content_body, top_k=self.top_k, allowed=set(existing_cats)
+        )
+        return candidates, existing_cats
+
+    def _build_prompt(self, title, content_body, candidates, existing_cats):
+        # Only the top-k candidates go into the prompt
+        # (every category while the local classifier has nothing to offer)
+        offered = [name for name, _ in candidates] or existing_cats
+        return f"""
         Role: Senior Content Taxonomist.
         Task: Categorize the following blog post.
         
-        Existing Categories: {', '.join(existing_cats) if existing_cats else 'None'}
+        Existing Categories: {', '.join(offered) if offered else 'None'}
 
         Blog Title: {title}
         Blog Content: {content_body[:1500]}
@@ -27,10 +84,3 @@ class CategoryAgent:
         2. If none fit, create a new, professional 1-2 word category.
         3. Return ONLY the category name. No quotes, no explanation.
         """
-
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            print(f"❌ CategoryAgent Error: {e}")
-            return "General"
\ No newline at end of file
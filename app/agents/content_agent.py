@@ -1,28 +1,218 @@
-import google.generativeai as genai
 from flask import current_app
+from app.llm.cache import generate_text, generate_text_async, stream_text, stream_text_async
+from app.firebase.blog_content import render_html
+from app.registry import ClientRegistry
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+
+# Shared by every section prompt so that parallel sections read as one post
+STYLE_GUIDE = (
+    "Tone: confident, friendly expert writing for busy professionals. "
+    "Voice: second person ('you'), active sentences, no filler. "
+    "Formatting: Markdown, bold text for emphasis and bullet points for readability."
+)
 
 class ContentAgent:
-    def __init__(self):
-        genai.configure(api_key=current_app.config['GEMINI_API_KEY'])
-        # Using the stable 2026 identifier for speed and quality
-        self.model = genai.GenerativeModel('gemini-3-flash-preview')
+    # A section passes at this share of its word budget, and the joined post
+    # must reach POST_MIN_SHARE of the target (otherwise the shortest sections are rewritten longer)
+    SECTION_MIN_SHARE = 0.8
+    POST_MIN_SHARE = 0.9
 
-    def generate_full_blog(self, outline):
-        """
-        Expands an outline into a complete blog post.
-        """
-        prompt = (
+    def __init__(self, force_fresh=False, model=None):
+        # Shared model client comes from the registry unless injected
+        self.model = model or ClientRegistry.get_instance().model()
+        self.force_fresh = force_fresh  # Skip the LLM response cache
+
+        # 'single' = one long completion, 'parallel' = one call per outline section
+        self.expansion_mode = current_app.config['CONTENT_EXPANSION_MODE']
+        self.section_workers = current_app.config['CONTENT_SECTION_WORKERS']
+        self.section_retries = current_app.config['CONTENT_SECTION_RETRIES']
+        self.target_words = current_app.config['CONTENT_TARGET_WORDS']
+
+    def _build_prompt(self, outline):
+        return (
             f"You are an expert copywriter. Expand the following outline into a "
-            f"comprehensive, engaging blog post (approx 1200 words). "
+            f"comprehensive, engaging blog post (approx {self.target_words} words). "
             f"Use Markdown for structure, including bold text for emphasis and "
             f"bullet points for readability. \n\nOUTLINE:\n{outline}"
         )
-        
-        response = self.model.generate_content(prompt)
-        
+
+    def package(self, markdown_text):
+        """Wraps generated markdown in the content dict stored with a blog."""
         return {
-    "markdown": response.text,
-    "html": "<article>{}</article>".format(
-        response.text.replace("\n", "<br>")
-    )
-}
+            "markdown": markdown_text,
+            "html": render_html(markdown_text)
+        }
+
+    def generate_full_blog(self, outline):
+        """
+        Expands an outline into a complete blog post.
+        """
+        if self.expansion_mode == "parallel":
+            return self.generate_sections_parallel(outline)
+
+        text = generate_text(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh)
+        return self.package(text)
+
+    async def generate_full_blog_async(self, outline):
+        """generate_full_blog for coroutines on the event loop."""
+        if self.expansion_mode == "parallel":
+            return await self.generate_sections_parallel_async(outline)
+
+        text = await generate_text_async(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh)
+        return self.package(text)
+
+    # ---------------- PARALLEL SECTION EXPANSION ----------------
+
+    def _section_titles(self, outline):
+        """
+        OutlineAgent returns the raw response lines of a JSON list (sometimes
+        wrapped in a ``` fence). Turns that back into clean section titles.
+        """
+        lines = [line for line in outline if not line.strip().startswith("```")]
+        try:
+            parsed = json.loads("\n".join(lines))
+            if isinstance(parsed, list):
+                return [str(item).strip() for item in parsed if str(item).strip()]
+        except ValueError:
+            pass
+
+        titles = []
+        for line in lines:
+            title = line.strip().strip('[],').strip().strip('"').strip("-*# ").strip()
+            if title:
+                titles.append(title)
+        return titles
+
+    def _build_section_prompt(self, titles, index, words):
+        position = "the introduction" if index == 0 else \
+                   "the conclusion" if index == len(titles) - 1 else \
+                   f"section {index + 1} of {len(titles)}"
+        outline_text = "\n".join(f"{i + 1}. {t}" for i, t in enumerate(titles))
+        return (
+            f"You are an expert copywriter writing one blog post together with other writers. "
+            f"Each writer expands one section of the same outline.\n\n"
+            f"FULL OUTLINE:\n{outline_text}\n\n{STYLE_GUIDE}\n\n"
+            f"Write ONLY {position}: \"{titles[index]}\" (approx {words} words). "
+            f"Start with the heading '## {titles[index]}'. Do not repeat other sections "
+            f"and do not add a closing summary unless this is the conclusion."
+        )
+
+    def _expand_section(self, titles, index, words):
+        """
+        Generates one section, asking again when the output is suspiciously short.
+        API errors are not retried here: the gateway already retried the transient ones.
+        """
+        prompt = self._build_section_prompt(titles, index, words)
+        for attempt in range(self.section_retries + 1):
+            # Retries must not be answered with the same (rejected) cached text
+            bypass = self.force_fresh or attempt > 0
+            text = generate_text(self.model, prompt, "content", bypass=bypass).strip()
+            if self._long_enough(titles, index, words, text, attempt):
+                return text
+
+        raise ValueError(f"Section '{titles[index]}' was too short after {self.section_retries + 1} attempts")
+
+    async def _expand_section_async(self, titles, index, words):
+        prompt = self._build_section_prompt(titles, index, words)
+        for attempt in range(self.section_retries + 1):
+            bypass = self.force_fresh or attempt > 0
+            text = (await generate_text_async(self.model, prompt, "content", bypass=bypass)).strip()
+            if self._long_enough(titles, index, words, text, attempt):
+                return text
+
+        raise ValueError(f"Section '{titles[index]}' was too short after {self.section_retries + 1} attempts")
+
+    def _long_enough(self, titles, index, words, text, attempt):
+        if len(text.split()) >= int(words * self.SECTION_MIN_SHARE):
+            return True
+        print(f"⚠️ Section '{titles[index]}' attempt {attempt + 1}: only {len(text.split())} words returned")
+        return False
+
+    def _top_up_plan(self, sections, words):
+        """
+        {index: words} for the shortest sections to rewrite when the joined post
+        falls short of the target, asking each for its share of the missing words.
+        """
+        shortfall = int(self.target_words * self.POST_MIN_SHARE) - sum(len(s.split()) for s in sections)
+        if shortfall <= 0:
+            return {}
+        count = max(1, len(sections) // 2)
+        shortest = sorted(range(len(sections)), key=lambda i: len(sections[i].split()))[:count]
+        return {i: words + -(-shortfall // count) for i in shortest}
+
+    def _join(self, titles, sections, rewrites):
+        """Joins the sections, each replaced by its rewrite when that came back longer."""
+        for index, text in rewrites.items():
+            if isinstance(text, str) and len(text.split()) > len(sections[index].split()):
+                sections[index] = text
+        total = sum(len(s.split()) for s in sections)
+        if total < int(self.target_words * self.POST_MIN_SHARE):
+            print(f"⚠️ Joined post has {total} of the {self.target_words} target words")
+        return self.package("\n\n".join(sections))
+
+    def generate_sections_parallel(self, outline):
+        """
+        Expands every outline section concurrently and joins them in order.
+        Wall-clock time is roughly that of the slowest section.
+        """
+        titles = self._section_titles(outline)
+        if len(titles) < 2:
+            text = generate_text(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh)
+            return self.package(text)
+
+        # Split the word budget so the joined post still meets the target
+        words = max(80, self.target_words // len(titles))
+        with ThreadPoolExecutor(max_workers=min(self.section_workers, len(titles))) as pool:
+            futures = [pool.submit(self._expand_section, titles, i, words) for i in range(len(titles))]
+            sections = [future.result() for future in futures]
+
+            # Sections that each just pass can still leave the post short
+            rewrites = {i: pool.submit(self._expand_section, titles, i, more)
+                        for i, more in self._top_up_plan(sections, words).items()}
+            rewrites = {i: future.exception() or future.result() for i, future in rewrites.items()}
+
+        return self._join(titles, sections, rewrites)
+
+    async def generate_sections_parallel_async(self, outline):
+        """generate_sections_parallel with the sections awaited together on the event loop."""
+        titles = self._section_titles(outline)
+        if len(titles) < 2:
+            text = await generate_text_async(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh)
+            return self.package(text)
+
+        words = max(80, self.target_words // len(titles))
+        slots = asyncio.Semaphore(self.section_workers)
+
+        async def expand(index):
+            async with slots:
+                return await self._expand_section_async(titles, index, words)
+
+        tasks = [asyncio.ensure_future(expand(i)) for i in range(len(titles))]
+        try:
+            sections = await asyncio.gather(*tasks)
+        except BaseException:
+            # One failed section fails the post: stop the others' Gemini calls
+            for task in tasks:
+                task.cancel()
+            raise
+
+        plan = self._top_up_plan(sections, words)
+        results = await asyncio.gather(
+            *(self._expand_section_async(titles, i, more) for i, more in plan.items()),
+            return_exceptions=True
+        )
+        return self._join(titles, sections, dict(zip(plan, results)))
+
+    def stream_full_blog(self, outline):
+        """
+        Same as generate_full_blog, but yields markdown chunks as the model
+        produces them instead of waiting for the whole response.
+        """
+        yield from stream_text(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh)
+
+    async def stream_full_blog_async(self, outline):
+        """Async counterpart of stream_full_blog."""
+        async for text in stream_text_async(self.model, self._build_prompt(outline), "content", bypass=self.force_fresh):
+            yield text
@@ -1,12 +1,24 @@
-from app.firebase.firestore_service import FirestoreService
+from app.registry import ClientRegistry
 
 class DraftsAgent:
-    def __init__(self):
-        self.db_service = FirestoreService()
+    def __init__(self, db_service=None):
+        self.db_service = db_service or ClientRegistry.get_instance().db_service
 
-    def create_initial_draft(self, blog_data, user_id):
-        """Prepares generated data and saves it via FirestoreService."""
+    def create_initial_draft(self, blog_data, user_id, activity=None):
+        """
+        Prepares generated data and saves it via FirestoreService.
+        activity (user, type, action_text) is logged in the same commit.
+        """
+        # 1. Normalize the generated fields
+        self.prepare(blog_data, user_id)
+
+        # 2. Save - FIX: Pass both blog_data AND user_id
+        blog_id = self.db_service.create_draft(blog_data, user_id, activity=activity)
         
+        return blog_id
+
+    def prepare(self, blog_data, user_id):
+        """Normalizes generated data into the stored blog shape (also used by batch saves)."""
         # 1. Map fields correctly
         blog_data["author_id"] = user_id
         
@@ -32,17 +44,9 @@ class DraftsAgent:
         if "status" not in blog_data:
             blog_data["status"] = "DRAFT"
 
-        # 5. Save - FIX: Pass both blog_data AND user_id
-        blog_id = self.db_service.create_draft(blog_data, user_id)
-        
-        return blog_id
+        return blog_data
 
     def update_draft_content(self, blog_id, new_content):   
         """Updates the body of an existing draft."""
-        update_data = {
-            "content.body": new_content,
-            "status": "DRAFT",
-            "updated_at": datetime.utcnow()
-        }
-        # Assuming you have a general update_blog method in FirestoreService
-        return self.db_service.db.collection("blogs").document(blog_id).update(update_data)
\ No newline at end of file
+        # Goes through update_blog_status so the dashboard counters follow the status change
+        return self.db_service.update_blog_status(blog_id, "DRAFT", {"content.body": new_content})
\ No newline at end of file
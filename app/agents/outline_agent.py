@@ -1,15 +1,19 @@
-# import google.generativeai as genai
-from google import generativeai as genai
-from flask import current_app
-import json
+from app.llm.cache import generate_text, generate_text_async
+from app.registry import ClientRegistry
 
 class OutlineAgent:
-    def __init__(self):
-        # Always configure inside the class or factory to ensure app context
-        genai.configure(api_key=current_app.config['GEMINI_API_KEY'])
-        self.model = genai.GenerativeModel('gemini-3-flash-preview')
+    def __init__(self, force_fresh=False, model=None):
+        # Shared model client comes from the registry unless injected
+        self.model = model or ClientRegistry.get_instance().model()
+        self.force_fresh = force_fresh  # Skip the LLM response cache
+
+    def _build_prompt(self, topic):
+        return f"Create a structured SEO blog outline for: {topic}. Return ONLY a JSON list of strings."
 
     def generate_outline(self, topic):
-        prompt = f"Create a structured SEO blog outline for: {topic}. Return ONLY a JSON list of strings."
-        response = self.model.generate_content(prompt)
-        return [line.strip() for line in response.text.split('\n') if line.strip()] 
\ No newline at end of file
+        text = generate_text(self.model, self._build_prompt(topic), "outline", bypass=self.force_fresh)
+        return [line.strip() for line in text.split('\n') if line.strip()]
+
+    async def generate_outline_async(self, topic):
+        text = await generate_text_async(self.model, self._build_prompt(topic), "outline", bypass=self.force_fresh)
+        return [line.strip() for line in text.split('\n') if line.strip()]
@@ -0,0 +1,94 @@
+import os
+
+import click
+from flask import current_app
+
+from app.ml.categorizer import LocalCategorizer, evaluate
+from app.search.index import SearchIndex
+from app.registry import ClientRegistry
+from app.storage.backends import BACKENDS, create_storage_service
+from app.storage.migrate import copy_documents
+
+
+def register_commands(app):
+    """Registers maintenance commands on the Flask CLI."""
+
+    @app.cli.command("reconcile-stats")
+    def reconcile_stats():
+        """Recomputes the dashboard counters with aggregation queries and repairs drift."""
+        result = ClientRegistry.get_instance().db_service.reconcile_stats()
+        if result["drift"]:
+            for field, (stored, actual) in result["drift"].items():
+                click.echo(f"⚠️ {field}: stored {stored}, actual {actual} (repaired)")
+        else:
+            click.echo("✅ Dashboard counters are in sync.")
+        click.echo(f"Stats: {result['stats']}")
+
+    @app.cli.command("compact-activity")
+    @click.option("--days", type=int, default=None, help="Compact entries older than this many days.")
+    def compact_activity(days):
+        """Folds old activity entries into daily rollup documents."""
+        days = days if days is not None else current_app.config['ACTIVITY_COMPACT_AFTER_DAYS']
+        compacted = ClientRegistry.get_instance().db_service.compact_activity(older_than_days=days)
+        click.echo(f"✅ Compacted {compacted} activity entries older than {days} days.")
+
+    @app.cli.command("migrate-content")
+    @click.option("--batch-size", type=click.IntRange(1, 250), default=200,
+                  help="Blogs per write batch (two writes each, at most 250).")
+    def migrate_content(batch_size):
+        """Moves inline blog content into compressed blog_contents documents."""
+        migrated = ClientRegistry.get_instance().db_service.migrate_content(batch_size=batch_size)
+        click.echo(f"✅ Migrated content of {migrated} blogs.")
+
+    @app.cli.command("eval-categorizer")
+    @click.option("--holdout", type=float, default=0.2, help="Share of blogs held out for testing.")
+    @click.option("--threshold", type=float, default=None, help="Confidence threshold (default CATEGORIZER_THRESHOLD).")
+    def eval_categorizer(holdout, threshold):
+        """Scores the local categorizer against the categories chosen by the LLM on held-out blogs."""
+        threshold = threshold if threshold is not None else current_app.config['CATEGORIZER_THRESHOLD']
+        categorizer = LocalCategorizer.get_instance()
+        examples = list(ClientRegistry.get_instance().db_service.iter_blog_texts(sources=categorizer.TRAINING_SOURCES))
+        metrics = evaluate(categorizer, examples, holdout=holdout, threshold=threshold,
+                           top_k=current_app.config['CATEGORIZER_TOP_K'])
+        for name, value in metrics.items():
+            click.echo(f"{name}: {value}")
+
+    @app.cli.command("rebuild-categorizer")
+    def rebuild_categorizer():
+        """Retrains the local categorizer from every stored blog and replaces its snapshot."""
+        categorizer = LocalCategorizer.get_instance()
+        if categorizer.path and os.path.exists(categorizer.path):
+            os.remove(categorizer.path)
+        categorizer.load()
+
+    @app.cli.command("rebuild-search-index")
+    def rebuild_search_index():
+        """Rebuilds the search index from every stored blog and replaces its snapshot."""
+        index = SearchIndex.get_instance()
+        if index.path and os.path.exists(index.path):
+            os.remove(index.path)
+        index.load()
+
+    @app.cli.command("copy-storage")
+    @click.option("--from", "source", type=click.Choice(BACKENDS), default=None,
+                  help="Backend to copy from (default STORAGE_BACKEND).")
+    @click.option("--to", "target", type=click.Choice(BACKENDS), required=True, help="Backend to copy into.")
+    @click.option("--batch-size", type=click.IntRange(1, 500), default=400,
+                  help="Documents per write batch/transaction (Firestore allows 500).")
+    def copy_storage(source, target, batch_size):
+        """Copies every document between the Firestore and SQLite backends (ids are kept)."""
+        registry = ClientRegistry.get_instance()
+        source = source or registry.storage_backend
+        if source == target:
+            raise click.UsageError("--from and --to must be different backends.")
+
+        def service(backend):
+            if backend == registry.storage_backend:
+                return registry.db_service
+            return create_storage_service(current_app.config, backend)
+
+        counts, reconciled = copy_documents(service(source), service(target), batch_size=batch_size)
+        for collection, n in counts.items():
+            click.echo(f"{collection}: {n}")
+        click.echo(f"✅ Copied {sum(counts.values())} documents from {source} to {target}.")
+        click.echo(f"Stats: {reconciled['stats']}")
@@ -0,0 +1,72 @@
+import atexit
+import queue
+import threading
+
+
+class ActivityWriter:
+    """
+    Write-behind buffer for activity feed entries. log_activity only enqueues;
+    a background thread flushes the buffer in bulk (one WriteBatch per up to
+    500 entries) every flush_interval seconds or once flush_size is reached.
+    """
+
+    MAX_BATCH = 500  # Firestore limit for a single WriteBatch
+
+    def __init__(self, db, collection, flush_interval=2.0, flush_size=100):
+        self.db = db
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.flush_size = min(flush_size, self.MAX_BATCH)
+
+        self._queue = queue.Queue()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="activity-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, entry):
+        self._queue.put(entry)
+        if self._queue.qsize() >= self.flush_size:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Writes everything buffered so far. Returns the number of entries written."""
+        written = 0
+        while True:
+            entries = []
+            while len(entries) < self.MAX_BATCH:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not entries:
+                return written
+
+            try:
+                batch = self.db.batch()
+                for entry in entries:
+                    batch.set(self.db.collection(self.collection).document(), entry)
+                batch.commit()
+                written += len(entries)
+            except Exception as e:
+                print(f"❌ Error flushing {len(entries)} activity entries: {e}")
+                # Keep them for the next flush instead of dropping the feed
+                for entry in entries:
+                    self._queue.put(entry)
+                return written
+
+    def close(self):
+        """Stops the background thread and flushes what is left (called at exit)."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
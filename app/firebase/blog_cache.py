@@ -0,0 +1,105 @@
+import copy
+import threading
+from collections import OrderedDict
+
+
+class BlogCache:
+    """
+    Bounded LRU cache of blog documents used by FirestoreService.get_blog_by_id.
+    Our own writes invalidate entries directly. The optional listener (off by
+    default) watches every document of the collection, so edits and deletes
+    made by other workers or in the Firebase console drop out of the cache
+    too, at the cost of reading the whole collection when it starts.
+
+    A read that races an invalidation must not put the stale document back:
+    callers take version() before reading and pass it to put(), which ignores
+    the document if the blog was invalidated after that.
+    """
+
+    def __init__(self, db, collection="blogs", max_entries=256, listen=False):
+        self.db = db
+        self.collection = collection
+        self.max_entries = max_entries
+        self.listen = listen
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._listen_lock = threading.Lock()
+        self._watch = None
+
+        # Invalidation clock: blog id -> clock value of its last invalidation.
+        # Only the most recent ones are remembered; _floor is the newest one forgotten.
+        self._clock = 0
+        self._invalidated = OrderedDict()
+        self._floor = 0
+
+    def get(self, blog_id):
+        self._ensure_listener()
+        with self._lock:
+            data = self._entries.get(blog_id)
+            if data is None:
+                return None
+            self._entries.move_to_end(blog_id)
+            # Callers (templates, agents) may mutate what they get back
+            return copy.deepcopy(data)
+
+    def version(self):
+        """Taken before reading a blog from Firestore, then passed to put()."""
+        with self._lock:
+            return self._clock
+
+    def put(self, blog_id, data, version=None):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version is not None and (self._floor > version or self._invalidated.get(blog_id, 0) > version):
+                return  # Invalidated while it was being read
+            self._entries[blog_id] = copy.deepcopy(data)
+            self._entries.move_to_end(blog_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, blog_id):
+        with self._lock:
+            self._entries.pop(blog_id, None)
+            self._clock += 1
+            self._invalidated[blog_id] = self._clock
+            self._invalidated.move_to_end(blog_id)
+            # Reads in flight are short: a few times the cache size is plenty of history
+            while len(self._invalidated) > max(self.max_entries, 64) * 4:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidated.clear()
+            self._clock += 1
+            self._floor = self._clock
+
+    # ---------------- CHANGE FEED ----------------
+
+    def _ensure_listener(self):
+        if not self.listen or self._watch is not None:
+            return
+
+        with self._listen_lock:
+            if not self.listen or self._watch is not None:
+                return
+            try:
+                # The whole collection (not a query on updated_at): console edits
+                # leave updated_at alone, and deletes only show up as REMOVED changes
+                self._watch = self.db.collection(self.collection).on_snapshot(self._on_snapshot)
+            except Exception as e:
+                print(f"❌ Blog cache listener failed, relying on local invalidation only: {e}")
+                self.listen = False
+                self._watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Added, modified or removed: the cached copy (if any) is stale either way
+        for change in changes:
+            self.invalidate(change.document.id)
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
@@ -0,0 +1,65 @@
+import hashlib
+import html
+import threading
+import zlib
+from collections import OrderedDict
+
+# Blog bodies live in blog_contents/<blog_id>, not in the blog document:
+#   {"markdown_z": <zlib bytes>, "hash": <sha256 of markdown>, "size": <chars>, "encoding": "zlib"}
+# Only the markdown is stored; HTML is rendered on demand and cached by hash.
+
+ENCODING = "zlib"
+COMPRESSION_LEVEL = 6
+HTML_CACHE_SIZE = 256
+
+_html_cache = OrderedDict()
+_html_lock = threading.Lock()
+
+
+def content_hash(markdown_text):
+    return hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
+
+
+def extract_markdown(content):
+    """Markdown from any stored/generated content shape: {"body"}, {"markdown"} or a plain string."""
+    if isinstance(content, dict):
+        return content.get("body") or content.get("markdown") or ""
+    return content if isinstance(content, str) else ""
+
+
+def encode(markdown_text):
+    """Builds the blog_contents document for markdown_text."""
+    return {
+        "markdown_z": zlib.compress(markdown_text.encode("utf-8"), COMPRESSION_LEVEL),
+        "hash": content_hash(markdown_text),
+        "size": len(markdown_text),
+        "encoding": ENCODING
+    }
+
+
+def decode(doc):
+    """Markdown text of a blog_contents document."""
+    return zlib.decompress(doc["markdown_z"]).decode("utf-8")
+
+
+def render_html(markdown_text, hash_value=None):
+    """HTML for a blog body; the same content hash is only rendered once."""
+    hash_value = hash_value or content_hash(markdown_text)
+    with _html_lock:
+        cached = _html_cache.get(hash_value)
+        if cached is not None:
+            _html_cache.move_to_end(hash_value)
+            return cached
+
+    rendered = "<article>{}</article>".format(html.escape(markdown_text).replace("\n", "<br>"))
+
+    with _html_lock:
+        _html_cache[hash_value] = rendered
+        while len(_html_cache) > HTML_CACHE_SIZE:
+            _html_cache.popitem(last=False)
+    return rendered
+
+
+def as_content(markdown_text, hash_value=None):
+    """The content dict callers see on a blog: {"body", "html"}."""
+    return {"body": markdown_text, "html": render_html(markdown_text, hash_value)}
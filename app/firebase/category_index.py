@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+class CategoryIndex:
+    """
+    In-process index of the categories collection (name -> id, id -> record).
+    Loads once, then stays fresh through a Firestore on_snapshot listener so
+    lookups never have to query Firestore. Without a listener it reloads
+    every refresh_seconds instead.
+    """
+
+    def __init__(self, db, collection="categories", listen=True, refresh_seconds=60, load_timeout=10):
+        self.db = db
+        self.collection = collection
+        self.listen = listen
+        self.refresh_seconds = refresh_seconds
+        self.load_timeout = load_timeout
+
+        self._by_id = {}
+        self._id_by_name = {}
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loaded_at = 0
+        self._watch = None
+
+    # ---------------- LOADING ----------------
+
+    def _ensure_loaded(self):
+        if self._ready.is_set() and (self._watch or time.time() - self._loaded_at < self.refresh_seconds):
+            return
+
+        with self._load_lock:
+            if self._ready.is_set() and (self._watch or time.time() - self._loaded_at < self.refresh_seconds):
+                return
+
+            if self.listen and self._watch is None:
+                try:
+                    self._watch = self.db.collection(self.collection).on_snapshot(self._on_snapshot)
+                    if self._ready.wait(timeout=self.load_timeout):
+                        return
+                    print("⚠️ Category listener slow to start, loading categories directly.")
+                except Exception as e:
+                    print(f"❌ Category listener failed, falling back to periodic reloads: {e}")
+                    self._watch = None
+
+            self._load_all()
+
+    def _load_all(self):
+        docs = self.db.collection(self.collection).stream()
+        self._replace_all(docs)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        # Categories are a small collection, so every snapshot rebuilds the index
+        self._replace_all(docs)
+
+    def _replace_all(self, docs):
+        by_id = {}
+        for doc in docs:
+            data = doc.to_dict()
+            data['id'] = doc.id
+            by_id[doc.id] = data
+
+        with self._lock:
+            self._by_id = by_id
+            self._id_by_name = {data.get('name'): cat_id for cat_id, data in by_id.items()}
+            self._loaded_at = time.time()
+        self._ready.set()
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    # ---------------- LOOKUPS ----------------
+
+    def all(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(data) for data in self._by_id.values()]
+
+    def get(self, category_id):
+        self._ensure_loaded()
+        with self._lock:
+            data = self._by_id.get(category_id)
+            return dict(data) if data else None
+
+    def get_by_name(self, name):
+        self._ensure_loaded()
+        with self._lock:
+            cat_id = self._id_by_name.get(name)
+            return dict(self._by_id[cat_id]) if cat_id in self._by_id else None
+
+    # ---------------- LOCAL WRITE-THROUGH ----------------
+    # Our own writes are applied right away; the listener confirms them later.
+
+    def upsert(self, category_id, fields):
+        with self._lock:
+            data = dict(self._by_id.get(category_id, {}))
+            old_name = data.get('name')
+            data.update(fields)
+            data['id'] = category_id
+            self._by_id[category_id] = data
+            if old_name is not None and old_name != data.get('name'):
+                self._id_by_name.pop(old_name, None)
+            self._id_by_name[data.get('name')] = category_id
+
+    def remove(self, category_id):
+        with self._lock:
+            data = self._by_id.pop(category_id, None)
+            if data:
+                self._id_by_name.pop(data.get('name'), None)
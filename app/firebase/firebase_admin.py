@@ -1,18 +1,24 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+
 
 class FirebaseLoader:
     _instance = None
+    _lock = threading.Lock()
 
     @classmethod
     def get_instance(cls, cert_path=None):
-        if cls._instance is None:
-            if cert_path is None:
-                raise ValueError("Firebase certificate path required for first-time initialization.")
-            
-            cred = credentials.Certificate(cert_path)
-            firebase_admin.initialize_app(cred)
-            cls._instance = firestore.client()
-            print("--- Firebase Admin SDK Initialized Successfully ---")
-        
-        return cls._instance
\ No newline at end of file
+        # The SDK is imported here: most requests never need it (see ClientRegistry)
+        with cls._lock:
+            if cls._instance is None:
+                if cert_path is None:
+                    raise ValueError("Firebase certificate path required for first-time initialization.")
+
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+
+                cred = credentials.Certificate(cert_path)
+                firebase_admin.initialize_app(cred)
+                cls._instance = firestore.client()
+                print("--- Firebase Admin SDK Initialized Successfully ---")
+
+        return cls._instance
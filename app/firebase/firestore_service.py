@@ -1,63 +1,213 @@
-from datetime import datetime
+import hashlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from app.firebase.firebase_admin import FirebaseLoader
+from app.firebase.category_index import CategoryIndex
+from app.firebase.blog_cache import BlogCache
+from app.firebase.unit_of_work import UnitOfWork
+from app.firebase.activity_writer import ActivityWriter
+from app.firebase import blog_content
+from app.storage.base import StorageService, _bulk_result, _iso_utc, _apply_field_paths, _change_fields
 from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
 
-class FirestoreService:
-    def __init__(self):
+class FirestoreService(StorageService):
+    """The Firestore backend of StorageService (STORAGE_BACKEND=firestore)."""
+
+    # Activity entries compacted per maintenance batch (plus one rollup write per day)
+    ROLLUP_CHUNK = 400
+
+    # BulkWriter retry policy (gRPC status codes that are never retried)
+    BULK_MAX_ATTEMPTS = 5
+    GRPC_NOT_FOUND = 5
+    GRPC_FAILED_PRECONDITION = 9
+
+    def __init__(self, category_listener=True, blog_cache_size=256, blog_cache_listener=True,
+                 activity_write_behind=False, activity_ttl_days=30, rollup_ttl_days=365,
+                 idempotency_ttl_hours=24):
+        super().__init__()
         self.db = FirebaseLoader.get_instance()
         self.collection_name = "blogs"
         self.activity_collection = "activities"  # Collection for dashboard feed
+        self.jobs_collection = "jobs"  # Background generation jobs
+        self.batches_collection = "batches"  # Batch generation runs (items in a subcollection)
+        self.idempotency_collection = "idempotency_keys"  # Idempotency-Key -> original job
+        self.idempotency_ttl_hours = idempotency_ttl_hours
+        self.stats_collection = "stats"  # Materialized dashboard counters
+        self.rollup_collection = "activity_rollups"  # Daily compacted activity
+        self.content_collection = "blog_contents"  # Compressed blog bodies (see blog_content.py)
+        # expire_at on activity/rollup docs drives a Firestore TTL policy (configured on the field)
+        self.activity_ttl_days = activity_ttl_days
+        self.rollup_ttl_days = rollup_ttl_days
+        # name -> id / id -> record, kept fresh by an on_snapshot listener
+        self.categories = CategoryIndex(self.db, listen=category_listener)
+        # Read-through cache for get_blog_by_id
+        self.blog_cache = BlogCache(self.db, self.collection_name,
+                                    max_entries=blog_cache_size, listen=blog_cache_listener)
+        # Optional write-behind buffer: activity entries are flushed in bulk off the request path
+        self.activity_writer = ActivityWriter(self.db, self.activity_collection) if activity_write_behind else None
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Groups writes into one WriteBatch, committed when the block exits:
+            with db_service.unit_of_work() as uow:
+                ...
+        """
+        uow = UnitOfWork(self)
+        yield uow
+        uow.commit()
 
     # ---------------- BLOG METHODS ----------------
 
     def get_blog_by_id(self, blog_id):
+        cached = self.blog_cache.get(blog_id)
+        if cached is not None:
+            return cached
+
+        # Taken before the read: an invalidation in between keeps the result out of the cache
+        version = self.blog_cache.version()
         try:
-            doc = self.db.collection(self.collection_name).document(blog_id).get()
-            if doc.exists:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                return data
-            return None
+            # Metadata and body in one round trip
+            blog_snap = content_snap = None
+            refs = [self.db.collection(self.collection_name).document(blog_id), self._content_ref(blog_id)]
+            for snap in self.db.get_all(refs):
+                if snap.reference.parent.id == self.content_collection:
+                    content_snap = snap
+                else:
+                    blog_snap = snap
+
+            if blog_snap is None or not blog_snap.exists:
+                return None
+            data = blog_snap.to_dict()
+            data['id'] = blog_snap.id
+            # Blogs not migrated yet still carry their content inline
+            if content_snap is not None and content_snap.exists:
+                content_doc = content_snap.to_dict()
+                data['content'] = blog_content.as_content(blog_content.decode(content_doc), content_doc.get('hash'))
+            self.blog_cache.put(blog_id, data, version)
+            return data
         except Exception as e:
             print(f"❌ Error fetching blog {blog_id}: {e}")
             return None
 
-    def create_draft(self, blog_data, user_id):
-        """Saves blog as DRAFT and increments category count."""
-        try:
-            blog_data['created_at'] = firestore.SERVER_TIMESTAMP
-            blog_data['updated_at'] = datetime.utcnow()
-            blog_data['author_id'] = user_id
-
-            doc_ref = self.db.collection(self.collection_name).add(blog_data)
-            blog_id = doc_ref[1].id
-
-            # Increment category count if exists
-            category_name = blog_data.get('category')
-            if category_name:
-                self.update_category_count(category_name, 1)
+    def _content_ref(self, blog_id):
+        return self.db.collection(self.content_collection).document(blog_id)
 
+    def create_draft(self, blog_data, user_id, activity=None):
+        """
+        Saves blog as DRAFT and increments category count. The blog, the
+        category/dashboard counters and the optional activity entry
+        (dict of user, type, action_text) are committed in one batch.
+        """
+        try:
+            with self.unit_of_work() as uow:
+                blog_id = self._stage_new_blog(uow, blog_data, user_id)
+                if activity:
+                    self._stage_activity(uow, activity, blog_data.get('title', 'Untitled'))
             return blog_id
         except Exception as e:
             print(f"❌ Firestore Error creating draft: {e}")
             return None
 
-    def update_blog_status(self, blog_id, status):
-        try:
-            doc_ref = self.db.collection(self.collection_name).document(blog_id)
-            doc_ref.update({
-                'status': status.upper(),
+    def _stage_new_blog(self, uow, blog_data, user_id, count_category=True):
+        blog_data['created_at'] = firestore.SERVER_TIMESTAMP
+        blog_data['updated_at'] = datetime.utcnow()
+        blog_data['author_id'] = user_id
+        blog_data['status'] = (blog_data.get('status') or 'DRAFT').upper()
+
+        # The body is stored compressed in blog_contents; the blog document keeps metadata only
+        markdown = blog_content.extract_markdown(blog_data.pop('content', None))
+        content_doc = blog_content.encode(markdown)
+        blog_data['content_hash'] = content_doc['hash']
+
+        doc_ref = self.db.collection(self.collection_name).document()
+        uow.set(doc_ref, blog_data)
+        uow.set(self._content_ref(doc_ref.id), content_doc)
+        uow.stats(total=1, status_deltas={blog_data['status']: 1})
+        change = dict(_change_fields(blog_data), body=markdown)
+        uow.after_commit(lambda: self._blog_changed(doc_ref.id, change))
+
+        # Increment category count if exists
+        category_name = blog_data.get('category')
+        if category_name and count_category:
+            self._stage_category_count(uow, category_name, 1)
+
+        return doc_ref.id
+
+    def update_blog_status(self, blog_id, status, extra_fields=None, activity=None):
+        """
+        Changes a blog's status and moves it between the dashboard counters
+        in the same transaction. extra_fields are written along with it, and
+        so is the optional activity entry (dict of user, type, action_text).
+        A "content.body" key in extra_fields rewrites the blog_contents document.
+        Returns the updated blog document, or None if the update failed.
+        """
+        new_status = status.upper()
+        doc_ref = self.db.collection(self.collection_name).document(blog_id)
+
+        @firestore.transactional
+        def update_in_transaction(transaction):
+            snap = doc_ref.get(transaction=transaction)
+            if not snap.exists:
+                return None
+
+            blog = snap.to_dict()
+            old_status = (blog.get('status') or '').upper()
+            update_data = dict(extra_fields or {})
+            update_data.update({
+                'status': new_status,
                 'updated_at': datetime.utcnow()
             })
-            return True
+            new_body = update_data.pop('content.body', None)
+            if new_body is not None:
+                content_doc = blog_content.encode(new_body)
+                transaction.set(self._content_ref(blog_id), content_doc)
+                update_data['content_hash'] = content_doc['hash']
+                if 'content' in blog:
+                    # Drop the legacy inline copy
+                    update_data['content'] = firestore.DELETE_FIELD
+            transaction.update(doc_ref, update_data)
+
+            # Written even without a status move: the version bump tells the
+            # list pages (ETag) that updated_at/ordering changed
+            status_deltas = {old_status: -1, new_status: 1} if old_status != new_status else None
+            transaction.set(self._stats_ref(), self._stats_delta(status_deltas=status_deltas), merge=True)
+            if activity and not self.activity_writer:
+                transaction.set(self._new_activity_ref(),
+                                self._activity_entry(blog_title=blog.get('title', 'Untitled'), **activity))
+
+            blog['id'] = blog_id
+            updated = _apply_field_paths(blog, {k: v for k, v in update_data.items() if k != 'content'})
+            if new_body is not None:
+                updated['content'] = blog_content.as_content(new_body, update_data['content_hash'])
+            return updated
+
+        try:
+            updated = update_in_transaction(self.db.transaction())
+            if updated and activity and self.activity_writer:
+                self.activity_writer.enqueue(
+                    self._activity_entry(blog_title=updated.get('title', 'Untitled'), **activity))
+            if updated:
+                fields = _change_fields(updated)
+                if extra_fields and 'content.body' in extra_fields:
+                    fields['body'] = extra_fields['content.body']
+                self._blog_changed(blog_id, fields)
+            return updated
         except Exception as e:
             print(f"❌ Error updating status: {e}")
-            return False
+            return None
+        finally:
+            self.blog_cache.invalidate(blog_id)
 
-    def get_blogs_by_status(self, status):
+    def get_blogs_by_status(self, status, full=False):
+        """Blogs with a status as summaries (SUMMARY_FIELDS) unless full=True."""
         try:
-            docs = self.db.collection(self.collection_name)\
-                          .where('status', '==', status.upper()).stream()
+            query = self.db.collection(self.collection_name)\
+                           .where('status', '==', status.upper())
+            if not full:
+                query = query.select(self.SUMMARY_FIELDS)
+            docs = query.stream()
             blogs = []
             for doc in docs:
                 data = doc.to_dict()
@@ -79,147 +229,566 @@ class FirestoreService:
             print(f"❌ Error getting total blogs count: {e}")
             return 0
 
-    def get_paginated_drafts(self, page=1, per_page=10):
+    def get_blogs_page(self, status, page_size=10, page_token=None):
+        """
+        Keyset pagination over blogs with a status, newest first, ordered by
+        (updated_at, id). page_token is the opaque cursor from a previous call.
+        Returns (blogs, next_token, prev_token); tokens are None at the ends.
+        The cost of a page does not depend on how deep it is. Blogs are
+        projected to SUMMARY_FIELDS; full documents come from get_blog_by_id.
+        """
         try:
-            skip = (page - 1) * per_page
+            cursor = self._decode_page_token(page_token)
             query = self.db.collection(self.collection_name)\
-                           .where('status', '==', 'DRAFT')\
+                           .select(self.SUMMARY_FIELDS)\
+                           .where('status', '==', status.upper())\
                            .order_by('updated_at', direction=firestore.Query.DESCENDING)\
-                           .offset(skip)\
-                           .limit(per_page)
-            
-            drafts = []
-            for doc in query.stream():
+                           .order_by('__name__', direction=firestore.Query.DESCENDING)  # document id tie-breaker
+
+            # Fetch one extra document to know whether another page exists
+            if cursor is None:
+                docs = query.limit(page_size + 1).get()
+            elif cursor['d'] == 'next':
+                docs = query.start_after(cursor['values']).limit(page_size + 1).get()
+            else:
+                docs = query.end_before(cursor['values']).limit_to_last(page_size + 1).get()
+
+            blogs = []
+            for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
-                drafts.append(data)
-
-            # Total draft count
-            total_count_query = self.db.collection(self.collection_name)\
-                                       .where('status', '==', 'DRAFT')\
-                                       .count()
-            total_count = total_count_query.get()[0][0].value
+                blogs.append(data)
 
-            return drafts, total_count
+            return self._page_result(blogs, cursor, page_size)
         except Exception as e:
-            print(f"❌ Error fetching paginated drafts: {e}")
-            return [], 0
+            print(f"❌ Error fetching {status} page: {e}")
+            return [], None, None
 
-    def delete_blog(self, blog_id):
-        try:
-            blog_ref = self.db.collection(self.collection_name).document(blog_id)
-            blog_snap = blog_ref.get()
+    def delete_blog(self, blog_id, activity=None):
+        """
+        Deletes a blog and returns the deleted document (None if nothing was deleted).
+        The optional activity entry is written in the same transaction.
+        """
+        blog_ref = self.db.collection(self.collection_name).document(blog_id)
+
+        @firestore.transactional
+        def delete_in_transaction(transaction):
+            blog_snap = blog_ref.get(transaction=transaction)
             if not blog_snap.exists:
-                return False
+                return None
 
             blog_data = blog_snap.to_dict()
             category_name = blog_data.get("category")
+            status = (blog_data.get("status") or "").upper()
 
-            @firestore.transactional
-            def delete_in_transaction(transaction):
-                if category_name:
-                    cat_query = self.db.collection("categories").where("name", "==", category_name).limit(1)
-                    cat_docs = cat_query.get(transaction=transaction)
-                    if len(cat_docs) > 0:
-                        transaction.update(cat_docs[0].reference, {"count": firestore.Increment(-1)})
-                transaction.delete(blog_ref)
-                return True
+            # A single document read instead of a name query inside the transaction
+            category = self.categories.get_by_name(category_name) if category_name else None
+            if category:
+                cat_ref = self.db.collection("categories").document(category['id'])
+                if cat_ref.get(transaction=transaction).exists:
+                    transaction.update(cat_ref, {"count": firestore.Increment(-1)})
 
-            transaction = self.db.transaction()
-            return delete_in_transaction(transaction)
+            transaction.delete(blog_ref)
+            transaction.delete(self._content_ref(blog_id))
+            transaction.set(self._stats_ref(), self._stats_delta(
+                total=-1, status_deltas={status: -1}
+            ), merge=True)
+            if activity and not self.activity_writer:
+                transaction.set(self._new_activity_ref(),
+                                self._activity_entry(blog_title=blog_data.get('title', 'Untitled'), **activity))
+
+            blog_data['id'] = blog_id
+            return blog_data
+
+        try:
+            deleted = delete_in_transaction(self.db.transaction())
+            if deleted and activity and self.activity_writer:
+                self.activity_writer.enqueue(
+                    self._activity_entry(blog_title=deleted.get('title', 'Untitled'), **activity))
+            if deleted:
+                self._blog_changed(blog_id, None)
+            return deleted
         except Exception as e:
             print(f"❌ Error deleting blog: {e}")
-            return False
+            return None
+        finally:
+            self.blog_cache.invalidate(blog_id)
+
+    # ---------------- BULK METHODS ----------------
+
+    def bulk_update_status(self, blog_ids, status, activity=None):
+        """
+        Moves many blogs to status with one BulkWriter instead of a
+        transaction per blog. Dashboard counters and one summary activity
+        entry are committed once at the end.
+        Returns {"succeeded": [ids], "failed": [ids]}.
+        """
+        new_status = status.upper()
+        snaps = []
+        try:
+            snaps = self._get_blog_snapshots(blog_ids)
+            now = datetime.utcnow()
+            written = self._bulk_write(snaps, lambda bulk_writer, snap: bulk_writer.update(
+                snap.reference,
+                {'status': new_status, 'updated_at': now},
+                option=self.db.write_option(last_update_time=snap.update_time)
+            ))
+
+            status_deltas = {}
+            for snap in snaps:
+                old_status = (snap.to_dict().get('status') or '').upper()
+                if snap.id in written and old_status != new_status:
+                    status_deltas[old_status] = status_deltas.get(old_status, 0) - 1
+                    status_deltas[new_status] = status_deltas.get(new_status, 0) + 1
+
+            self._commit_bulk_summary(len(written), activity, status_deltas=status_deltas)
+            for snap in snaps:
+                if snap.id in written:
+                    self._blog_changed(snap.id, dict(_change_fields(snap.to_dict()), status=new_status, updated_at=now))
+            return _bulk_result(blog_ids, written)
+        except Exception as e:
+            print(f"❌ Error in bulk status update: {e}")
+            return _bulk_result(blog_ids, set())
+        finally:
+            for snap in snaps:
+                self.blog_cache.invalidate(snap.id)
+
+    def bulk_delete(self, blog_ids, activity=None):
+        """
+        Deletes many blogs with one BulkWriter. Category counts are
+        decremented once per category, and the counters and one summary
+        activity entry are committed at the end.
+        Returns {"succeeded": [ids], "failed": [ids]}.
+        """
+        snaps = []
+        try:
+            snaps = self._get_blog_snapshots(blog_ids)
+            written = self._bulk_write(snaps, lambda bulk_writer, snap: bulk_writer.delete(
+                snap.reference,
+                option=self.db.write_option(last_update_time=snap.update_time)
+            ))
+
+            status_deltas = {}
+            by_category = {}
+            for snap in snaps:
+                if snap.id not in written:
+                    continue
+                blog = snap.to_dict()
+                status = (blog.get('status') or '').upper()
+                status_deltas[status] = status_deltas.get(status, 0) - 1
+                category_name = blog.get('category')
+                if category_name:
+                    by_category[category_name] = by_category.get(category_name, 0) + 1
+
+            # Bodies go only once their blog is gone
+            self._bulk_write(sorted(written), lambda bulk_writer, blog_id: bulk_writer.delete(
+                self._content_ref(blog_id)
+            ))
+
+            # One decrement per category; a category deleted meanwhile just fails its own write
+            categories = [(self.categories.get_by_name(name), n) for name, n in by_category.items()]
+            self._bulk_write([(cat, n) for cat, n in categories if cat], lambda bulk_writer, item: bulk_writer.update(
+                self.db.collection("categories").document(item[0]['id']),
+                {"count": firestore.Increment(-item[1])}
+            ))
+
+            self._commit_bulk_summary(len(written), activity, total=-len(written), status_deltas=status_deltas)
+            for blog_id in written:
+                self._blog_changed(blog_id, None)
+            return _bulk_result(blog_ids, written)
+        except Exception as e:
+            print(f"❌ Error in bulk delete: {e}")
+            return _bulk_result(blog_ids, set())
+        finally:
+            for snap in snaps:
+                self.blog_cache.invalidate(snap.id)
+
+    def _get_blog_snapshots(self, blog_ids):
+        """Existing blogs among blog_ids, read in one batched get_all call."""
+        refs = [self.db.collection(self.collection_name).document(blog_id) for blog_id in dict.fromkeys(blog_ids)]
+        return [snap for snap in self.db.get_all(refs) if snap.exists]
+
+    def _bulk_write(self, items, stage):
+        """
+        Calls stage(bulk_writer, item) for every item and waits for the
+        BulkWriter to drain. Failed preconditions (the blog changed after it
+        was read) are not retried. Returns the ids of the documents written.
+        """
+        written = set()
+        if not items:
+            return written
+
+        bulk_writer = self.db.bulk_writer()
+        bulk_writer.on_write_result(lambda ref, result, bw: written.add(ref.id))
+        bulk_writer.on_write_error(lambda error, bw: (
+            error.code not in (self.GRPC_NOT_FOUND, self.GRPC_FAILED_PRECONDITION)
+            and error.attempts < self.BULK_MAX_ATTEMPTS
+        ))
+        for item in items:
+            stage(bulk_writer, item)
+        bulk_writer.close()
+        return written
+
+    def _commit_bulk_summary(self, count, activity, total=0, status_deltas=None):
+        if not count:
+            return
+        with self.unit_of_work() as uow:
+            # Direct set so the version is bumped even when no counter moves
+            uow.set(self._stats_ref(), self._stats_delta(total, status_deltas), merge=True)
+            if activity:
+                self._stage_activity(uow, activity, f"{count} blog{'s' if count != 1 else ''}")
+
+    def iter_blog_documents(self, chunk_size=100, updated_since=None):
+        """
+        Yields (blog_id, fields, markdown) for every blog, or for the blogs
+        updated after updated_since. fields are title, category,
+        category_source, status and updated_at; bodies are fetched chunk_size
+        at a time.
+        """
+        query = self.db.collection(self.collection_name).select(
+            ['title', 'category', 'category_source', 'status', 'updated_at', 'content'])
+        if updated_since is not None:
+            query = query.where('updated_at', '>', updated_since)
+        chunk = []
+        for doc in query.stream():
+            chunk.append(doc)
+            if len(chunk) == chunk_size:
+                yield from self._with_bodies(chunk)
+                chunk = []
+        if chunk:
+            yield from self._with_bodies(chunk)
+
+    def iter_blog_ids(self):
+        """Ids of every blog (a name-only projection)."""
+        for doc in self.db.collection(self.collection_name).select([]).stream():
+            yield doc.id
+
+    def _with_bodies(self, docs):
+        bodies = {}
+        for snap in self.db.get_all([self._content_ref(doc.id) for doc in docs]):
+            if snap.exists:
+                bodies[snap.id] = blog_content.decode(snap.to_dict())
+        for doc in docs:
+            data = doc.to_dict()
+            # Blogs not migrated yet still carry their content inline
+            body = bodies.get(doc.id) or blog_content.extract_markdown(data.get('content'))
+            yield doc.id, _change_fields(data), body
+
+    def migrate_content(self, batch_size=200):
+        """
+        Moves inline content (content.body / content.html) of older blogs into
+        compressed blog_contents documents and removes it from the blog.
+        Safe to re-run. Returns the number of blogs migrated.
+        """
+        # Two writes per blog; a WriteBatch holds at most 500
+        batch_size = max(1, min(batch_size, 250))
+        migrated = 0
+        batch = self.db.batch()
+        pending = 0
+        for doc in self.db.collection(self.collection_name).select(['content']).stream():
+            data = doc.to_dict()
+            if 'content' not in data:
+                continue
+
+            content_doc = blog_content.encode(blog_content.extract_markdown(data['content']))
+            batch.set(self._content_ref(doc.id), content_doc)
+            batch.update(doc.reference, {'content': firestore.DELETE_FIELD, 'content_hash': content_doc['hash']})
+            pending += 1
+            if pending == batch_size:
+                batch.commit()
+                migrated += pending
+                batch = self.db.batch()
+                pending = 0
+
+        if pending:
+            batch.commit()
+            migrated += pending
+        self.blog_cache.clear()
+        return migrated
 
     # ---------------- CATEGORY METHODS ----------------
 
     def get_all_categories(self):
         try:
-            docs = self.db.collection("categories").stream()
-            categories = []
-            for doc in docs:
-                data = doc.to_dict()
-                data['id'] = doc.id
-                categories.append(data)
-            return categories
+            return self.categories.all()
         except Exception as e:
             print(f"❌ Error fetching categories: {e}")
             return []
 
+    def get_category(self, category_id):
+        try:
+            return self.categories.get(category_id)
+        except Exception as e:
+            print(f"❌ Error fetching category {category_id}: {e}")
+            return None
+
     def update_category_count(self, category_name, increment_by):
         try:
-            cat_query = self.db.collection("categories").where("name", "==", category_name).limit(1).get()
-            if cat_query:
-                cat_ref = cat_query[0].reference
-                cat_ref.update({"count": firestore.Increment(increment_by)})
-            else:
-                self.db.collection("categories").add({
-                    "name": category_name,
-                    "count": 1 if increment_by > 0 else 0,
-                    "created_at": firestore.SERVER_TIMESTAMP
-                })
+            with self.unit_of_work() as uow:
+                self._stage_category_count(uow, category_name, increment_by)
         except Exception as e:
             print(f"❌ Error updating category count: {e}")
 
+    def _stage_category_count(self, uow, category_name, increment_by):
+        category = self.categories.get_by_name(category_name)
+        if category:
+            cat_ref = self.db.collection("categories").document(category['id'])
+            # Checked in the commit transaction: a category deleted since the index
+            # loaded is recreated in full rather than left behind as a bare count
+            uow.guard(
+                cat_ref,
+                if_exists=lambda uow: uow.update(cat_ref, {"count": firestore.Increment(increment_by)}),
+                if_missing=lambda uow: self._stage_new_category(uow, cat_ref, category_name, increment_by)
+            )
+            return
+
+        self._stage_new_category(uow, self.db.collection("categories").document(), category_name, increment_by)
+
+    def _stage_new_category(self, uow, cat_ref, category_name, increment_by):
+        new_category = {
+            "name": category_name,
+            "count": max(increment_by, 0),
+            "created_at": firestore.SERVER_TIMESTAMP
+        }
+        uow.set(cat_ref, new_category)
+        uow.stats(categories=1)
+        # Visible to this process right away, before the listener catches up
+        uow.after_commit(lambda: self.categories.upsert(
+            cat_ref.id, {"name": category_name, "count": new_category["count"]}
+        ))
+
     def delete_category(self, category_id):
-        try:
-            self.db.collection("categories").document(category_id).delete()
+        cat_ref = self.db.collection("categories").document(category_id)
+
+        @firestore.transactional
+        def delete_in_transaction(transaction):
+            if not cat_ref.get(transaction=transaction).exists:
+                return True
+            transaction.delete(cat_ref)
+            transaction.set(self._stats_ref(), self._stats_delta(categories=-1), merge=True)
             return True
+
+        try:
+            deleted = delete_in_transaction(self.db.transaction())
+            self.categories.remove(category_id)
+            return deleted
         except Exception as e:
             print(f"❌ Error deleting category: {e}")
             return False
 
     def update_category(self, category_id, update_data):
         try:
-            doc_ref = self.db.collection("categories").document(category_id)
-            doc_ref.update(update_data)
+            with self.unit_of_work() as uow:
+                uow.update(self.db.collection("categories").document(category_id), update_data)
+                # Renames change the categories page: bump the stats version it is cached on
+                uow.set(self._stats_ref(), self._stats_delta(), merge=True)
+            self.categories.upsert(category_id, update_data)
             return True
         except Exception as e:
             print(f"❌ Error updating category: {e}")
             return False
 
+    # ---------------- DASHBOARD STATS METHODS ----------------
+
+    def _stats_ref(self):
+        return self.db.collection(self.stats_collection).document("dashboard")
+
+    def _stats_delta(self, total=0, status_deltas=None, categories=0):
+        """Builds a merge-set payload of atomic increments for the stats document."""
+        delta = {
+            "version": firestore.Increment(1),
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }
+        if total:
+            delta["total_blogs"] = firestore.Increment(total)
+        if categories:
+            delta["categories"] = firestore.Increment(categories)
+        by_status = {s: firestore.Increment(n) for s, n in (status_deltas or {}).items() if s and n}
+        if by_status:
+            delta["by_status"] = by_status
+        return delta
+
+    def bump_stats(self, total=0, status_deltas=None, categories=0):
+        try:
+            self._stats_ref().set(self._stats_delta(total, status_deltas, categories), merge=True)
+        except Exception as e:
+            print(f"❌ Error updating dashboard stats: {e}")
+
+    def get_dashboard_stats(self):
+        """Single document read with every dashboard counter."""
+        try:
+            doc = self._stats_ref().get()
+            if not doc.exists:
+                # First run: build the counters from aggregation queries
+                return self.reconcile_stats()["stats"]
+            return self._format_stats(doc.to_dict())
+        except Exception as e:
+            print(f"❌ Error fetching dashboard stats: {e}")
+            return self._format_stats({})
+
+    def _count(self, query):
+        return query.count().get()[0][0].value
+
+    def reconcile_stats(self):
+        """
+        Recomputes every counter with aggregation queries, overwrites the
+        stats document and returns {"stats": ..., "drift": {field: (stored, actual)}}.
+        """
+        blogs = self.db.collection(self.collection_name)
+        actual = {
+            "total_blogs": self._count(blogs),
+            "categories": self._count(self.db.collection("categories")),
+            "by_status": {s: self._count(blogs.where('status', '==', s)) for s in self.STATUSES}
+        }
+
+        stored_snap = self._stats_ref().get()
+        stored = stored_snap.to_dict() if stored_snap.exists else {}
+
+        drift = self._stats_drift(stored, actual)
+        actual["version"] = stored.get("version", 0) + 1
+        self._stats_ref().set({
+            **actual,
+            "updated_at": firestore.SERVER_TIMESTAMP,
+            "reconciled_at": datetime.utcnow()
+        })
+        return {"stats": self._format_stats(actual), "drift": drift}
+
     # ---------------- ACTIVITY METHODS ----------------
 
+    def _new_activity_ref(self):
+        return self.db.collection(self.activity_collection).document()
+
+    def _activity_entry(self, user, type, action_text, blog_title):
+        now = datetime.utcnow()
+        return {
+            "user": user,
+            "type": type,
+            "action_text": action_text,
+            "blog_title": blog_title,
+            "timestamp": now,
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "expire_at": now + timedelta(days=self.activity_ttl_days)
+        }
+
+    def _stage_activity(self, uow, activity, blog_title):
+        entry = self._activity_entry(blog_title=blog_title, **activity)
+        if self.activity_writer:
+            uow.after_commit(lambda: self.activity_writer.enqueue(entry))
+        else:
+            uow.set(self._new_activity_ref(), entry)
+
     def log_activity(self, user, type, action_text, blog_title):
+        entry = self._activity_entry(user, type, action_text, blog_title)
+        if self.activity_writer:
+            self.activity_writer.enqueue(entry)
+            return True
+
         try:
-            doc_ref = self.db.collection(self.activity_collection).document()
-            doc_ref.set({
-                "user": user,
-                "type": type,
-                "action_text": action_text,
-                "blog_title": blog_title,
-                "timestamp": datetime.utcnow(),
-                "created_at": firestore.SERVER_TIMESTAMP
-            })
+            self._new_activity_ref().set(entry)
             return True
         except Exception as e:
             print(f"❌ Error logging activity: {e}")
             return False
 
-    def get_recent_activity(self, limit=10):
+    def get_recent_activity(self, limit=10, since=None):
+        """
+        Newest activity entries first. since is the cursor returned by a
+        previous call: only entries logged after it are fetched, so polling
+        clients read just what is new. Timestamps are returned as ISO-8601
+        UTC strings; the client renders the relative "Xm ago" text.
+        Returns (activities, cursor).
+        """
         try:
-            docs = (self.db.collection(self.activity_collection)
-                        .order_by("timestamp", direction=firestore.Query.DESCENDING)
-                        .limit(limit)
-                        .stream())
+            query = (self.db.collection(self.activity_collection)
+                         .order_by("timestamp", direction=firestore.Query.DESCENDING)
+                         .order_by("__name__", direction=firestore.Query.DESCENDING))
+
+            cursor = self._decode_token(since)
+            if cursor:
+                # Everything that sorts before the cursor in DESC order is newer
+                query = query.end_before({
+                    "timestamp": datetime.fromisoformat(cursor["t"]),
+                    "__name__": cursor["id"]
+                })
+
             activities = []
-            for doc in docs:
+            for doc in query.limit(limit).stream():
                 data = doc.to_dict()
-                if 'timestamp' in data:
-                    diff = datetime.utcnow() - data['timestamp'].replace(tzinfo=None)
-                    if diff.days > 0:
-                        data['timestamp'] = f"{diff.days}d ago"
-                    elif diff.seconds > 3600:
-                        data['timestamp'] = f"{diff.seconds // 3600}h ago"
-                    elif diff.seconds > 60:
-                        data['timestamp'] = f"{diff.seconds // 60}m ago"
-                    else:
-                        data['timestamp'] = "Just now"
+                data['id'] = doc.id
+                data['timestamp'] = _iso_utc(data.get('timestamp'))
+                data.pop('created_at', None)
+                data.pop('expire_at', None)
                 activities.append(data)
-            return activities
+
+            if activities and activities[0]['timestamp']:
+                newest = activities[0]
+                since = self._encode_token({"t": newest['timestamp'].rstrip('Z'), "id": newest['id']})
+            return activities, since
         except Exception as e:
             print(f"❌ Error fetching activities: {e}")
-            return []
+            return [], since
+
+    def compact_activity(self, older_than_days=7, max_entries_per_day=2000):
+        """
+        Maintenance job: folds activity entries older than older_than_days
+        into one activity_rollups/<YYYY-MM-DD> document per day (counts per
+        type + compact entries) and deletes the originals. Rollups carry
+        their own expire_at for the Firestore TTL policy.
+        Returns the number of entries compacted.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        rollup_sizes = {}
+        compacted = 0
+
+        while True:
+            docs = (self.db.collection(self.activity_collection)
+                        .where("timestamp", "<", cutoff)
+                        .order_by("timestamp")
+                        .limit(self.ROLLUP_CHUNK)
+                        .get())
+            if not docs:
+                return compacted
+
+            by_day = {}
+            for doc in docs:
+                data = doc.to_dict()
+                day = data['timestamp'].strftime("%Y-%m-%d")
+                by_day.setdefault(day, []).append(data)
+
+            # One batch: rollup upserts + deletes (<= ROLLUP_CHUNK + days writes)
+            batch = self.db.batch()
+            for day, entries in by_day.items():
+                rollup_ref = self.db.collection(self.rollup_collection).document(day)
+                if day not in rollup_sizes:
+                    snap = rollup_ref.get()
+                    rollup_sizes[day] = snap.to_dict().get('total', 0) if snap.exists else 0
+
+                counts = {}
+                for entry in entries:
+                    counts[entry.get('type', 'other')] = counts.get(entry.get('type', 'other'), 0) + 1
+                rollup = {
+                    "day": day,
+                    "total": firestore.Increment(len(entries)),
+                    "counts": {t: firestore.Increment(n) for t, n in counts.items()},
+                    "expire_at": datetime.strptime(day, "%Y-%m-%d") + timedelta(days=self.rollup_ttl_days)
+                }
+                # Keep the documents well under Firestore's 1 MiB limit
+                room = max_entries_per_day - rollup_sizes[day]
+                if room > 0:
+                    rollup["entries"] = firestore.ArrayUnion([{
+                        "user": e.get('user'),
+                        "type": e.get('type'),
+                        "action_text": e.get('action_text'),
+                        "blog_title": e.get('blog_title'),
+                        "timestamp": e.get('timestamp')
+                    } for e in entries[:room]])
+                rollup_sizes[day] += len(entries)
+                batch.set(rollup_ref, rollup, merge=True)
+
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+            compacted += len(docs)
 
     # ---------------- USER METHODS ----------------
 
@@ -236,3 +805,379 @@ class FirestoreService:
         except Exception as e:
             print(f"❌ Error saving user: {e}")
             return False
+
+    # ---------------- JOB METHODS ----------------
+
+    def _queued_job(self, job_data):
+        job_data.update({
+            "status": "QUEUED",
+            "stage": "QUEUED",
+            "progress": 0,
+            "blog_id": None,
+            "error": None,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "created_at": firestore.SERVER_TIMESTAMP,
+            "updated_at": datetime.utcnow()
+        })
+        return job_data
+
+    def create_job(self, job_data):
+        """Stores a new generation job in QUEUED state and returns its id."""
+        try:
+            doc_ref = self.db.collection(self.jobs_collection).document()
+            doc_ref.set(self._queued_job(job_data))
+            return doc_ref.id
+        except Exception as e:
+            print(f"❌ Error creating job: {e}")
+            return None
+
+    def get_job(self, job_id):
+        try:
+            doc = self.db.collection(self.jobs_collection).document(job_id).get()
+            if doc.exists:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                return data
+            return None
+        except Exception as e:
+            print(f"❌ Error fetching job {job_id}: {e}")
+            return None
+
+    def update_job(self, job_id, update_data):
+        try:
+            update_data['updated_at'] = datetime.utcnow()
+            self.db.collection(self.jobs_collection).document(job_id).update(update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating job {job_id}: {e}")
+            return False
+
+    def get_unfinished_jobs(self):
+        """Returns jobs that are still QUEUED or RUNNING (e.g. after a restart)."""
+        try:
+            docs = self.db.collection(self.jobs_collection)\
+                          .where('status', 'in', ['QUEUED', 'RUNNING']).stream()
+            jobs = []
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                jobs.append(data)
+            return jobs
+        except Exception as e:
+            print(f"❌ Error fetching unfinished jobs: {e}")
+            return []
+
+    def claim_job(self, job_id, worker_id, lease_seconds):
+        """
+        Atomically marks a job RUNNING for this worker.
+        Fails if another worker holds a lease that has not expired yet.
+        """
+        job_ref = self.db.collection(self.jobs_collection).document(job_id)
+        return self._claim_lease(job_ref, worker_id, lease_seconds)
+
+    def _claim_lease(self, doc_ref, worker_id, lease_seconds):
+        @firestore.transactional
+        def claim_in_transaction(transaction):
+            snap = doc_ref.get(transaction=transaction)
+            if not snap.exists:
+                return False
+
+            data = snap.to_dict()
+            now = datetime.utcnow()
+            lease = data.get('lease_expires_at')
+            if data.get('status') == 'RUNNING' and lease and lease.replace(tzinfo=None) > now:
+                return False
+            if data.get('status') not in ('QUEUED', 'RUNNING'):
+                return False
+
+            transaction.update(doc_ref, {
+                "status": "RUNNING",
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                "attempts": firestore.Increment(1),
+                "updated_at": now
+            })
+            return True
+
+        try:
+            return claim_in_transaction(self.db.transaction())
+        except Exception as e:
+            print(f"❌ Error claiming {doc_ref.path}: {e}")
+            return False
+
+    # ---------------- IDEMPOTENCY METHODS ----------------
+
+    def create_job_once(self, job_data, user_id, key, request_hash):
+        """
+        create_job for a request carrying an Idempotency-Key: the job and the
+        (user_id, key) record pointing at it are written in one batch, so a
+        key never points at a job that was not stored. create() on the key
+        makes the first writer win, across processes.
+        Returns (record, created): created is False for a repeat (nothing is
+        written and record is the original one); record is None on errors.
+        """
+        doc_id = hashlib.sha256(f"{user_id}\x1f{key}".encode("utf-8")).hexdigest()
+        key_ref = self.db.collection(self.idempotency_collection).document(doc_id)
+        job_ref = self.db.collection(self.jobs_collection).document()
+        now = datetime.utcnow()
+        record = {
+            "user_id": user_id,
+            "request_hash": request_hash,
+            "job_id": job_ref.id,
+            "created_at": now,
+            # Firestore TTL policy on expire_at removes old keys
+            "expire_at": now + timedelta(hours=self.idempotency_ttl_hours)
+        }
+        job_data = self._queued_job(job_data)
+        try:
+            try:
+                writes = self.db.batch()
+                writes.set(job_ref, job_data)
+                writes.create(key_ref, record)
+                writes.commit()
+                return record, True
+            except google_exceptions.AlreadyExists:
+                snap = key_ref.get()
+                existing = snap.to_dict()
+                # TTL deletion is lazy: an expired record no longer counts
+                if existing and existing['expire_at'].replace(tzinfo=None) > now:
+                    return existing, False
+
+            # Take over the expired key, unless another request just did
+            try:
+                writes = self.db.batch()
+                writes.set(job_ref, job_data)
+                if snap.exists:
+                    writes.update(key_ref, record, option=self.db.write_option(last_update_time=snap.update_time))
+                else:
+                    writes.create(key_ref, record)
+                writes.commit()
+                return record, True
+            except (google_exceptions.FailedPrecondition, google_exceptions.NotFound, google_exceptions.AlreadyExists):
+                return key_ref.get().to_dict(), False
+        except Exception as e:
+            print(f"❌ Error creating job for idempotency key: {e}")
+            return None, False
+
+    # ---------------- BATCH METHODS ----------------
+
+    def _batch_ref(self, batch_id):
+        return self.db.collection(self.batches_collection).document(batch_id)
+
+    def _batch_items(self, batch_id):
+        return self._batch_ref(batch_id).collection("items")
+
+    def create_batch(self, batch_data, items):
+        """
+        Stores a QUEUED batch and its items (dicts of prompt, auto_submit)
+        as batches/<id>/items/<0000..>. Returns the batch id.
+        """
+        try:
+            batch_ref = self.db.collection(self.batches_collection).document()
+            batch_data.update({
+                "status": "QUEUED",
+                "total": len(items),
+                "saved": 0,
+                "failed": 0,
+                "worker_id": None,
+                "lease_expires_at": None,
+                "created_at": firestore.SERVER_TIMESTAMP,
+                "updated_at": datetime.utcnow()
+            })
+
+            writes = self.db.batch()
+            writes.set(batch_ref, batch_data)
+            pending = 1
+            for index, item in enumerate(items):
+                writes.set(batch_ref.collection("items").document(f"{index:04d}"), {
+                    "index": index,
+                    "prompt": item['prompt'],
+                    "auto_submit": bool(item.get('auto_submit')),
+                    "status": "PENDING",
+                    "stage": None,
+                    "blog_id": None,
+                    "category": None,
+                    "error": None
+                })
+                pending += 1
+                if pending == 500:
+                    writes.commit()
+                    writes = self.db.batch()
+                    pending = 0
+            if pending:
+                writes.commit()
+            return batch_ref.id
+        except Exception as e:
+            print(f"❌ Error creating batch: {e}")
+            return None
+
+    def get_batch(self, batch_id, with_items=False):
+        try:
+            doc = self._batch_ref(batch_id).get()
+            if not doc.exists:
+                return None
+            data = doc.to_dict()
+            data['id'] = doc.id
+            if with_items:
+                data['items'] = self.get_batch_items(batch_id)
+            return data
+        except Exception as e:
+            print(f"❌ Error fetching batch {batch_id}: {e}")
+            return None
+
+    def get_batch_items(self, batch_id, statuses=None):
+        """Items of a batch in submission order, optionally only those in statuses."""
+        try:
+            query = self._batch_items(batch_id)
+            if statuses:
+                query = query.where('status', 'in', statuses)
+            items = []
+            for doc in query.stream():
+                data = doc.to_dict()
+                data['id'] = doc.id
+                items.append(data)
+            return sorted(items, key=lambda item: item['index'])
+        except Exception as e:
+            print(f"❌ Error fetching items of batch {batch_id}: {e}")
+            return []
+
+    def update_batch(self, batch_id, update_data):
+        try:
+            update_data['updated_at'] = datetime.utcnow()
+            self._batch_ref(batch_id).update(update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating batch {batch_id}: {e}")
+            return False
+
+    def update_batch_item(self, batch_id, item_id, update_data):
+        try:
+            self._batch_items(batch_id).document(item_id).update(update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating item {item_id} of batch {batch_id}: {e}")
+            return False
+
+    def fail_batch_item(self, batch_id, item_id, error):
+        """Marks one item FAILED and counts it on the batch, in one commit."""
+        try:
+            with self.unit_of_work() as uow:
+                uow.update(self._batch_items(batch_id).document(item_id), {"status": "FAILED", "error": error})
+                uow.update(self._batch_ref(batch_id), {
+                    "failed": firestore.Increment(1),
+                    "updated_at": datetime.utcnow()
+                })
+            return True
+        except Exception as e:
+            print(f"❌ Error failing item {item_id} of batch {batch_id}: {e}")
+            return False
+
+    def save_batch_drafts(self, batch_id, results, user_id, activity=None):
+        """
+        Creates the drafts of several finished batch items in one commit:
+        blogs, content documents, category counts (one increment per
+        category), dashboard counters, item statuses and one summary
+        activity entry. results is a list of (item_id, prepared blog_data).
+        Returns {item_id: blog_id}, or None if the commit failed.
+        """
+        if not results:
+            return {}
+        try:
+            blog_ids = {}
+            by_category = {}
+            with self.unit_of_work() as uow:
+                for item_id, blog_data in results:
+                    blog_id = self._stage_new_blog(uow, blog_data, user_id, count_category=False)
+                    blog_ids[item_id] = blog_id
+                    category_name = blog_data.get('category')
+                    if category_name:
+                        by_category[category_name] = by_category.get(category_name, 0) + 1
+                    uow.update(self._batch_items(batch_id).document(item_id), {
+                        "status": "SAVED",
+                        "stage": "COMPLETED",
+                        "blog_id": blog_id,
+                        "category": category_name,
+                        "error": None
+                    })
+
+                for category_name, n in by_category.items():
+                    self._stage_category_count(uow, category_name, n)
+                uow.update(self._batch_ref(batch_id), {
+                    "saved": firestore.Increment(len(results)),
+                    "updated_at": datetime.utcnow()
+                })
+                if activity:
+                    self._stage_activity(uow, activity, f"{len(results)} blog{'s' if len(results) != 1 else ''}")
+            return blog_ids
+        except Exception as e:
+            print(f"❌ Error saving drafts of batch {batch_id}: {e}")
+            return None
+
+    def reset_failed_batch_items(self, batch_id):
+        """Puts FAILED items back to PENDING and re-queues the batch. Returns how many were reset."""
+        items = self.get_batch_items(batch_id, statuses=["FAILED"])
+        if not items:
+            return 0
+        try:
+            # Items are few hundred at most; chunks stay below the 500-write batch limit
+            for start in range(0, len(items), 400):
+                with self.unit_of_work() as uow:
+                    chunk = items[start:start + 400]
+                    for item in chunk:
+                        uow.update(self._batch_items(batch_id).document(item['id']),
+                                   {"status": "PENDING", "stage": None, "error": None})
+                    uow.update(self._batch_ref(batch_id), {
+                        "failed": firestore.Increment(-len(chunk)),
+                        "status": "QUEUED",
+                        "lease_expires_at": None,
+                        "updated_at": datetime.utcnow()
+                    })
+            return len(items)
+        except Exception as e:
+            print(f"❌ Error resetting items of batch {batch_id}: {e}")
+            return 0
+
+    def get_unfinished_batches(self):
+        try:
+            docs = self.db.collection(self.batches_collection)\
+                          .where('status', 'in', ['QUEUED', 'RUNNING']).stream()
+            return [dict(doc.to_dict(), id=doc.id) for doc in docs]
+        except Exception as e:
+            print(f"❌ Error fetching unfinished batches: {e}")
+            return []
+
+    def claim_batch(self, batch_id, worker_id, lease_seconds):
+        """Same lease protocol as claim_job, for a whole batch."""
+        return self._claim_lease(self._batch_ref(batch_id), worker_id, lease_seconds)
+
+
+    # ---------------- MIGRATION METHODS ----------------
+
+    def export_documents(self):
+        """Every document of COLLECTIONS, with each batch's items (batches/<id>/items)."""
+        for collection in self.COLLECTIONS:
+            for doc in self.db.collection(collection).stream():
+                yield collection, doc.id, doc.to_dict()
+                if collection == self.batches_collection:
+                    for item in doc.reference.collection("items").stream():
+                        yield f"{collection}/{doc.id}/items", item.id, item.to_dict()
+
+    def import_documents(self, documents, batch_size=400):
+        """Overwrites documents with the same path; caches are dropped at the end."""
+        written = 0
+        batch = self.db.batch()
+        pending = 0
+        for collection, doc_id, data in documents:
+            batch.set(self.db.collection(collection).document(doc_id), data)
+            pending += 1
+            if pending == batch_size:
+                batch.commit()
+                written += pending
+                batch = self.db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+            written += pending
+        self.blog_cache.clear()
+        return written
@@ -0,0 +1,96 @@
+import copy
+
+from firebase_admin import firestore
+
+
+class UnitOfWork:
+    """
+    Collects the blind writes of one user action (blog doc, category count,
+    dashboard counters, activity entry) and commits them as a single
+    WriteBatch: one RPC, all-or-nothing. Writes that depend on whether a
+    document still exists are staged with guard(); the unit of work then
+    commits as a transaction that reads those documents first. Other
+    changes that depend on a read (status moves, deletes) use transactions
+    in FirestoreService instead.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._writes = []  # (method, ref, args), applied to the batch or transaction at commit
+        self._guards = []  # (ref, if_exists, if_missing)
+        self._stats = {"total": 0, "status_deltas": {}, "categories": 0}
+        self._after_commit = []
+
+    @property
+    def writes(self):
+        return len(self._writes)
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref, (data,), {"merge": merge}))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref, (data,), {}))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref, (), {}))
+
+    def stats(self, total=0, status_deltas=None, categories=0):
+        """Accumulates dashboard counter changes; written once at commit."""
+        self._stats["total"] += total
+        self._stats["categories"] += categories
+        for status, n in (status_deltas or {}).items():
+            self._stats["status_deltas"][status] = self._stats["status_deltas"].get(status, 0) + n
+
+    def after_commit(self, callback):
+        """Runs callback once the batch has been committed (local caches, write-behind)."""
+        self._after_commit.append(callback)
+
+    def guard(self, ref, if_exists, if_missing):
+        """
+        Stages writes that depend on whether ref exists at commit time:
+        if_exists(uow) or if_missing(uow) is called inside the commit
+        transaction (again on each retry) to stage them.
+        """
+        self._guards.append((ref, if_exists, if_missing))
+
+    def commit(self):
+        if self._guards:
+            self._commit_in_transaction()
+        else:
+            self._stage_stats()
+            if self._writes:
+                batch = self.service.db.batch()
+                self._apply(batch)
+                batch.commit()
+        for callback in self._after_commit:
+            callback()
+
+    def _commit_in_transaction(self):
+        base = (len(self._writes), copy.deepcopy(self._stats), len(self._after_commit))
+
+        @firestore.transactional
+        def commit_in_transaction(transaction):
+            # A retried attempt starts again from the unconditional writes
+            del self._writes[base[0]:]
+            self._stats = copy.deepcopy(base[1])
+            del self._after_commit[base[2]:]
+
+            # Every read before the first write, in one round trip
+            refs = [ref for ref, _, _ in self._guards]
+            existing = {snap.reference.path for snap in self.service.db.get_all(refs, transaction=transaction)
+                        if snap.exists}
+            for ref, if_exists, if_missing in self._guards:
+                (if_exists if ref.path in existing else if_missing)(self)
+
+            self._stage_stats()
+            self._apply(transaction)
+
+        commit_in_transaction(self.service.db.transaction())
+
+    def _stage_stats(self):
+        if self._stats["total"] or self._stats["categories"] or any(self._stats["status_deltas"].values()):
+            self.set(self.service._stats_ref(), self.service._stats_delta(**self._stats), merge=True)
+
+    def _apply(self, writer):
+        for method, ref, args, kwargs in self._writes:
+            getattr(writer, method)(ref, *args, **kwargs)
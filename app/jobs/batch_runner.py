@@ -0,0 +1,212 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from app.agents.blog_agent import BlogAgent
+from app.agents.drafts_agent import DraftsAgent
+from app.registry import ClientRegistry
+from app.jobs.job_queue import lease_lapsed
+from app.jobs.pipeline import categorize_generated_blog
+from app.firebase.blog_content import extract_markdown
+from app.ml.categorizer import LocalCategorizer
+from app.observability.instrument import stage
+from app.observability.tracing import trace
+
+
+class BatchRunner:
+    """
+    Runs generation for a whole list of prompts. Each batch gets its own
+    bounded pool (its concurrency), finished items are saved as drafts in
+    chunks through FirestoreService.save_batch_drafts, and progress lives
+    in batches/<id> and its items subcollection, so a restarted worker
+    resumes the items that were not saved yet.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, app=None):
+        with cls._lock:
+            if cls._instance is None:
+                if app is None:
+                    raise ValueError("Flask app required for first-time BatchRunner initialization.")
+                cls._instance = cls(app)
+        return cls._instance
+
+    def __init__(self, app):
+        self.app = app
+        self.db_service = ClientRegistry.get_instance().db_service
+        self.lease_seconds = app.config['JOB_LEASE_SECONDS']
+        self.sweep_seconds = app.config['JOB_SWEEP_SECONDS']
+        self.default_concurrency = app.config['BATCH_CONCURRENCY']
+        self.max_concurrency = app.config['BATCH_MAX_CONCURRENCY']
+        self.save_chunk = app.config['BATCH_SAVE_CHUNK']
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        # One coordinator thread per running batch; item work runs in the batch's own pool
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['BATCH_RUNNERS'],
+            thread_name_prefix="batch"
+        )
+        self._dispatched = set()  # Batch ids queued or running in this process
+        self._dispatched_lock = threading.Lock()
+
+    def submit(self, items, user_id, user_name, concurrency=None, force_fresh=False):
+        """Stores a QUEUED batch of items (dicts of prompt, auto_submit) and starts it. Returns the batch id."""
+        concurrency = max(1, min(concurrency or self.default_concurrency, self.max_concurrency))
+        batch_id = self.db_service.create_batch({
+            "user_id": user_id,
+            "user_name": user_name,
+            "concurrency": concurrency,
+            "force_fresh": bool(force_fresh)
+        }, items)
+        if batch_id:
+            self._dispatch(batch_id)
+        return batch_id
+
+    def retry_failed(self, batch_id):
+        """
+        Re-runs the FAILED items of a batch, and the unfinished ones of a batch
+        whose run failed as a whole. Returns how many were re-queued.
+        """
+        batch = self.db_service.get_batch(batch_id)
+        reset = self.db_service.reset_failed_batch_items(batch_id)
+        if batch and batch.get('status') == 'FAILED':
+            unfinished = self.db_service.get_batch_items(batch_id, statuses=["PENDING", "RUNNING"])
+            self.db_service.update_batch(batch_id, {"status": "QUEUED", "error": None, "lease_expires_at": None})
+            reset = len(unfinished)
+        if reset:
+            self._dispatch(batch_id)
+        return reset
+
+    def resume_unfinished(self):
+        """Same as JobQueue.resume_unfinished: resumes at startup, then sweeps for lapsed leases."""
+        self._resume(self.db_service.get_unfinished_batches())
+        while self.sweep_seconds > 0:
+            time.sleep(self.sweep_seconds)
+            batches = self.db_service.get_unfinished_batches()
+            self._resume([batch for batch in batches if lease_lapsed(batch, self.lease_seconds)])
+
+    def _resume(self, batches):
+        with self._dispatched_lock:
+            batches = [batch for batch in batches if batch['id'] not in self._dispatched]
+        for batch in batches:
+            self._dispatch(batch['id'])
+        if batches:
+            print(f"--- Resumed {len(batches)} unfinished generation batch(es) ---")
+
+    def _dispatch(self, batch_id):
+        with self._dispatched_lock:
+            self._dispatched.add(batch_id)
+        self.executor.submit(self._run, batch_id)
+
+    # ---------------- COORDINATOR ----------------
+
+    def _renew_lease(self, batch_id):
+        self.db_service.update_batch(batch_id, {
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        })
+
+    def _run(self, batch_id):
+        with trace(batch_id):
+            try:
+                self._run_batch(batch_id)
+            except Exception as e:
+                # Otherwise it stays RUNNING until the lease expires and a sweep resumes it
+                print(f"❌ Batch {batch_id} failed: {e}")
+                self.db_service.update_batch(batch_id, {
+                    "status": "FAILED",
+                    "error": str(e),
+                    "lease_expires_at": None,
+                    "finished_at": datetime.utcnow()
+                })
+            finally:
+                with self._dispatched_lock:
+                    self._dispatched.discard(batch_id)
+
+    def _run_batch(self, batch_id):
+        if not self.db_service.claim_batch(batch_id, self.worker_id, self.lease_seconds):
+            return
+
+        batch = self.db_service.get_batch(batch_id)
+        if not batch:
+            return
+
+        # RUNNING items were interrupted mid-generation by a previous worker
+        items = self.db_service.get_batch_items(batch_id, statuses=["PENDING", "RUNNING"])
+        print(f"--- Batch {batch_id}: {len(items)} item(s), concurrency {batch['concurrency']} ---")
+
+        finished = []
+        with ThreadPoolExecutor(max_workers=batch['concurrency'], thread_name_prefix=f"batch-{batch_id[:6]}") as pool:
+            futures = {pool.submit(self._generate_item, batch, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    finished.append((item['id'], future.result()))
+                except Exception as e:
+                    print(f"❌ Batch {batch_id} item {item['index']} failed: {e}")
+                    self.db_service.fail_batch_item(batch_id, item['id'], str(e))
+
+                if len(finished) >= self.save_chunk:
+                    self._save(batch, finished)
+                    finished = []
+                self._renew_lease(batch_id)
+
+        self._save(batch, finished)
+
+        batch = self.db_service.get_batch(batch_id)
+        self.db_service.update_batch(batch_id, {
+            "status": "COMPLETED" if not batch.get('failed') else "PARTIAL",
+            "finished_at": datetime.utcnow()
+        })
+
+    def _save(self, batch, finished):
+        """Creates the drafts of finished items in one commit; on failure the items fail individually."""
+        if not finished:
+            return
+        # Saving moves the body out of blog_data, so keep the text for the categorizer
+        texts = [(blog.get('category'), blog.get('title'), extract_markdown(blog.get('content')),
+                  blog.get('category_source')) for _, blog in finished]
+        with stage("save_batch"):
+            saved = self.db_service.save_batch_drafts(batch['id'], finished, batch['user_id'], activity={
+                "user": batch.get('user_name', 'Admin'),
+                "type": "generated",
+                "action_text": "generated a batch of"
+            })
+        if saved is None:
+            for item_id, _ in finished:
+                self.db_service.fail_batch_item(batch['id'], item_id, "Failed to save the generated blog.")
+            return
+
+        categorizer = LocalCategorizer.get_instance()
+        for category, title, body, source in texts:
+            categorizer.learn(category, title, body, source)
+
+    # ---------------- ITEM WORKER ----------------
+
+    def _generate_item(self, batch, item):
+        """Outline + content + category for one item. Returns the prepared blog_data."""
+        batch_id = batch['id']
+        force_fresh = batch.get('force_fresh', False)
+
+        def on_stage(stage):
+            self.db_service.update_batch_item(batch_id, item['id'], {"status": "RUNNING", "stage": stage})
+
+        # Item threads do not inherit the coordinator's trace
+        with self.app.app_context(), trace(batch_id):
+            # 1. Outline + content
+            generated_data = BlogAgent(force_fresh=force_fresh).run_pipeline_shared(item['prompt'], on_stage=on_stage)
+            if generated_data.get('status') == 'failed':
+                raise RuntimeError(generated_data.get('error', 'Generation failed.'))
+
+            # 2. Categorize
+            on_stage("CATEGORIZING")
+            categorize_generated_blog(generated_data, self.db_service, force_fresh=force_fresh)
+
+            # 3. Normalize for the bulk save
+            generated_data['status'] = "UNDER_REVIEW" if item.get('auto_submit') else "DRAFT"
+            on_stage("SAVING")
+            return DraftsAgent(db_service=self.db_service).prepare(generated_data, batch['user_id'])
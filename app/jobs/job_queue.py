@@ -0,0 +1,262 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.agents.blog_agent import BlogAgent
+from app.registry import ClientRegistry
+from app.jobs.pipeline import save_generated_blog, save_generated_blog_async
+from app.llm.event_loop import EventLoopThread
+from app.observability.tracing import trace, log_event
+
+
+def lease_lapsed(record, lease_seconds):
+    """
+    True if nobody is working on an unfinished job or batch: RUNNING past its
+    lease (the worker died mid-run), or QUEUED and untouched for lease_seconds.
+    """
+    now = datetime.utcnow()
+    if record.get('status') == 'RUNNING':
+        lease = record.get('lease_expires_at')
+        return not lease or lease.replace(tzinfo=None) <= now
+    touched = record.get('updated_at')
+    return not touched or touched.replace(tzinfo=None) + timedelta(seconds=lease_seconds) <= now
+
+
+class JobQueue:
+    """
+    Runs the blog generation pipeline in the background so that request
+    threads return immediately. Job state lives in Firestore.
+    With GENERATION_ASYNC jobs are coroutines on the event loop (up to
+    GENERATION_MAX_CONCURRENT, by default LLM_MAX_CONCURRENCY, at once); otherwise each job holds one of
+    GENERATION_WORKERS threads for its whole run.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Rough progress percentage reported for each pipeline stage
+    STAGE_PROGRESS = {
+        "QUEUED": 0,
+        "OUTLINE": 10,
+        "CONTENT": 35,
+        "CATEGORIZING": 75,
+        "SAVING": 90,
+        "COMPLETED": 100
+    }
+
+    @classmethod
+    def get_instance(cls, app=None):
+        with cls._lock:
+            if cls._instance is None:
+                if app is None:
+                    raise ValueError("Flask app required for first-time JobQueue initialization.")
+                cls._instance = cls(app)
+        return cls._instance
+
+    def __init__(self, app):
+        self.app = app
+        self.db_service = ClientRegistry.get_instance().db_service
+        self.lease_seconds = app.config['JOB_LEASE_SECONDS']
+        self.sweep_seconds = app.config['JOB_SWEEP_SECONDS']
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config['GENERATION_WORKERS'],
+            thread_name_prefix="generation"
+        )
+        self.use_async = app.config['GENERATION_ASYNC']
+        # Jobs beyond what the gateway can serve wait for a slot here rather than in its queues
+        self.max_concurrent = app.config['GENERATION_MAX_CONCURRENT'] or app.config['LLM_MAX_CONCURRENCY']
+        self._slots = None  # asyncio.Semaphore, created on the loop
+        self._dispatched = set()  # Job ids queued or running in this process
+        self._dispatched_lock = threading.Lock()
+
+    def submit(self, prompt, auto_submit, user_id, user_name, force_fresh=False):
+        """Stores a QUEUED job and hands it to the worker pool. Returns the job id."""
+        job_id = self.db_service.create_job(self._job_data(prompt, auto_submit, user_id, user_name, force_fresh))
+        if job_id:
+            self._submitted(job_id)
+        return job_id
+
+    def submit_once(self, prompt, auto_submit, user_id, user_name, idempotency_key, request_hash, force_fresh=False):
+        """
+        submit() for a request carrying an Idempotency-Key. Returns (record,
+        created) as db_service.create_job_once: a repeat starts nothing and
+        gets the original record (with its job_id) back.
+        """
+        record, created = self.db_service.create_job_once(
+            self._job_data(prompt, auto_submit, user_id, user_name, force_fresh),
+            user_id, idempotency_key, request_hash
+        )
+        if created:
+            self._submitted(record['job_id'])
+        return record, created
+
+    def _job_data(self, prompt, auto_submit, user_id, user_name, force_fresh):
+        return {
+            "prompt": prompt,
+            "auto_submit": bool(auto_submit),
+            "force_fresh": bool(force_fresh),
+            "user_id": user_id,
+            "user_name": user_name
+        }
+
+    def _submitted(self, job_id):
+        # Links the request's trace to the job's (which uses the job id)
+        log_event("job_submitted", job_id=job_id)
+        self._dispatch(job_id)
+
+    def resume_unfinished(self):
+        """
+        Re-queues jobs left QUEUED/RUNNING by a previous (crashed or restarted)
+        worker. A job still leased by a worker that just died cannot be claimed
+        yet, so after that every JOB_SWEEP_SECONDS the jobs whose lease has
+        lapsed are picked up too. Runs for the life of the process.
+        """
+        self._resume(self.db_service.get_unfinished_jobs())
+        while self.sweep_seconds > 0:
+            time.sleep(self.sweep_seconds)
+            jobs = self.db_service.get_unfinished_jobs()
+            self._resume([job for job in jobs if lease_lapsed(job, self.lease_seconds)])
+
+    def _resume(self, jobs):
+        with self._dispatched_lock:
+            jobs = [job for job in jobs if job['id'] not in self._dispatched]
+        for job in jobs:
+            self._dispatch(job['id'])
+        if jobs:
+            print(f"--- Resumed {len(jobs)} unfinished generation job(s) ---")
+
+    def _dispatch(self, job_id):
+        with self._dispatched_lock:
+            self._dispatched.add(job_id)
+        if self.use_async:
+            EventLoopThread.get_instance().submit(self._run_async(job_id))
+        else:
+            self.executor.submit(self._run, job_id)
+
+    # ---------------- WORKER ----------------
+
+    def _set_stage(self, job_id, stage):
+        self.db_service.update_job(job_id, {
+            "stage": stage,
+            "progress": self.STAGE_PROGRESS.get(stage, 0),
+            "lease_expires_at": self._lease_deadline()
+        })
+
+    def _lease_deadline(self):
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    def _run(self, job_id):
+        # Job logs and stage timings carry the job id as their trace id
+        try:
+            with trace(job_id):
+                self._run_job(job_id)
+        finally:
+            self._done(job_id)
+
+    def _done(self, job_id):
+        with self._dispatched_lock:
+            self._dispatched.discard(job_id)
+
+    def _run_job(self, job_id):
+        # Another worker may already own this job (e.g. two processes resuming at once)
+        if not self.db_service.claim_job(job_id, self.worker_id, self.lease_seconds):
+            return
+
+        job = self.db_service.get_job(job_id)
+        if not job:
+            return
+
+        with self.app.app_context():
+            try:
+                # 1. Outline + content
+                # Identical prompts running at the same time share one pipeline
+                blog_ai = BlogAgent(force_fresh=job.get('force_fresh', False))
+                generated_data = blog_ai.run_pipeline_shared(
+                    job['prompt'],
+                    on_stage=lambda stage: self._set_stage(job_id, stage)
+                )
+                if generated_data.get('status') == 'failed':
+                    raise RuntimeError(generated_data.get('error', 'Generation failed.'))
+
+                # 2. Categorize, save and log
+                blog_id, _ = save_generated_blog(
+                    generated_data,
+                    job.get('auto_submit'),
+                    job['user_id'],
+                    job.get('user_name', 'Admin'),
+                    self.db_service,
+                    on_stage=lambda stage: self._set_stage(job_id, stage),
+                    force_fresh=job.get('force_fresh', False)
+                )
+
+                self._complete(job_id, blog_id)
+            except Exception as e:
+                self._fail(job_id, e)
+
+    async def _run_async(self, job_id):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        try:
+            async with self._slots:
+                with trace(job_id):
+                    await self._run_job_async(job_id)
+        finally:
+            self._done(job_id)
+
+    async def _run_job_async(self, job_id):
+        """_run_job on the event loop: Gemini is awaited, storage calls run in threads."""
+        if not await asyncio.to_thread(self.db_service.claim_job, job_id, self.worker_id, self.lease_seconds):
+            return
+
+        job = await asyncio.to_thread(self.db_service.get_job, job_id)
+        if not job:
+            return
+
+        with self.app.app_context():
+            try:
+                # 1. Outline + content
+                blog_ai = BlogAgent(force_fresh=job.get('force_fresh', False))
+                generated_data = await blog_ai.run_pipeline_shared_async(
+                    job['prompt'],
+                    on_stage=lambda stage: self._set_stage(job_id, stage)
+                )
+                if generated_data.get('status') == 'failed':
+                    raise RuntimeError(generated_data.get('error', 'Generation failed.'))
+
+                # 2. Categorize, save and log
+                blog_id, _ = await save_generated_blog_async(
+                    generated_data,
+                    job.get('auto_submit'),
+                    job['user_id'],
+                    job.get('user_name', 'Admin'),
+                    self.db_service,
+                    on_stage=lambda stage: self._set_stage(job_id, stage),
+                    force_fresh=job.get('force_fresh', False)
+                )
+                await asyncio.to_thread(self._complete, job_id, blog_id)
+            except Exception as e:
+                await asyncio.to_thread(self._fail, job_id, e)
+
+    def _complete(self, job_id, blog_id):
+        self.db_service.update_job(job_id, {
+            "status": "COMPLETED",
+            "stage": "COMPLETED",
+            "progress": 100,
+            "blog_id": blog_id,
+            "finished_at": datetime.utcnow()
+        })
+        log_event("job", status="COMPLETED", blog_id=blog_id)
+
+    def _fail(self, job_id, error):
+        print(f"❌ Job {job_id} failed: {error}")
+        log_event("job", status="FAILED", error=str(error))
+        self.db_service.update_job(job_id, {
+            "status": "FAILED",
+            "error": str(error),
+            "finished_at": datetime.utcnow()
+        })
@@ -0,0 +1,88 @@
+import asyncio
+from app.agents.category_agent import CategoryAgent
+from app.agents.drafts_agent import DraftsAgent
+from app.ml.categorizer import LocalCategorizer
+from app.observability.instrument import stage
+
+
+def save_generated_blog(generated_data, auto_submit, user_id, user_name, db_service, on_stage=None, force_fresh=False):
+    """
+    Categorizes a generated blog, saves it as DRAFT or UNDER_REVIEW and logs
+    the activity. Shared by background jobs and the streaming endpoint.
+    Returns (blog_id, category); raises RuntimeError if the save fails.
+    """
+    # 1. Categorize
+    if on_stage:
+        on_stage("CATEGORIZING")
+    categorize_generated_blog(generated_data, db_service, force_fresh=force_fresh)
+
+    # 2. Save
+    if on_stage:
+        on_stage("SAVING")
+    return _save_categorized(generated_data, auto_submit, user_id, user_name, db_service)
+
+
+async def save_generated_blog_async(generated_data, auto_submit, user_id, user_name, db_service,
+                                    on_stage=None, force_fresh=False):
+    """
+    save_generated_blog for coroutines on the event loop: the category LLM
+    call is awaited and only storage work (and on_stage) runs in threads.
+    """
+    if on_stage:
+        await asyncio.to_thread(on_stage, "CATEGORIZING")
+    await categorize_generated_blog_async(generated_data, db_service, force_fresh=force_fresh)
+
+    if on_stage:
+        await asyncio.to_thread(on_stage, "SAVING")
+    return await asyncio.to_thread(_save_categorized, generated_data, auto_submit, user_id, user_name, db_service)
+
+
+def _save_categorized(generated_data, auto_submit, user_id, user_name, db_service):
+    # Blog, counters and activity entry in one commit
+    assigned_cat = generated_data['category']
+    generated_data['status'] = "UNDER_REVIEW" if auto_submit else "DRAFT"
+    title, body = generated_data.get('title'), generated_data.get('content', {}).get('markdown', '')
+    draft_agent = DraftsAgent(db_service=db_service)
+    with stage("save"):
+        blog_id = draft_agent.create_initial_draft(generated_data, user_id, activity={
+            "user": user_name,
+            "type": "generated",
+            "action_text": f"generated a blog in {assigned_cat}"
+        })
+    if not blog_id:
+        raise RuntimeError("Failed to save the generated blog.")
+
+    # The local categorizer learns from blogs the LLM categorized
+    LocalCategorizer.get_instance().learn(assigned_cat, title, body, generated_data['category_source'])
+    return blog_id, assigned_cat
+
+
+def categorize_generated_blog(generated_data, db_service, force_fresh=False):
+    """
+    Picks a category for a generated blog and stores it on generated_data,
+    with category_source ("local", "llm" or "fallback") and category_confidence.
+    """
+    cat_agent = CategoryAgent(force_fresh=force_fresh, db_service=db_service)
+    content_text = generated_data.get('content', {}).get('markdown', '')
+    with stage("categorize"):
+        result = cat_agent.categorize_with_confidence(generated_data.get('title'), content_text)
+    return _store_category(generated_data, result)
+
+
+async def categorize_generated_blog_async(generated_data, db_service, force_fresh=False):
+    """categorize_generated_blog for coroutines on the event loop."""
+    cat_agent = CategoryAgent(force_fresh=force_fresh, db_service=db_service)
+    content_text = generated_data.get('content', {}).get('markdown', '')
+    with stage("categorize"):
+        result = await cat_agent.categorize_with_confidence_async(generated_data.get('title'), content_text)
+    return _store_category(generated_data, result)
+
+
+def _store_category(generated_data, result):
+    category, confidence, source = result
+    generated_data.update({
+        "category": category,
+        "category_source": source,
+        "category_confidence": confidence
+    })
+    return category
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.stage = None
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def on_stage(self, stage):
+        # Stages of the shared run are forwarded to every caller waiting on it
+        with self.lock:
+            self.stage = stage
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(stage)
+            except Exception as e:
+                print(f"⚠️ Stage listener failed: {e}")
+
+    def join(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+            stage = self.stage
+        if stage:
+            listener(stage)  # Late joiners catch up on the current stage
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs
+    fn(on_stage), callers arriving while it runs wait for and share its
+    result (or exception). Nothing is cached once the call has finished.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, on_stage=None):
+        """Returns (result, shared): shared is True for callers that joined a running call."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if on_stage:
+            call.join(on_stage)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(call.on_stage)
+            return call.result, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop. The shared run is a
+    task of its own: a caller that is cancelled stops waiting without
+    cancelling the run for the others, and the run is cancelled once no
+    caller is left. Stage callbacks are plain functions, run in threads.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, on_stage=None):
+        """fn(on_stage) returns the coroutine to share. Returns (result, shared)."""
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            call.callers = 0
+            call.task = asyncio.ensure_future(self._run(key, call, fn))
+            self._calls[key] = call
+
+        call.callers += 1
+        try:
+            if on_stage:
+                await asyncio.to_thread(call.join, on_stage)
+            return await asyncio.shield(call.task), not leader
+        finally:
+            call.callers -= 1
+            if call.callers == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def _run(self, key, call, fn):
+        try:
+            return await fn(call.on_stage)
+        finally:
+            self._calls.pop(key, None)
+
+    def in_flight(self):
+        return len(self._calls)
@@ -0,0 +1,310 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.llm.gateway import LLMGateway
+from app.observability.instrument import LLM_SECONDS, record_llm_usage
+from app.observability.metrics import timed
+
+
+class LLMCache:
+    """
+    Two-tier cache for Gemini responses.
+    Tier 1: in-process LRU with TTL. Tier 2: SQLite file shared by every
+    worker process on the host. Keys are built from the normalized prompt,
+    the model name and the generation parameters.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Expired rows are purged from SQLite every N writes
+    PURGE_EVERY = 200
+
+    @classmethod
+    def configure(cls, config):
+        """Builds the process-wide cache from the Flask config (called in create_app)."""
+        with cls._lock:
+            cls._instance = cls(
+                enabled=config['LLM_CACHE_ENABLED'],
+                path=config['LLM_CACHE_PATH'],
+                ttl=config['LLM_CACHE_TTL'],
+                max_entries=config['LLM_CACHE_MAX_ENTRIES'],
+                disabled_agents=config['LLM_CACHE_DISABLED_AGENTS']
+            )
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        # Scripts that never call create_app (e.g. verify_setup.py) get a disabled cache
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(enabled=False)
+        return cls._instance
+
+    def __init__(self, enabled=True, path=None, ttl=86400, max_entries=512, disabled_agents=()):
+        self.enabled = enabled
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disabled_agents = {a.strip().lower() for a in disabled_agents if a.strip()}
+
+        self._memory = OrderedDict()  # key -> (expires_at, text)
+        self._memory_lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "writes": 0, "errors": 0}
+
+        if self.enabled and self.path:
+            self._init_disk()
+
+    # ---------------- KEYS ----------------
+
+    @staticmethod
+    def make_key(prompt, model_name, generation_config=None):
+        normalized = " ".join(prompt.split())
+        params = json.dumps(generation_config or {}, sort_keys=True, default=str)
+        raw = "\x1f".join([model_name, params, normalized])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_enabled_for(self, agent):
+        return self.enabled and agent.lower() not in self.disabled_agents
+
+    # ---------------- LOOKUPS ----------------
+
+    def get(self, key):
+        now = time.time()
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return entry[1]
+            if entry:
+                del self._memory[key]
+
+        text = self._disk_get(key, now)
+        if text is not None:
+            self._remember(key, text, now)
+            self._count("disk_hits")
+            return text
+
+        self._count("misses")
+        return None
+
+    def set(self, key, text):
+        now = time.time()
+        self._remember(key, text, now)
+        self._disk_set(key, text, now)
+        self._count("writes")
+
+    def record_bypass(self):
+        self._count("bypassed")
+
+    def stats(self):
+        with self._memory_lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+    def _remember(self, key, text, now):
+        with self._memory_lock:
+            self._memory[key] = (now + self.ttl, text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _count(self, name):
+        with self._memory_lock:
+            self._counters[name] += 1
+
+    # ---------------- SQLITE TIER ----------------
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_disk(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = self._connection()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ LLM cache disabled on-disk tier: {e}")
+            self.path = None
+
+    def _disk_get(self, key, now):
+        if not self.enabled or not self.path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT text FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            print(f"❌ LLM cache read error: {e}")
+            self._count("errors")
+            return None
+
+    def _disk_set(self, key, text, now):
+        if not self.enabled or not self.path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, text, expires_at) VALUES (?, ?, ?)",
+                (key, text, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"❌ LLM cache write error: {e}")
+            self._count("errors")
+
+
+def generate_text(model, prompt, agent, bypass=False, generation_config=None):
+    """
+    Returns model.generate_content(prompt).text, served from the cache when
+    possible. agent names the caller for per-agent opt-out ('outline', ...).
+    bypass=True always calls the model (and refreshes the cached entry).
+    """
+    cache = LLMCache.get_instance()
+    if not cache.is_enabled_for(agent):
+        return _call_gemini(model, prompt, agent, generation_config)
+
+    key = LLMCache.make_key(prompt, model.model_name, generation_config)
+    if bypass:
+        cache.record_bypass()
+    else:
+        with timed(LLM_SECONDS, agent=agent, source="cache"):
+            cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    text = _call_gemini(model, prompt, agent, generation_config)
+    cache.set(key, text)
+    return text
+
+
+def _call_gemini(model, prompt, agent, generation_config=None):
+    with timed(LLM_SECONDS, agent=agent, source="gemini"):
+        response = LLMGateway.get_instance().generate(model, prompt, generation_config)
+        text = response.text
+    record_llm_usage(agent, response)
+    return text
+
+
+async def generate_text_async(model, prompt, agent, bypass=False, generation_config=None):
+    """
+    generate_text for coroutines on the event loop: a miss awaits Gemini
+    without holding a thread. Cache reads and writes (SQLite behind the
+    memory tier) run in the loop's executor so they never block the loop.
+    """
+    cache = LLMCache.get_instance()
+    if not cache.is_enabled_for(agent):
+        return await _call_gemini_async(model, prompt, agent, generation_config)
+
+    key = LLMCache.make_key(prompt, model.model_name, generation_config)
+    if bypass:
+        cache.record_bypass()
+    else:
+        with timed(LLM_SECONDS, agent=agent, source="cache"):
+            cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+
+    text = await _call_gemini_async(model, prompt, agent, generation_config)
+    await asyncio.to_thread(cache.set, key, text)
+    return text
+
+
+async def _call_gemini_async(model, prompt, agent, generation_config=None):
+    with timed(LLM_SECONDS, agent=agent, source="gemini"):
+        response = await LLMGateway.get_instance().generate_async(model, prompt, generation_config)
+        text = response.text
+    record_llm_usage(agent, response)
+    return text
+
+
+def stream_text(model, prompt, agent, bypass=False, generation_config=None):
+    """
+    Streaming counterpart of generate_text: yields text chunks. A cache hit
+    is yielded as a single chunk; a miss is streamed and stored once complete.
+    """
+    cache = LLMCache.get_instance()
+    use_cache = cache.is_enabled_for(agent)
+    key = LLMCache.make_key(prompt, model.model_name, generation_config)
+
+    if use_cache and not bypass:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    elif use_cache:
+        cache.record_bypass()
+
+    parts = []
+    chunk = None
+    for chunk in LLMGateway.get_instance().stream(model, prompt, generation_config):
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety/finish metadata)
+            continue
+        if text:
+            parts.append(text)
+            yield text
+    if getattr(chunk, "usage_metadata", None) is not None:
+        # Newer SDKs report the whole stream's usage on the last chunk
+        record_llm_usage(agent, chunk)
+
+    if use_cache and parts:
+        cache.set(key, "".join(parts))
+
+
+async def stream_text_async(model, prompt, agent, bypass=False, generation_config=None):
+    """Async counterpart of stream_text (an async generator of text chunks)."""
+    cache = LLMCache.get_instance()
+    use_cache = cache.is_enabled_for(agent)
+    key = LLMCache.make_key(prompt, model.model_name, generation_config)
+
+    if use_cache and not bypass:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+    elif use_cache:
+        cache.record_bypass()
+
+    parts = []
+    chunk = None
+    async for chunk in LLMGateway.get_instance().stream_async(model, prompt, generation_config):
+        try:
+            text = chunk.text
+        except ValueError:
+            continue
+        if text:
+            parts.append(text)
+            yield text
+    if getattr(chunk, "usage_metadata", None) is not None:
+        record_llm_usage(agent, chunk)
+
+    if use_cache and parts:
+        await asyncio.to_thread(cache.set, key, "".join(parts))
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EventLoopThread:
+    """
+    One asyncio event loop per process, running on a daemon thread. Gemini
+    calls awaited here hold no thread while they wait, so a process can
+    keep hundreds of slow generations in flight. Blocking work started
+    from coroutines (storage calls) goes to the loop's default executor.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, config):
+        with cls._lock:
+            cls._instance = cls(io_workers=config['ASYNC_IO_WORKERS'])
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        # Scripts that never call create_app get the defaults
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, io_workers=16):
+        self.io_workers = io_workers
+        self._loop = None
+        self._start_lock = threading.Lock()
+
+    def loop(self):
+        """The running loop; its thread is started on first use."""
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                loop.set_default_executor(
+                    ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="async-io")
+                )
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                threading.Thread(target=run, name="async-loop", daemon=True).start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """
+        Schedules coro on the loop and returns a concurrent.futures.Future.
+        The coroutine sees the caller's context variables (trace id, Flask
+        app context); cancelling the future cancels the coroutine.
+        """
+        context = contextvars.copy_context()
+
+        async def start():
+            # A task copies the context it is created in
+            return await context.run(asyncio.ensure_future, coro)
+
+        return asyncio.run_coroutine_threadsafe(start(), self.loop())
+
+    def run(self, coro):
+        """Runs coro on the loop and blocks the calling thread until it returns."""
+        future = self.submit(coro)
+        try:
+            return future.result()
+        finally:
+            future.cancel()  # No-op once done
+
+    def iterate(self, agen):
+        """
+        Yields the items of an async generator to a plain generator running
+        in another thread (e.g. a streamed Flask response). Closing the plain
+        generator, as the WSGI server does when the client goes away,
+        cancels the async one and the upstream calls it is waiting on.
+        """
+        items = queue.Queue()
+        end = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+                items.put((end, None))
+            except Exception as e:
+                items.put((end, e))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item, error = items.get()
+                if item is end:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
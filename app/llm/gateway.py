@@ -0,0 +1,576 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised without calling Gemini while the circuit breaker is open."""
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when a call misses its deadline, or waits longer than queue_timeout to be sent."""
+
+
+_error_types = None
+
+
+def error_types():
+    """
+    (retryable, throttle) exception tuples. google.api_core (and grpc with
+    it) is imported on the first failed call rather than at startup.
+    """
+    global _error_types
+    if _error_types is None:
+        from google.api_core import exceptions as google_exceptions
+        # Upstream errors worth another attempt: quota, overload and transient server faults
+        retryable = (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.BadGateway,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.Aborted,
+            LLMTimeoutError
+        )
+        # Errors that mean "slow down" rather than "broken"
+        throttle = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+        _error_types = (retryable, throttle)
+    return _error_types
+
+
+class TokenBucket:
+    """Requests-per-minute limiter: refills rate_per_minute tokens a minute, holds at most burst."""
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _reserve(self, deadline):
+        """
+        Takes the next token, going into debt if none is left, and returns
+        how long to wait for it (0 = now). Later callers wait behind earlier
+        ones, so the order is first come, first served.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if now + wait > deadline:
+                raise LLMTimeoutError("Timed out waiting for the Gemini rate limit.")
+            self.tokens -= 1
+            return wait
+
+    def _cancel(self):
+        """Gives back the token of a caller that stopped waiting for it."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def acquire(self, deadline):
+        wait = self._reserve(deadline)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, deadline):
+        wait = self._reserve(deadline)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self._cancel()
+                raise
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return round(self.tokens, 2)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the upstream (AIMD): starts at
+    max_limit, shrinks by 30% on throttling or upstream errors and on calls
+    slower than slow_per_token seconds per output token, and grows back by
+    one slot per limit's worth of successes. Total call time is not a
+    signal: a long completion is slow because it is long.
+    """
+    # Shorter outputs are mostly fixed overhead, too noisy to judge per token
+    MIN_TIMED_TOKENS = 100
+
+    def __init__(self, min_limit, max_limit, slow_per_token):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.slow_per_token = slow_per_token
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # _SlotWaiter, first come first served
+
+    def acquire(self, deadline):
+        waiter = self._enqueue()
+        if waiter is None:
+            return
+        waiter.event.wait(max(0, deadline - time.monotonic()))
+        if not self._withdraw(waiter):
+            raise LLMTimeoutError("Timed out waiting for a Gemini call slot.")
+
+    async def acquire_async(self, deadline):
+        """acquire() for coroutines: waits without blocking the event loop's thread."""
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(waiter.future, max(0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled: a slot handed over meanwhile goes to the next waiter
+            if self._withdraw(waiter):
+                self.release()
+            raise
+        if not self._withdraw(waiter):
+            raise LLMTimeoutError("Timed out waiting for a Gemini call slot.")
+
+    def _enqueue(self, loop=None):
+        """Takes a free slot (returns None) unless others are already queued; else queues a waiter."""
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return None
+            waiter = _SlotWaiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _withdraw(self, waiter):
+        """True if the waiter was handed a slot; otherwise takes it out of the queue."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def outcome(self, latency, tokens):
+        """"slow" if a successful call took longer per output token than slow_per_token, else "ok"."""
+        if tokens and tokens >= self.MIN_TIMED_TOKENS and latency / tokens > self.slow_per_token:
+            return "slow"
+        return "ok"
+
+    def release(self, outcome=None):
+        """Frees a slot. outcome: "ok" grows the limit, "slow"/"overloaded" shrink it, None leaves it."""
+        with self._lock:
+            self.in_flight -= 1
+            if outcome in ("slow", "overloaded"):
+                self.limit = max(self.min_limit, self.limit * 0.7)
+            elif outcome == "ok":
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            # Free slots go straight to the longest waiting callers
+            granted = []
+            while self._waiters and self.in_flight < int(self.limit):
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self.in_flight += 1
+                granted.append(waiter)
+        for waiter in granted:
+            waiter.wake()
+
+
+class _SlotWaiter:
+    """A caller queued in AdaptiveLimiter: a thread (event) or a coroutine (future on its loop)."""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_wake, self.future)
+
+
+def _output_tokens(response):
+    """Output tokens reported on a response (or a stream's last chunk); None if it has no usage."""
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "candidates_token_count", None) or None
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CircuitBreaker:
+    """CLOSED -> OPEN after failure_threshold consecutive failures; one trial call after cooldown."""
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "CLOSED"
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """False to reject the call; "trial" for the one call let through while HALF_OPEN, else True."""
+        with self._lock:
+            if self.state == "CLOSED":
+                return True
+            if self.state == "OPEN" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "HALF_OPEN"
+            if self.state == "HALF_OPEN" and not self._trial_running:
+                self._trial_running = True
+                return "trial"
+            return False
+
+    def release_trial(self):
+        """The trial call ended without a verdict (never sent, or abandoned): the next caller gets one."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "CLOSED"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "HALF_OPEN" or self.failures >= self.failure_threshold:
+                if self.state != "OPEN":
+                    print(f"⚠️ Gemini circuit breaker opened after {self.failures} failure(s).")
+                self.state = "OPEN"
+                self.opened_at = time.monotonic()
+
+
+class LLMGateway:
+    """
+    Single call path to Gemini shared by every agent (through
+    app/llm/cache.py): token-bucket rate limit sized to the quota, an
+    adaptive concurrency limit, per-call deadlines, retries with
+    exponential backoff + jitter, and a circuit breaker. Callers wait for
+    a rate token and a call slot in arrival order, for up to
+    queue_timeout; a call's deadline starts once it is sent.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, config):
+        with cls._lock:
+            cls._instance = cls(
+                rate_per_minute=config['LLM_RATE_PER_MINUTE'],
+                burst=config['LLM_BURST'],
+                timeout=config['LLM_TIMEOUT'],
+                queue_timeout=config['LLM_QUEUE_TIMEOUT'],
+                max_retries=config['LLM_MAX_RETRIES'],
+                backoff_base=config['LLM_BACKOFF_BASE'],
+                backoff_max=config['LLM_BACKOFF_MAX'],
+                min_concurrency=config['LLM_MIN_CONCURRENCY'],
+                max_concurrency=config['LLM_MAX_CONCURRENCY'],
+                slow_ms_per_token=config['LLM_SLOW_MS_PER_TOKEN'],
+                breaker_failures=config['LLM_BREAKER_FAILURES'],
+                breaker_cooldown=config['LLM_BREAKER_COOLDOWN']
+            )
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        # Scripts that never call create_app get the defaults
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, rate_per_minute=60, burst=10, timeout=120, queue_timeout=300, max_retries=3,
+                 backoff_base=1.0, backoff_max=20.0, min_concurrency=1, max_concurrency=8, slow_ms_per_token=40,
+                 breaker_failures=5, breaker_cooldown=30):
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.limiter = AdaptiveLimiter(min_concurrency, max_concurrency, slow_ms_per_token / 1000.0)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        # The SDK has no request timeout, so calls (and stream reads) run here and are awaited with one.
+        # A call that misses its deadline finishes in the background, its result dropped, and keeps
+        # its slot until then: one thread per slot, so hung calls can never leave the pool full.
+        self._calls = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="llm-call")
+
+        self._counters = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0,
+                          "timeouts": 0, "throttled": 0, "rejected": 0}
+        self._latency_ewma = None
+        self._stats_lock = threading.Lock()
+
+    # ---------------- CALLS ----------------
+
+    def generate(self, model, prompt, generation_config=None, timeout=None):
+        """model.generate_content(prompt) under the gateway's policies. Returns the response."""
+        return self._call(lambda: model.generate_content(prompt, generation_config=generation_config), timeout)
+
+    def stream(self, model, prompt, generation_config=None, timeout=None):
+        """
+        Yields the chunks of a streamed completion. Opening the stream is
+        retried like generate(); once chunks flow, errors are raised to the
+        caller. The concurrency slot is held until the stream is consumed,
+        closed, or misses the deadline (which covers the whole stream).
+        """
+        response, started, trial = self._call(
+            lambda: model.generate_content(prompt, generation_config=generation_config, stream=True),
+            timeout, hold_slot=True
+        )
+        deadline = started + (timeout or self.timeout)
+        chunks = iter(response)
+        end = object()
+        chunk = error = pending = None
+        closed = False
+        try:
+            while True:
+                # Each read runs on the call pool so that a stalled stream times out
+                future = self._calls.submit(next, chunks, end)
+                try:
+                    chunk = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeout:
+                    self._count("timeouts")
+                    pending = future
+                    raise LLMTimeoutError(f"Gemini stream exceeded its {timeout or self.timeout}s deadline.")
+                if chunk is end:
+                    return
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # Closed by the consumer: says nothing about the upstream
+            closed = True
+            raise
+        finally:
+            if closed:
+                self._abandon(trial)
+            else:
+                # The last chunk carries the usage of the whole stream
+                self._finish(started, chunk, error, pending)
+
+    async def generate_async(self, model, prompt, generation_config=None, timeout=None):
+        """
+        generate() for coroutines on the event loop (app/llm/event_loop.py):
+        awaits model.generate_content_async, so a slow call holds no thread.
+        Cancelling the caller cancels the request to Gemini.
+        """
+        return await self._call_async(
+            lambda: model.generate_content_async(prompt, generation_config=generation_config), timeout
+        )
+
+    async def stream_async(self, model, prompt, generation_config=None, timeout=None):
+        """
+        Async counterpart of stream(): an async generator of chunks. Closing
+        or cancelling it frees the slot without a verdict on the upstream.
+        """
+        response, started, trial = await self._call_async(
+            lambda: model.generate_content_async(prompt, generation_config=generation_config, stream=True),
+            timeout, hold_slot=True
+        )
+        deadline = started + (timeout or self.timeout)
+        chunks = response.__aiter__()
+        chunk = error = None
+        closed = False
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self._count("timeouts")
+                    raise LLMTimeoutError(f"Gemini stream exceeded its {timeout or self.timeout}s deadline.")
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        except BaseException:
+            # Cancelled, or closed by the consumer: says nothing about the upstream
+            closed = True
+            raise
+        finally:
+            if closed:
+                self._abandon(trial)
+            else:
+                self._finish(started, chunk, error)
+
+    def _call(self, fn, timeout=None, hold_slot=False):
+        attempt = 0
+        while True:
+            trial = self._admit()
+            try:
+                queued_until = time.monotonic() + self.queue_timeout
+                self.bucket.acquire(queued_until)
+                self.limiter.acquire(queued_until)
+            except BaseException:
+                # Nothing was sent: the half-open trial goes to the next caller
+                if trial == "trial":
+                    self.breaker.release_trial()
+                raise
+            # The deadline starts here: time spent queued is not held against the call
+            started = time.monotonic()
+            self._count("calls")
+            pending = None
+            try:
+                future = self._calls.submit(fn)
+                try:
+                    result = future.result(timeout=timeout or self.timeout)
+                except FutureTimeout:
+                    self._count("timeouts")
+                    pending = future
+                    raise LLMTimeoutError(f"Gemini call exceeded its {timeout or self.timeout}s deadline.")
+            except Exception as e:
+                delay = self._failed(e, attempt, pending)
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            if hold_slot:
+                return result, started, trial
+            self._finish(started, result)
+            return result
+
+    async def _call_async(self, make_call, timeout=None, hold_slot=False):
+        """_call for coroutines: make_call() returns the awaitable Gemini request."""
+        attempt = 0
+        while True:
+            trial = self._admit()
+            try:
+                queued_until = time.monotonic() + self.queue_timeout
+                await self.bucket.acquire_async(queued_until)
+                await self.limiter.acquire_async(queued_until)
+            except BaseException:
+                # Timed out or cancelled before sending: the half-open trial goes to the next caller
+                if trial == "trial":
+                    self.breaker.release_trial()
+                raise
+            started = time.monotonic()
+            self._count("calls")
+            try:
+                try:
+                    # Unlike the thread pool path, a missed deadline cancels the request
+                    result = await asyncio.wait_for(make_call(), timeout=timeout or self.timeout)
+                except asyncio.TimeoutError:
+                    self._count("timeouts")
+                    raise LLMTimeoutError(f"Gemini call exceeded its {timeout or self.timeout}s deadline.")
+            except asyncio.CancelledError:
+                # The caller went away: no verdict on the upstream
+                self._abandon(trial)
+                raise
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                if delay is None:
+                    raise
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+
+            if hold_slot:
+                return result, started, trial
+            self._finish(started, result)
+            return result
+
+    def _admit(self):
+        """Raises while the circuit is open. Returns "trial" if this call is the half-open trial."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            self._count("rejected")
+            raise LLMUnavailableError("Gemini is unavailable (circuit open); try again shortly.")
+        return allowed
+
+    def _failed(self, error, attempt, pending=None):
+        """Records a failed attempt. Returns the backoff before the next one, or None to give up."""
+        retryable = self._record_error(error)
+        self._release_slot("overloaded" if retryable else None, pending)
+
+        delay = self._backoff(attempt)
+        if not retryable or attempt >= self.max_retries:
+            return None
+        self._count("retries")
+        print(f"⚠️ Gemini call failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def _record_error(self, error):
+        """Counts a failed call and updates the breaker. True if the upstream is at fault (throttled, down, too slow)."""
+        retryable_errors, throttle_errors = error_types()
+        retryable = isinstance(error, retryable_errors)
+        if isinstance(error, throttle_errors):
+            self._count("throttled")
+        if retryable:
+            self.breaker.record_failure()
+        else:
+            # Gemini answered (bad request, safety block): the upstream itself is healthy
+            self.breaker.record_success()
+        self._count("failed")
+        return retryable
+
+    def _finish(self, started, response=None, error=None, pending=None):
+        """Frees the slot of a call that ran to the end and records the outcome."""
+        latency = time.monotonic() - started
+        if error is not None:
+            retryable = self._record_error(error)
+            self._release_slot("overloaded" if retryable else None, pending)
+            return
+        self.limiter.release(self.limiter.outcome(latency, _output_tokens(response)))
+        self.breaker.record_success()
+        with self._stats_lock:
+            self._counters["succeeded"] += 1
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+    def _release_slot(self, outcome=None, pending=None):
+        """Frees the call slot now, or once pending (a pool thread still inside the SDK) returns."""
+        if pending is None:
+            self.limiter.release(outcome)
+        else:
+            pending.add_done_callback(lambda _: self.limiter.release(outcome))
+
+    def _abandon(self, trial):
+        """Frees the slot of a call that was closed or cancelled: no verdict on the upstream."""
+        self.limiter.release()
+        if trial == "trial":
+            self.breaker.release_trial()
+
+    def _backoff(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    # ---------------- MONITORING ----------------
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._counters)
+            stats["latency_ewma_seconds"] = round(self._latency_ewma, 3) if self._latency_ewma is not None else None
+        stats.update({
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "rate_tokens_available": self.bucket.available()
+        })
+        return stats
@@ -0,0 +1,297 @@
+import atexit
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from app.ml.text import words
+
+
+class HashingTfidf:
+    """
+    Stateless hashing vectorizer (unigrams + bigrams, signed crc32 buckets,
+    sublinear tf) plus document frequencies that are updated incrementally,
+    so the vocabulary never has to be stored or refit.
+    """
+
+    def __init__(self, n_features=2 ** 16):
+        self.n_features = n_features
+        self.df = np.zeros(n_features, dtype=np.float32)
+        self.n_docs = 0
+
+    def tokens(self, text):
+        unigrams = words(text)
+        return unigrams + [f"{a} {b}" for a, b in zip(unigrams, unigrams[1:])]
+
+    def tf(self, text):
+        """Sparse L2-normalized term-frequency vector: (indices, values)."""
+        counts = {}
+        for token in self.tokens(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            index = h % self.n_features
+            sign = 1.0 if h & 0x80000000 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        raw = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        values = np.sign(raw) * (1.0 + np.log(np.maximum(np.abs(raw), 1.0)))
+        norm = np.linalg.norm(values)
+        return indices, (values / norm if norm else values).astype(np.float32)
+
+    def idf(self):
+        return np.log((1.0 + self.n_docs) / (1.0 + self.df)).astype(np.float32) + 1.0
+
+    def add_document(self, indices):
+        self.df[indices] += 1.0
+        self.n_docs += 1
+
+
+class CentroidCategorizer:
+    """
+    Nearest-centroid classifier over HashingTfidf vectors. Each category
+    keeps the running sum of its blogs' tf vectors; scoring applies the
+    current idf to both sides, so adding a blog is O(tokens).
+    """
+
+    def __init__(self, n_features=2 ** 16):
+        self.vectorizer = HashingTfidf(n_features)
+        self.names = []
+        self.rows = {}
+        self.sums = np.zeros((0, n_features), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._norms = None  # ||centroid * idf|| per category, recomputed lazily
+
+    def add(self, category, text):
+        indices, values = self.vectorizer.tf(text)
+        if not len(indices):
+            return
+        row = self.rows.get(category)
+        if row is None:
+            row = len(self.names)
+            self.names.append(category)
+            self.rows[category] = row
+            self.sums = np.vstack([self.sums, np.zeros((1, self.vectorizer.n_features), dtype=np.float32)])
+            self.counts = np.append(self.counts, 0)
+        np.add.at(self.sums[row], indices, values)
+        self.counts[row] += 1
+        self.vectorizer.add_document(indices)
+        self._norms = None
+
+    def scores(self, text, min_docs=1):
+        """Cosine similarity of text to every category with at least min_docs blogs: {name: score}."""
+        indices, values = self.vectorizer.tf(text)
+        if not len(indices) or not self.names:
+            return {}
+
+        idf = self.vectorizer.idf()
+        if self._norms is None:
+            self._norms = np.linalg.norm(self.sums * idf, axis=1)
+
+        query = values * idf[indices]
+        query_norm = np.linalg.norm(query)
+        if not query_norm:
+            return {}
+        # Only the query's buckets contribute to the dot products
+        dots = (self.sums[:, indices] * idf[indices]) @ query
+        sims = dots / (np.maximum(self._norms, 1e-9) * query_norm)
+        return {name: float(sims[row]) for row, name in enumerate(self.names) if self.counts[row] >= min_docs}
+
+    def to_arrays(self):
+        return {
+            "names": np.array(self.names, dtype=object),
+            "sums": self.sums,
+            "counts": self.counts,
+            "df": self.vectorizer.df,
+            "n_docs": np.array(self.vectorizer.n_docs)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls(arrays["sums"].shape[1])
+        model.names = [str(name) for name in arrays["names"]]
+        model.rows = {name: row for row, name in enumerate(model.names)}
+        model.sums = arrays["sums"].astype(np.float32)
+        model.counts = arrays["counts"].astype(np.int64)
+        model.vectorizer.df = arrays["df"].astype(np.float32)
+        model.vectorizer.n_docs = int(arrays["n_docs"])
+        return model
+
+
+class LocalCategorizer:
+    """
+    Process-wide CentroidCategorizer used by CategoryAgent. Loads a snapshot
+    (CATEGORIZER_PATH) or trains from the stored blogs in the background,
+    learns from every new blog whose category it can trust, and snapshots
+    itself every few updates. Until it is ready, predict() returns no
+    candidates (the LLM decides).
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Text used per blog: title + the start of the body
+    MAX_CHARS = 5000
+
+    # category_source values it learns from. Its own predictions ("local") would
+    # reinforce its mistakes, and "fallback" is "General" after an LLM error.
+    # (Nothing lets an editor change a blog's category yet; such a path should
+    # record its own source here and call learn() with it.)
+    TRAINING_SOURCES = ("llm",)
+
+    @classmethod
+    def configure(cls, config, db_service):
+        with cls._lock:
+            cls._instance = cls(
+                enabled=config['CATEGORIZER_ENABLED'],
+                path=config['CATEGORIZER_PATH'],
+                n_features=config['CATEGORIZER_FEATURES'],
+                min_docs=config['CATEGORIZER_MIN_DOCS'],
+                save_every=config['CATEGORIZER_SAVE_EVERY'],
+                db_service=db_service
+            )
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(enabled=False)
+        return cls._instance
+
+    def __init__(self, enabled=True, path=None, n_features=2 ** 16, min_docs=3, save_every=25, db_service=None):
+        self.enabled = enabled
+        self.path = path
+        self.n_features = n_features
+        self.min_docs = min_docs
+        self.save_every = save_every
+        self.db_service = db_service
+
+        self.model = CentroidCategorizer(n_features)
+        self.ready = False
+        self._model_lock = threading.Lock()
+        self._unsaved = 0
+        if self.enabled and self.path:
+            atexit.register(self.save)
+
+    @staticmethod
+    def text_of(title, body):
+        return f"{title or ''}\n{(body or '')[:LocalCategorizer.MAX_CHARS]}"
+
+    # ---------------- LOADING ----------------
+
+    def load_in_background(self):
+        if self.enabled:
+            threading.Thread(target=self.load, name="categorizer-load", daemon=True).start()
+
+    def load(self):
+        """Snapshot if there is one, otherwise a full training pass over the stored blogs."""
+        try:
+            if self.path and os.path.exists(self.path):
+                with np.load(self.path, allow_pickle=True) as arrays:
+                    model = CentroidCategorizer.from_arrays(arrays)
+                source = "snapshot"
+            else:
+                model = self.train((category, title, body) for _, category, title, body
+                                   in self.db_service.iter_blog_texts(sources=self.TRAINING_SOURCES))
+                source = "Firestore"
+            with self._model_lock:
+                self.model = model
+                self.ready = True
+            print(f"--- Local categorizer ready ({source}): {len(model.names)} categories, "
+                  f"{model.vectorizer.n_docs} blogs ---")
+            if source == "Firestore":
+                self.save()
+        except Exception as e:
+            print(f"❌ Local categorizer unavailable, using the LLM only: {e}")
+
+    def train(self, examples):
+        """Fresh model from (category, title, body) examples."""
+        model = CentroidCategorizer(self.n_features)
+        for category, title, body in examples:
+            if category:
+                model.add(category, self.text_of(title, body))
+        return model
+
+    def save(self):
+        if not (self.enabled and self.ready and self.path):
+            return
+        try:
+            with self._model_lock:
+                arrays = self.model.to_arrays()
+                self._unsaved = 0
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"❌ Error saving categorizer snapshot: {e}")
+
+    # ---------------- USE ----------------
+
+    def learn(self, category, title, body, source):
+        """Adds a saved blog to its category's centroid, if source is one of TRAINING_SOURCES."""
+        if not (self.enabled and self.ready and category) or source not in self.TRAINING_SOURCES:
+            return
+        with self._model_lock:
+            self.model.add(category, self.text_of(title, body))
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def predict(self, title, body, top_k=5, allowed=None):
+        """
+        Best categories as [(name, similarity)], highest first. allowed
+        limits the answer to categories that still exist (renames, deletes).
+        """
+        if not (self.enabled and self.ready):
+            return []
+        with self._model_lock:
+            scores = self.model.scores(self.text_of(title, body), min_docs=self.min_docs)
+        if allowed is not None:
+            scores = {name: score for name, score in scores.items() if name in allowed}
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def evaluate(categorizer, examples, holdout=0.2, threshold=0.35, top_k=5):
+    """
+    Trains on a deterministic split of (blog_id, category, title, body)
+    examples and scores the held-out part against the stored categories.
+    Pass only blogs categorized by the LLM (see
+    iter_blog_texts(sources=...)). Returns a dict of metrics.
+    """
+    train, test = [], []
+    for blog_id, category, title, body in examples:
+        if not category:
+            continue
+        bucket = zlib.crc32(blog_id.encode("utf-8")) % 1000
+        (test if bucket < holdout * 1000 else train).append((category, title, body))
+
+    model = categorizer.train(train)
+    metrics = {"train": len(train), "test": len(test), "correct": 0, "confident": 0,
+               "confident_correct": 0, "in_top_k": 0}
+    for category, title, body in test:
+        ranked = sorted(model.scores(categorizer.text_of(title, body), min_docs=categorizer.min_docs).items(),
+                        key=lambda item: item[1], reverse=True)[:top_k]
+        if not ranked:
+            continue
+        best, score = ranked[0]
+        metrics["correct"] += best == category
+        metrics["in_top_k"] += any(name == category for name, _ in ranked)
+        if score >= threshold:
+            metrics["confident"] += 1
+            metrics["confident_correct"] += best == category
+
+    n = max(metrics["test"], 1)
+    metrics.update({
+        "accuracy": round(metrics["correct"] / n, 3),
+        "top_k_recall": round(metrics["in_top_k"] / n, 3),
+        # Share of blogs that would skip the LLM, and how often those skips agree with it
+        "local_coverage": round(metrics["confident"] / n, 3),
+        "local_precision": round(metrics["confident_correct"] / max(metrics["confident"], 1), 3),
+        "threshold": threshold,
+        "top_k": top_k
+    })
+    return metrics
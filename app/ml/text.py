@@ -0,0 +1,16 @@
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#'-]*[a-z0-9+#]|[a-z0-9]")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers him his how i if in into is it its itself just me more most my no nor not now of off on once
+only or other our ours out over own same she should so some such than that the their them then there
+these they this those through to too under until up very was we were what when where which while who
+whom why will with you your yours
+""".split())
+
+
+def words(text):
+    """Lowercased word tokens of text without stopwords (shared by the categorizer and search)."""
+    return [w for w in TOKEN_RE.findall((text or "").lower()) if w not in STOPWORDS]
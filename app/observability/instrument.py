@@ -0,0 +1,158 @@
+import contextvars
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+
+from app.observability.metrics import MetricsRegistry, timed
+from app.observability.tracing import log_event
+
+_registry = MetricsRegistry.get_instance()
+
+STAGE_SECONDS = _registry.histogram(
+    "scriptly_pipeline_stage_duration_seconds",
+    "Time spent in each generation pipeline stage.",
+    ["stage", "outcome"]
+)
+FIRESTORE_SECONDS = _registry.histogram(
+    "scriptly_firestore_method_duration_seconds",
+    "Time spent in storage service (Firestore or SQLite) methods.",
+    ["method", "outcome"]
+)
+FIRESTORE_RPCS = _registry.counter(
+    "scriptly_firestore_rpcs_total",
+    "Firestore RPCs issued, by the outermost FirestoreService method that issued them.",
+    ["method", "rpc"]
+)
+FIRESTORE_RPC_ERRORS = _registry.counter(
+    "scriptly_firestore_rpc_errors_total",
+    "Firestore RPCs that raised, by method, RPC and error type.",
+    ["method", "rpc", "error"]
+)
+LLM_SECONDS = _registry.histogram(
+    "scriptly_llm_request_duration_seconds",
+    "Time to get an agent's completion, from the cache or from Gemini.",
+    ["agent", "source", "outcome"]
+)
+LLM_TOKENS = _registry.counter(
+    "scriptly_llm_tokens_total",
+    "Gemini tokens by agent and kind (prompt/response), where the SDK reports them.",
+    ["agent", "kind"]
+)
+
+# Unary and server-streaming Firestore RPCs the Python client issues (listen runs on its own channel)
+FIRESTORE_RPC_NAMES = (
+    "get_document", "batch_get_documents", "run_query", "run_aggregation_query", "list_documents",
+    "create_document", "update_document", "delete_document", "commit", "begin_transaction",
+    "rollback", "batch_write"
+)
+
+# FirestoreService method currently running on this thread (RPCs are attributed to it)
+_current_method = contextvars.ContextVar("firestore_method", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Times one pipeline stage into STAGE_SECONDS and writes a structured log line."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name, outcome=outcome)
+        log_event("stage", stage=name, outcome=outcome, duration_ms=round(seconds * 1000, 2))
+
+
+# ---------------- FIRESTORE ----------------
+
+def instrument_firestore(service, exclude=()):
+    """
+    Times every public storage service method and, on Firestore, counts
+    the RPCs each one issues by wrapping the client's GAPIC stub. Generators and names
+    in exclude are left alone. Safe to call once per process.
+    """
+    # The SQLite backend has no RPCs; its methods are still timed
+    api = getattr(getattr(service, "db", None), "_firestore_api", None)
+    if api is not None:
+        if getattr(api, "_scriptly_instrumented", False):
+            return
+        for rpc in FIRESTORE_RPC_NAMES:
+            call = getattr(api, rpc, None)
+            if call is not None:
+                setattr(api, rpc, _counted_rpc(rpc, call))
+        api._scriptly_instrumented = True
+
+    for name, fn in inspect.getmembers(type(service), inspect.isfunction):
+        if name.startswith("_") or name in exclude or inspect.isgeneratorfunction(fn):
+            continue
+        setattr(service, name, _timed_method(name, getattr(service, name)))
+
+
+def _timed_method(name, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        # Nested calls (e.g. get_blog_by_id inside another method) keep the outer attribution
+        token = _current_method.set(name) if _current_method.get() is None else None
+        try:
+            with timed(FIRESTORE_SECONDS, method=name):
+                return method(*args, **kwargs)
+        finally:
+            if token is not None:
+                _current_method.reset(token)
+    return wrapper
+
+
+def _counted_rpc(rpc, call):
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        # BulkWriter and listener threads have no method set
+        method = _current_method.get() or "background"
+        FIRESTORE_RPCS.inc(method=method, rpc=rpc)
+        try:
+            return call(*args, **kwargs)
+        except Exception as e:
+            FIRESTORE_RPC_ERRORS.inc(method=method, rpc=rpc, error=type(e).__name__)
+            raise
+    return wrapper
+
+
+# ---------------- LLM ----------------
+
+def record_llm_usage(agent, response):
+    """Token counts from a Gemini response (usage_metadata, else the candidates' token_count)."""
+    try:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", 0)
+            response_tokens = getattr(usage, "candidates_token_count", 0)
+        else:
+            prompt_tokens = 0
+            response_tokens = sum(getattr(c, "token_count", 0) or 0 for c in response.candidates)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, agent=agent, kind="prompt")
+        if response_tokens:
+            LLM_TOKENS.inc(response_tokens, agent=agent, kind="response")
+    except Exception:
+        pass  # Usage is best effort; the response itself is fine
+
+
+def register_gauges():
+    """Scrape-time views of the LLM gateway, the LLM cache and the search index."""
+    from app.llm.cache import LLMCache
+    from app.llm.gateway import LLMGateway
+    from app.search.index import SearchIndex
+
+    _registry.gauge("scriptly_llm_in_flight", "Gemini calls in flight.",
+                    lambda: LLMGateway.get_instance().limiter.in_flight)
+    _registry.gauge("scriptly_llm_concurrency_limit", "Current adaptive Gemini concurrency limit.",
+                    lambda: LLMGateway.get_instance().limiter.limit)
+    _registry.gauge("scriptly_llm_circuit_open", "1 while the Gemini circuit breaker rejects calls.",
+                    lambda: LLMGateway.get_instance().breaker.state != "CLOSED")
+    _registry.gauge("scriptly_llm_cache_lookups", "LLM cache lookups by result since start.",
+                    lambda: {(name,): value for name, value in LLMCache.get_instance().stats().items()
+                             if name in ("memory_hits", "disk_hits", "misses", "bypassed")},
+                    ["result"])
+    _registry.gauge("scriptly_search_index_blogs", "Blogs in the search index.",
+                    lambda: len(SearchIndex.get_instance().index))
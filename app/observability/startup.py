@@ -0,0 +1,114 @@
+import builtins
+import os
+import sys
+import threading
+import time
+
+# Only the standard library here: this module is imported before everything it measures.
+
+_original_import = None
+_imports = {}  # module -> [cumulative seconds, self seconds]
+_marks = []  # (phase name, seconds since the previous mark)
+_started = None
+_last_mark = None
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def enable_from_env():
+    """Starts the profile when STARTUP_PROFILE=true (see app/__init__.py)."""
+    if os.getenv('STARTUP_PROFILE', 'false').lower() == 'true':
+        enable()
+
+
+def enable():
+    """Times every module imported from now on, and the phases marked with mark()."""
+    global _original_import, _started, _last_mark
+    if _original_import is not None:
+        return
+    _started = _last_mark = time.perf_counter()
+    _original_import = builtins.__import__
+    builtins.__import__ = _timed_import
+
+
+def enabled():
+    return _original_import is not None
+
+
+def mark(phase):
+    """Ends a create_app phase: records the time since the previous mark."""
+    global _last_mark
+    if not enabled():
+        return
+    now = time.perf_counter()
+    _marks.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def _new_module(name, fromlist, level):
+    """The module this import statement loads for the first time, or None."""
+    if level:
+        return None
+    if name not in sys.modules:
+        return name
+    # `from package import submodule` loads the submodule without a second __import__
+    for attr in fromlist or ():
+        if attr != "*" and f"{name}.{attr}" not in sys.modules and not hasattr(sys.modules[name], attr):
+            return f"{name}.{attr}"
+    return None
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    module = _new_module(name, fromlist, level)
+    if module is None:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    stack = _local.__dict__.setdefault("stack", [])
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        with _lock:
+            totals = _imports.setdefault(module, [0.0, 0.0])
+            totals[0] += elapsed
+            totals[1] += elapsed - nested
+
+
+def _package(module):
+    parts = module.split(".")
+    # google is a namespace shared by unrelated SDKs
+    return ".".join(parts[:2]) if parts[0] == "google" else parts[0]
+
+
+def report(top=15):
+    """Prints the phases and the import-time breakdown, then stops recording imports."""
+    global _original_import
+    if not enabled():
+        print("⚠️ Startup profile: set STARTUP_PROFILE=true in the environment before the app is imported.")
+        return
+    builtins.__import__ = _original_import
+    _original_import = None
+
+    total = time.perf_counter() - _started
+    with _lock:
+        imports = dict(_imports)
+    by_package = {}
+    for module, (_, own) in imports.items():
+        by_package[_package(module)] = by_package.get(_package(module), 0.0) + own
+
+    print(f"--- Startup profile: {total * 1000:.0f} ms from `import app` to ready, "
+          f"{len(imports)} modules imported ---")
+    print("Phases:")
+    for phase, seconds in _marks:
+        print(f"  {phase:<40}{seconds * 1000:>9.1f} ms")
+    print("Import time by package (self):")
+    for package, seconds in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<40}{seconds * 1000:>9.1f} ms")
+    print("Slowest imports (cumulative):")
+    for module, (cumulative, _) in sorted(imports.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"  {module:<40}{cumulative * 1000:>9.1f} ms")
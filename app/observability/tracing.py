@@ -0,0 +1,113 @@
+import contextvars
+import json
+import logging
+import re
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import g, request
+
+from app.observability.metrics import MetricsRegistry
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+# Incoming X-Request-ID values we are willing to reuse (anything else gets a fresh id)
+TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{8,64}$")
+
+logger = logging.getLogger("scriptly")
+
+HTTP_SECONDS = MetricsRegistry.get_instance().histogram(
+    "scriptly_http_request_duration_seconds",
+    "Time spent handling HTTP requests, by Flask endpoint.",
+    ["endpoint", "method", "status"]
+)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id=None):
+    """Runs the block under trace_id (a new one by default): background jobs use their job id."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def log_event(event, **fields):
+    """One structured log line: the event name, the current trace id and fields."""
+    logger.info(event, extra={"fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "event": record.getMessage(),
+            "trace_id": current_trace_id()
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+        return f"[{current_trace_id() or '-'}] {record.getMessage()} {fields}".rstrip()
+
+
+def configure_logging(structured=True):
+    """JSON lines on stderr (STRUCTURED_LOGS), or a readable single-line format."""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if structured else TextFormatter())
+    logger.handlers = [handler]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def init_app(app):
+    """Gives every request a trace id (X-Request-ID in and out), times it and logs it."""
+    configure_logging(app.config['STRUCTURED_LOGS'])
+
+    @app.before_request
+    def start_trace():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.trace_token = _trace_id.set(incoming if TRACE_ID_RE.match(incoming) else new_trace_id())
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_trace(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        duration = time.perf_counter() - started
+        # Static files never get here (WhiteNoise), so the endpoint label stays small
+        endpoint = request.endpoint or "unmatched"
+        HTTP_SECONDS.observe(duration, endpoint=endpoint, method=request.method, status=response.status_code)
+        response.headers['X-Request-ID'] = current_trace_id()
+        if endpoint != "metrics.metrics":
+            log_event("request", method=request.method, path=request.path, endpoint=endpoint,
+                      status=response.status_code, duration_ms=round(duration * 1000, 2))
+        return response
+
+    @app.teardown_request
+    def end_trace(error=None):
+        token = g.pop('trace_token', None)
+        if token is not None:
+            try:
+                _trace_id.reset(token)
+            except ValueError:
+                pass  # Torn down in another context (streamed responses); that context just ends
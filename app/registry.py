@@ -0,0 +1,116 @@
+import threading
+import time
+
+from app.firebase.firebase_admin import FirebaseLoader
+from app.storage.backends import LazyStorageService, create_storage_service
+
+
+class ClientRegistry:
+    """
+    Process-wide holder for the Gemini model clients and the storage
+    service. Built once in create_app; agents get their clients from here
+    instead of calling genai.configure / FirestoreService() per request.
+    Nothing is connected or imported up front: the Gemini SDK is loaded
+    by the first model() call and storage by the first db_service use.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, config):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(config)
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            raise ValueError("ClientRegistry is not initialized. Call ClientRegistry.configure() (create_app does this).")
+        return cls._instance
+
+    def __init__(self, config):
+        self.config = config
+        self.default_model = config['GEMINI_MODEL']
+        self._models = {}
+        self._models_lock = threading.Lock()
+        self._genai = None
+
+        # Storage: one service shared by every request (Firestore or SQLite, see app/storage)
+        self.storage_backend = config['STORAGE_BACKEND']
+        self.db_service = LazyStorageService(self._create_storage)
+
+    def _create_storage(self):
+        # With SQLite, Firebase Admin is initialized by the first login instead (Firebase Auth)
+        if self.storage_backend == "firestore":
+            self.firebase()
+        service = create_storage_service(self.config)
+        if self.config['METRICS_ENABLED']:
+            # Latency per method and RPCs per method (see app/observability/instrument.py)
+            from app.observability.instrument import instrument_firestore
+            instrument_firestore(service, exclude=("unit_of_work", "on_blog_change"))
+        return service
+
+    def firebase(self):
+        """Initializes Firebase Admin (Auth + Firestore) on first use; returns the Firestore client."""
+        return FirebaseLoader.get_instance(self.config['FIREBASE_SERVICE_ACCOUNT'])
+
+    @property
+    def db(self):
+        return self.firebase()
+
+    def gemini(self):
+        """google.generativeai, imported and configured exactly once, on first use."""
+        if self._genai is None:
+            with self._models_lock:
+                if self._genai is None:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.config['GEMINI_API_KEY'])
+                    self._genai = genai
+        return self._genai
+
+    def model(self, name=None):
+        """Returns the shared GenerativeModel for name (default: GEMINI_MODEL)."""
+        name = name or self.default_model
+        model = self._models.get(name)
+        if model is None:
+            genai = self.gemini()
+            with self._models_lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = genai.GenerativeModel(name)
+                    self._models[name] = model
+        return model
+
+    def after_storage_use(self, target, name):
+        """
+        Runs target on a daemon thread once something (a request, the warm-up)
+        has opened storage, or BACKGROUND_START_DELAY seconds after startup at
+        the latest. Background loaders stay off the cold start this way.
+        """
+        def run():
+            self.db_service.loaded.wait(self.config['BACKGROUND_START_DELAY'])
+            target()
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+
+    def warm_up_in_background(self):
+        threading.Thread(target=self.warm_up, name="client-warm-up", daemon=True).start()
+
+    def warm_up(self):
+        """Loads the SDKs and opens the Firestore and Gemini channels before the first user request."""
+        start = time.time()
+        try:
+            self.firebase()
+            self.db_service.resolve()
+            if self.storage_backend == "firestore":
+                self.db.collection("categories").limit(1).get()
+        except Exception as e:
+            print(f"⚠️ Storage warm-up failed: {e}")
+
+        try:
+            self.model().generate_content("ping", generation_config={"max_output_tokens": 1})
+        except Exception as e:
+            print(f"⚠️ Gemini warm-up failed: {e}")
+
+        print(f"--- Client warm-up finished in {time.time() - start:.2f}s ---")
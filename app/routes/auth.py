@@ -1,9 +1,8 @@
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, current_app
-from firebase_admin import auth as admin_auth
-from app.firebase.firestore_service import FirestoreService
+from app.registry import ClientRegistry
 
 auth_bp = Blueprint('auth_bp', __name__)
-db_service = FirestoreService()
+db_service = ClientRegistry.get_instance().db_service
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -23,6 +22,9 @@ def verify_token():
     data = request.json
     id_token = data.get('idToken')
     try:
+        # Firebase Admin is initialized (and imported) by the first login
+        ClientRegistry.get_instance().firebase()
+        from firebase_admin import auth as admin_auth
         decoded_token = admin_auth.verify_id_token(id_token)
         uid = decoded_token['uid']
         
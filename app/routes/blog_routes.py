@@ -1,14 +1,23 @@
-from flask import Blueprint, render_template, request, jsonify, url_for, session, redirect
-from app.agents.blog_agent import BlogAgent
-from app.agents.drafts_agent import DraftsAgent
-from app.agents.category_agent import CategoryAgent
+from flask import Blueprint, render_template, request, jsonify, url_for, session, redirect, Response, stream_with_context, g, current_app
 from app.agents.approval_agent import ApprovalAgent
-from app.firebase.firestore_service import FirestoreService
+from app.agents.blog_agent import BlogAgent
+from app.registry import ClientRegistry
+from app.jobs.job_queue import JobQueue
+from app.jobs.batch_runner import BatchRunner
+from app.jobs.pipeline import save_generated_blog
+from app.llm.cache import LLMCache
+from app.llm.gateway import LLMGateway
+from app.search.index import SearchIndex
+from app.routes.http_cache import conditional
 from datetime import datetime
+import csv
+import hashlib
+import io
+import json
 import math
 
 blog_bp = Blueprint('blog', __name__)
-db_service = FirestoreService()
+db_service = ClientRegistry.get_instance().db_service
 
 # --- SECURITY MIDDLEWARE ---
 
@@ -20,33 +29,59 @@ def require_login():
     if not session.get('logged_in'):
         return redirect(url_for('auth_bp.login'))
 
+# --- CONDITIONAL REQUEST VALIDATORS ---
+# Every blog/category write bumps the stats document's version, so it doubles
+# as the version of the list pages.
+
+def _dashboard_stats():
+    """Stats document, read at most once per request (validator + view)."""
+    if 'dashboard_stats' not in g:
+        g.dashboard_stats = db_service.get_dashboard_stats()
+    return g.dashboard_stats
+
+def _greeting():
+    hour = datetime.now().hour
+    return "Good Morning" if hour < 12 else "Good Afternoon" if hour < 18 else "Good Evening"
+
+def _stats_version(**kwargs):
+    stats = _dashboard_stats()
+    # Version 0 means the stats read failed: never cache that page
+    return (stats['version'] or None), stats['updated_at']
+
+def _home_version(**kwargs):
+    version, updated_at = _stats_version()
+    return (version and [version, _greeting()]), updated_at
+
+def _blog_version(blog_id):
+    blog = db_service.get_blog_by_id(blog_id)
+    if not blog:
+        return None, None
+    return [blog.get('updated_at'), blog.get('content_hash'), blog.get('status')], blog.get('updated_at')
+
 # --- WEB PAGE ROUTES ---
 
 @blog_bp.route('/dashboard')
+@conditional(_home_version)
 def home():
     """Renders Dashboard with real-time Firestore stats and Activity Feed."""
     try:
-        hour = datetime.now().hour
-        greeting = "Good Morning" if hour < 12 else "Good Afternoon" if hour < 18 else "Good Evening"
+        greeting = _greeting()
         username = session.get('user_name', 'Admin')
 
-        total_blogs = db_service.get_total_blogs_count()
-        drafts = db_service.get_blogs_by_status("DRAFT")
-        pending = db_service.get_blogs_by_status("UNDER_REVIEW")
-        categories = db_service.get_all_categories()
-        recent_activity = db_service.get_recent_activity(limit=10)
-        
+        # One document read instead of streaming whole collections to count them
+        stats = _dashboard_stats()
+        # The activity feed is loaded client-side from /api/activity
+
         return render_template('home.html', 
                                greeting=greeting,
                                username=username,
-                               total_blogs_count=total_blogs,
-                               drafts_count=len(drafts), 
-                               pending_count=len(pending),
-                               categories_count=len(categories),
-                               recent_activity=recent_activity)
+                               total_blogs_count=stats['total_blogs'],
+                               drafts_count=stats['drafts'], 
+                               pending_count=stats['pending'],
+                               categories_count=stats['categories'])
     except Exception as e:
         print(f"Error in home route: {e}")
-        return render_template('home.html', total_blogs_count=0, recent_activity=[])
+        return render_template('home.html', total_blogs_count=0)
 
 @blog_bp.route('/create')
 def create_page():
@@ -54,6 +89,7 @@ def create_page():
     return render_template('create_blog.html', username=username)
 
 @blog_bp.route('/edit/<blog_id>')
+@conditional(_blog_version)
 def edit_blog(blog_id):
     """Renders the editor for a specific blog."""
     username = session.get('user_name', 'Admin')
@@ -63,45 +99,49 @@ def edit_blog(blog_id):
     return render_template('edit_blog.html', blog=blog_data, username=username)
 
 @blog_bp.route('/drafts')
+@conditional(_stats_version)
 def drafts_page():
     page = request.args.get('page', 1, type=int)
+    page_token = request.args.get('page_token')
     per_page = 10 
-    drafts, total_count = db_service.get_paginated_drafts(page=page, per_page=per_page)
-    total_pages = math.ceil(total_count / per_page)
+    drafts, next_token, prev_token = db_service.get_blogs_page("DRAFT", page_size=per_page, page_token=page_token)
+    total_count = _dashboard_stats()['drafts']
+    total_pages = max(1, math.ceil(total_count / per_page))
     
     return render_template(
         'drafts.html', 
         drafts=drafts, 
-        current_page=page, 
+        current_page=page if page_token else 1, 
         total_pages=total_pages,
-        has_next=page < total_pages,
-        has_prev=page > 1
+        next_token=next_token,
+        prev_token=prev_token
     )
     
 @blog_bp.route('/approval')
+@conditional(_stats_version)
 def approval_page():
     """Renders the Admin Approval page with blogs status 'UNDER_REVIEW'."""
     page = request.args.get('page', 1, type=int)
+    page_token = request.args.get('page_token')
     per_page = 10
     
-    all_pending = db_service.get_blogs_by_status("UNDER_REVIEW")
-    total_count = len(all_pending)
-    total_pages = math.ceil(total_count / per_page)
-    
-    start = (page - 1) * per_page
-    end = start + per_page
-    pending_blogs = all_pending[start:end]
+    pending_blogs, next_token, prev_token = db_service.get_blogs_page(
+        "UNDER_REVIEW", page_size=per_page, page_token=page_token
+    )
+    total_count = _dashboard_stats()['pending']
+    total_pages = max(1, math.ceil(total_count / per_page))
     
     return render_template(
         'approval_queue.html', 
         pending_blogs=pending_blogs, 
-        current_page=page, 
+        current_page=page if page_token else 1, 
         total_pages=total_pages,
-        has_next=page < total_pages,
-        has_prev=page > 1
+        next_token=next_token,
+        prev_token=prev_token
     )
 
 @blog_bp.route('/categories')
+@conditional(_stats_version)
 def categories_page():
     categories = db_service.get_all_categories()
     return render_template('categories.html', categories=categories)
@@ -110,100 +150,354 @@ def categories_page():
 
 @blog_bp.route('/api/generate', methods=['POST'])
 def generate_and_submit():
-    """AI Content Generation Pipeline with Intelligent Categorization."""
+    """Queues the AI generation pipeline and returns a job id to poll."""
     try:
         data = request.get_json()
-        prompt = data.get('prompt')
-        auto_submit = data.get('auto_submit', False)
-        
-        blog_ai = BlogAgent()
-        generated_data = blog_ai.run_pipeline(prompt)
-        
-        cat_agent = CategoryAgent()
-        content_text = generated_data.get('content', {}).get('body', '')
-        assigned_cat = cat_agent.categorize_blog(generated_data.get('title'), content_text)
-        generated_data['category'] = assigned_cat
-        
-        draft_agent = DraftsAgent()
-        status = "UNDER_REVIEW" if auto_submit else "DRAFT"
-        generated_data['status'] = status
-        
+        prompt = (data.get('prompt') or '').strip()
+        auto_submit = _truthy(data.get('auto_submit', False))
+        force_fresh = _truthy(data.get('force_fresh', False))  # Skip the LLM response cache
+
+        if not prompt:
+            return jsonify({"success": False, "error": "Prompt is required"}), 400
+
         user_id = session.get('user_id', 'system_gen')
-        blog_id = draft_agent.create_initial_draft(generated_data, user_id)
-        
-        db_service.log_activity(
-            user=session.get('user_name', 'Admin'),
-            type="generated",
-            action_text=f"generated a blog in {assigned_cat}",
-            blog_title=generated_data.get('title', 'Untitled')
-        )
-        
+        user_name = session.get('user_name', 'Admin')
+        jobs = JobQueue.get_instance()
+
+        # Retries/double submits carrying the same key get the original job back
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key:
+            request_hash = hashlib.sha256(
+                json.dumps([prompt, auto_submit, force_fresh]).encode("utf-8")
+            ).hexdigest()
+            record, created = jobs.submit_once(prompt, auto_submit, user_id, user_name,
+                                               idempotency_key, request_hash, force_fresh=force_fresh)
+            if record and not created:
+                if record.get('request_hash') != request_hash:
+                    return jsonify({"success": False, "error": "Idempotency-Key was already used for a different request"}), 422
+                return jsonify({
+                    "success": True,
+                    "job_id": record['job_id'],
+                    "status_url": url_for('blog.job_status', job_id=record['job_id']),
+                    "replayed": True
+                }), 202
+            job_id = record['job_id'] if record else None
+        else:
+            job_id = jobs.submit(prompt, auto_submit, user_id=user_id, user_name=user_name, force_fresh=force_fresh)
+        if not job_id:
+            return jsonify({"success": False, "error": "Could not queue generation job"}), 500
+
         return jsonify({
-            "success": True, 
-            "redirect": url_for('blog.approval_page' if auto_submit else 'blog.drafts_page') 
-        }), 201
+            "success": True,
+            "job_id": job_id,
+            "status_url": url_for('blog.job_status', job_id=job_id)
+        }), 202
     except Exception as e:
         print(f"❌ Route Error in Generate: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@blog_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Reports stage, progress and result (blog id or error) of a generation job."""
+    job = db_service.get_job(job_id)
+    if not job or job.get('user_id') != session.get('user_id', 'system_gen'):
+        return jsonify({"success": False, "error": "Job not found"}), 404
+
+    response = {
+        "success": True,
+        "job_id": job['id'],
+        "status": job.get('status'),
+        "stage": job.get('stage'),
+        "progress": job.get('progress', 0),
+        "blog_id": job.get('blog_id'),
+        "error": job.get('error')
+    }
+    if job.get('status') == "COMPLETED":
+        response["redirect"] = url_for('blog.approval_page' if job.get('auto_submit') else 'blog.drafts_page')
+    return jsonify(response)
+
+# --- BATCH GENERATION ---
+
+def _truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+def _parse_batch_request():
+    """
+    Items and options of a batch request. Accepts JSON ({"items": [{"prompt",
+    "auto_submit"}]} or {"prompts": [...]}) or CSV (an uploaded "file" or a
+    text/csv body) with a prompt column and an optional auto_submit column.
+    Returns (items, options).
+    """
+    upload = request.files.get('file')
+    if upload or request.mimetype == 'text/csv':
+        text = upload.read().decode('utf-8-sig') if upload else request.get_data(as_text=True)
+        options = request.form if upload else request.args
+        rows = list(csv.reader(io.StringIO(text)))
+        header = [h.strip().lower() for h in rows[0]] if rows else []
+        if 'prompt' in header:
+            records = [dict(zip(header, row)) for row in rows[1:]]
+        else:
+            records = [{"prompt": row[0]} for row in rows if row]
+    else:
+        options = request.get_json(silent=True) or {}
+        records = options.get('items') or [{"prompt": p} for p in options.get('prompts', [])]
+
+    default_auto_submit = _truthy(options.get('auto_submit', False))
+    items = []
+    for record in records:
+        prompt = (record.get('prompt') or '').strip() if isinstance(record, dict) else ''
+        if prompt:
+            auto_submit = record.get('auto_submit')
+            items.append({
+                "prompt": prompt,
+                "auto_submit": default_auto_submit if auto_submit in (None, '') else _truthy(auto_submit)
+            })
+    return items, options
+
+@blog_bp.route('/api/batches', methods=['POST'])
+def create_batch():
+    """Queues generation for a list of prompts; poll the returned status_url for per-item progress."""
+    try:
+        items, options = _parse_batch_request()
+        max_items = current_app.config['BATCH_MAX_ITEMS']
+        if not items:
+            return jsonify({"success": False, "error": "No prompts given"}), 400
+        if len(items) > max_items:
+            return jsonify({"success": False, "error": f"A batch holds at most {max_items} prompts"}), 400
+        try:
+            concurrency = int(options.get('concurrency') or 0)
+        except (TypeError, ValueError):
+            concurrency = -1
+        if concurrency < 0:
+            return jsonify({"success": False, "error": "concurrency must be a positive whole number"}), 400
+
+        batch_id = BatchRunner.get_instance().submit(
+            items,
+            user_id=session.get('user_id', 'system_gen'),
+            user_name=session.get('user_name', 'Admin'),
+            concurrency=concurrency or None,
+            force_fresh=_truthy(options.get('force_fresh', False))
+        )
+        if not batch_id:
+            return jsonify({"success": False, "error": "Could not queue the batch"}), 500
+
+        return jsonify({
+            "success": True,
+            "batch_id": batch_id,
+            "total": len(items),
+            "status_url": url_for('blog.batch_status', batch_id=batch_id)
+        }), 202
+    except Exception as e:
+        print(f"❌ Route Error in Batch: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@blog_bp.route('/api/batches/<batch_id>', methods=['GET'])
+def batch_status(batch_id):
+    """Batch counters plus the status, stage and result of every item."""
+    batch = db_service.get_batch(batch_id, with_items=True)
+    if not batch or batch.get('user_id') != session.get('user_id', 'system_gen'):
+        return jsonify({"success": False, "error": "Batch not found"}), 404
+
+    return jsonify({
+        "success": True,
+        "batch_id": batch['id'],
+        "status": batch.get('status'),
+        "total": batch.get('total', 0),
+        "saved": batch.get('saved', 0),
+        "failed": batch.get('failed', 0),
+        "items": [{
+            "index": item['index'],
+            "prompt": item.get('prompt'),
+            "status": item.get('status'),
+            "stage": item.get('stage'),
+            "blog_id": item.get('blog_id'),
+            "category": item.get('category'),
+            "error": item.get('error')
+        } for item in batch['items']]
+    })
+
+@blog_bp.route('/api/batches/<batch_id>/retry', methods=['POST'])
+def retry_batch(batch_id):
+    """Re-runs the failed items of a batch."""
+    batch = db_service.get_batch(batch_id)
+    if not batch or batch.get('user_id') != session.get('user_id', 'system_gen'):
+        return jsonify({"success": False, "error": "Batch not found"}), 404
+
+    retried = BatchRunner.get_instance().retry_failed(batch_id)
+    return jsonify({"success": True, "retried": retried, "status_url": url_for('blog.batch_status', batch_id=batch_id)})
+
+def _sse(event, payload):
+    """Formats one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@blog_bp.route('/api/generate/stream', methods=['POST'])
+def generate_stream():
+    """
+    Streams the blog as it is written (SSE), then saves it like /api/generate.
+    POST only: it creates a draft. The request is held open for the whole
+    generation, so the create page uses /api/generate (job queue) unless
+    live preview is switched on.
+    """
+    data = request.get_json(silent=True) or {}
+    prompt = str(data.get('prompt', '')).strip()
+    auto_submit = _truthy(data.get('auto_submit', False))
+    force_fresh = _truthy(data.get('force_fresh', False))
+    user_id = session.get('user_id', 'system_gen')
+    user_name = session.get('user_name', 'Admin')
+
+    if not prompt:
+        return jsonify({"success": False, "error": "Prompt is required"}), 400
+
+    @stream_with_context
+    def events():
+        try:
+            generated_data = None
+            for event in BlogAgent(force_fresh=force_fresh).stream_pipeline(prompt):
+                if event["type"] == "stage":
+                    yield _sse("stage", {"stage": event["stage"]})
+                elif event["type"] == "chunk":
+                    yield _sse("chunk", {"text": event["text"]})
+                elif event["type"] == "result":
+                    generated_data = event["data"]
+
+            # Full text is saved through DraftsAgent once the stream has ended
+            yield _sse("stage", {"stage": "SAVING"})
+            blog_id, _ = save_generated_blog(
+                generated_data, auto_submit, user_id, user_name, db_service, force_fresh=force_fresh
+            )
+
+            yield _sse("done", {
+                "blog_id": blog_id,
+                "redirect": url_for('blog.approval_page' if auto_submit else 'blog.drafts_page')
+            })
+        except Exception as e:
+            print(f"❌ Route Error in Generate Stream: {e}")
+            yield _sse("error", {"error": str(e)})
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # Stop reverse proxies from buffering the stream
+    })
+
+@blog_bp.route('/api/llm_cache/stats', methods=['GET'])
+def llm_cache_stats():
+    """Hit/miss counters of the LLM response cache."""
+    return jsonify(LLMCache.get_instance().stats())
+
+@blog_bp.route('/api/llm_gateway/status', methods=['GET'])
+def llm_gateway_status():
+    """Rate limiter, concurrency limit, circuit breaker and call counters of the Gemini gateway."""
+    return jsonify(LLMGateway.get_instance().stats())
+
+@blog_bp.route('/api/activity', methods=['GET'])
+def activity_feed():
+    """Activity feed. Pass the returned cursor back as ?since= to get only newer entries."""
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    activities, cursor = db_service.get_recent_activity(limit=limit, since=request.args.get('since'))
+    response = jsonify({"activities": activities, "cursor": cursor})
+    # Timestamps are absolute, so a response stays valid until new activity is logged
+    response.headers['Cache-Control'] = 'private, max-age=10'
+    return response
+
+@blog_bp.route('/api/search', methods=['GET'])
+def search_blogs():
+    """Full-text search over titles and bodies: ?q=&status=&category=&limit="""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), current_app.config['SEARCH_MAX_RESULTS']))
+
+    found = SearchIndex.get_instance().search(query, status=request.args.get('status') or None,
+                                              category=request.args.get('category') or None, limit=limit)
+    if found is None:
+        return jsonify({"error": "The search index is still loading, try again shortly."}), 503
+    results, total = found
+    return jsonify({"results": results, "total": total})
+
 @blog_bp.route('/api/update_status/<blog_id>', methods=['POST'])
 def update_status(blog_id):
     """General status update (Approving or Rejecting)."""
     try:
         data = request.get_json()
         new_status = data.get('status', 'DRAFT')
-        success = db_service.update_blog_status(blog_id, new_status)
-        
-        if success:
-            blog_data = db_service.get_blog_by_id(blog_id)
-            action_text = "rejected back to drafts" if new_status == "DRAFT" else "approved for publication"
-            db_service.log_activity(
-                user=session.get('user_name', 'Admin'),
-                type="edited" if new_status == "DRAFT" else "published",
-                action_text=action_text,
-                blog_title=blog_data.get('title', 'Untitled') if blog_data else "Untitled"
-            )
+        action_text = "rejected back to drafts" if new_status == "DRAFT" else "approved for publication"
+        # Status, counters and activity entry are committed together
+        blog_data = db_service.update_blog_status(blog_id, new_status, activity={
+            "user": session.get('user_name', 'Admin'),
+            "type": "edited" if new_status == "DRAFT" else "published",
+            "action_text": action_text
+        })
             
-        return jsonify({"success": success})
+        return jsonify({"success": blog_data is not None})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @blog_bp.route('/api/submit_for_review/<blog_id>', methods=['POST'])
 def submit_for_review(blog_id):
     """Manual trigger to move blog from DRAFT to UNDER_REVIEW."""
-    success = db_service.update_blog_status(blog_id, "UNDER_REVIEW")
-    if success:
-        blog_data = db_service.get_blog_by_id(blog_id)
-        db_service.log_activity(
-            user=session.get('user_name', 'Admin'),
-            type="review_requested",
-            action_text="submitted for approval",
-            blog_title=blog_data.get('title', 'Untitled') if blog_data else "Untitled"
-        )
-    return jsonify({"success": success, "redirect": url_for('blog.home')})
+    blog_data = db_service.update_blog_status(blog_id, "UNDER_REVIEW", activity={
+        "user": session.get('user_name', 'Admin'),
+        "type": "review_requested",
+        "action_text": "submitted for approval"
+    })
+    return jsonify({"success": blog_data is not None, "redirect": url_for('blog.home')})
 
 @blog_bp.route('/api/delete_blog/<blog_id>', methods=['DELETE'])
 def delete_blog_api(blog_id):
     """Permanently removes a blog and logs activity."""
-    blog_data = db_service.get_blog_by_id(blog_id)
-    title = blog_data.get('title', 'Untitled') if blog_data else "Untitled"
-    
-    success = db_service.delete_blog(blog_id)
-    if success:
-        db_service.log_activity(
-            user=session.get('user_name', 'Admin'),
-            type="deleted",
-            action_text="permanently deleted",
-            blog_title=title
-        )
-    return jsonify({"success": success})
+    # The deleted document's title goes into the activity entry in the same transaction
+    blog_data = db_service.delete_blog(blog_id, activity={
+        "user": session.get('user_name', 'Admin'),
+        "type": "deleted",
+        "action_text": "permanently deleted"
+    })
+    return jsonify({"success": blog_data is not None})
+
+# --- BULK REVIEW ACTIONS ---
+
+MAX_BULK_IDS = 500
+
+def _bulk_ids():
+    data = request.get_json(silent=True) or {}
+    blog_ids = [b for b in data.get('blog_ids', []) if isinstance(b, str) and b]
+    return data, blog_ids[:MAX_BULK_IDS]
+
+@blog_bp.route('/api/bulk/update_status', methods=['POST'])
+def bulk_update_status():
+    """Approves or rejects a list of blogs: {"blog_ids": [...], "status": "PUBLISHED"}."""
+    data, blog_ids = _bulk_ids()
+    if not blog_ids:
+        return jsonify({"success": False, "error": "No blog ids given"}), 400
+
+    new_status = data.get('status', 'DRAFT').upper()
+    result = db_service.bulk_update_status(blog_ids, new_status, activity={
+        "user": session.get('user_name', 'Admin'),
+        "type": "edited" if new_status == "DRAFT" else "published",
+        "action_text": "rejected back to drafts" if new_status == "DRAFT" else "approved for publication"
+    })
+    return jsonify({"success": not result["failed"], **result})
+
+@blog_bp.route('/api/bulk/delete', methods=['POST'])
+def bulk_delete():
+    """Permanently removes a list of blogs: {"blog_ids": [...]}."""
+    data, blog_ids = _bulk_ids()
+    if not blog_ids:
+        return jsonify({"success": False, "error": "No blog ids given"}), 400
+
+    result = db_service.bulk_delete(blog_ids, activity={
+        "user": session.get('user_name', 'Admin'),
+        "type": "deleted",
+        "action_text": "permanently deleted"
+    })
+    return jsonify({"success": not result["failed"], **result})
 
 @blog_bp.route('/api/delete_category/<category_id>', methods=['DELETE'])
 def delete_category_api(category_id):
     """Deletes a category and logs activity."""
     try:
-        categories = db_service.get_all_categories()
-        category = next((c for c in categories if c.get('id') == category_id), None)
+        category = db_service.get_category(category_id)
         cat_name = category.get('name', 'Unknown') if category else "Unknown"
 
         success = db_service.delete_category(category_id)
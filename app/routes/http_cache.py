@@ -0,0 +1,62 @@
+import hashlib
+import json
+from datetime import timezone
+from functools import wraps
+
+from flask import request, session, make_response
+
+
+def conditional(validator):
+    """
+    ETag / Last-Modified support for a view. validator(**view_kwargs) returns
+    (version, last_modified): a JSON-serialisable value that changes whenever
+    the page would change, and an optional datetime. Both are cheap to get
+    (stats document, cached blog), so a matching request is answered with
+    304 before the view queries Firestore or renders its template.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                version, last_modified = validator(**kwargs)
+            except Exception as e:
+                print(f"⚠️ Conditional request check failed, rendering normally: {e}")
+                return view(*args, **kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+
+            # Pages are per user (greeting, sidebar), and query args select the page
+            fingerprint = json.dumps(
+                [version, session.get('user_id'), session.get('user_name'), sorted(request.args.items(multi=True))],
+                default=str
+            )
+            etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = _as_utc(last_modified)
+
+            # Weak: the same page compressed (br/gzip) or not is still the same page
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified.replace(microsecond=0) <= request.if_modified_since)
+
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Browsers must revalidate every time: the 304 is what saves the work
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def _as_utc(value):
+    # Firestore returns aware datetimes; our own writes use naive UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
@@ -0,0 +1,16 @@
+import hmac
+
+from flask import Blueprint, Response, request, current_app
+from app.observability.metrics import MetricsRegistry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint. Outside the login wall; set METRICS_TOKEN to require a bearer token."""
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, token):
+            return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(MetricsRegistry.get_instance().render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,460 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.firebase.blog_content import extract_markdown
+from app.ml.text import words
+
+
+class InvertedIndex:
+    """
+    BM25 index over blog title + body. Each term keeps two growable arrays,
+    the document numbers that contain it and the term frequency in each
+    (title words count TITLE_WEIGHT times); numpy scores a query straight
+    from those buffers. Re-indexing a blog gives it a new document number
+    and leaves the old postings dead (masked out) until compact().
+    Not thread-safe: SearchIndex serializes access.
+    """
+    K1 = 1.2
+    B = 0.75
+    TITLE_WEIGHT = 3
+    MAX_TF = 65535  # Term frequencies are stored as uint16
+
+    def __init__(self):
+        self.postings = {}  # term -> (array('i') doc numbers, array('H') term frequencies)
+        self.docs = {}  # blog id -> current document number
+        self.ids = []
+        self.titles = []
+        self.lengths = array('f')
+        self.alive = array('b')
+        self.statuses = array('h')  # codes into status_names
+        self.categories = array('i')  # codes into category_names
+        self.updated = array('d')  # updated_at as epoch seconds
+        self.status_names = []
+        self.category_names = []
+        self.live = 0
+        self.total_length = 0.0
+
+    def __len__(self):
+        return self.live
+
+    @property
+    def dead(self):
+        return len(self.ids) - self.live
+
+    # ---------------- WRITES ----------------
+
+    def add(self, blog_id, title, body, status, category, updated):
+        """Indexes (or re-indexes) a blog."""
+        self.remove(blog_id)
+
+        counts = {}
+        for word in words(title):
+            counts[word] = counts.get(word, 0) + self.TITLE_WEIGHT
+        for word in words(body):
+            counts[word] = counts.get(word, 0) + 1
+
+        number = len(self.ids)
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('i'), array('H'))
+            posting[0].append(number)
+            posting[1].append(min(tf, self.MAX_TF))
+
+        length = float(sum(counts.values()))
+        self.docs[blog_id] = number
+        self.ids.append(blog_id)
+        self.titles.append(title or "")
+        self.lengths.append(length)
+        self.alive.append(1)
+        self.statuses.append(_code(self.status_names, (status or "").upper()))
+        self.categories.append(_code(self.category_names, category or ""))
+        self.updated.append(updated)
+        self.live += 1
+        self.total_length += length
+
+    def update_fields(self, blog_id, title, status, category, updated):
+        """
+        Metadata-only change in place. Returns False when the blog is not
+        indexed or its title changed (the text has to be re-indexed).
+        """
+        number = self.docs.get(blog_id)
+        if number is None or (title is not None and title != self.titles[number]):
+            return False
+        if status is not None:
+            self.statuses[number] = _code(self.status_names, status.upper())
+        if category is not None:
+            self.categories[number] = _code(self.category_names, category)
+        if updated:
+            self.updated[number] = updated
+        return True
+
+    def remove(self, blog_id):
+        number = self.docs.pop(blog_id, None)
+        if number is None:
+            return False
+        self.alive[number] = 0
+        self.live -= 1
+        self.total_length -= self.lengths[number]
+        return True
+
+    def compact(self):
+        """Drops dead documents and their postings, renumbering the live ones."""
+        if not self.dead:
+            return
+        alive = np.frombuffer(self.alive, dtype=np.int8).astype(bool)
+        renumber = np.cumsum(alive, dtype=np.int64) - 1
+
+        postings = {}
+        for term, (docs, tfs) in self.postings.items():
+            doc_numbers = np.frombuffer(docs, dtype=np.int32)
+            keep = alive[doc_numbers]
+            if not keep.any():
+                continue
+            postings[term] = (array('i', renumber[doc_numbers[keep]].astype(np.int32).tobytes()),
+                              array('H', np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes()))
+            del doc_numbers
+        self.postings = postings
+
+        keep = np.flatnonzero(alive)
+        self.ids = [self.ids[i] for i in keep]
+        self.titles = [self.titles[i] for i in keep]
+        self.lengths = array('f', np.frombuffer(self.lengths, dtype=np.float32)[keep].tobytes())
+        self.statuses = array('h', np.frombuffer(self.statuses, dtype=np.int16)[keep].tobytes())
+        self.categories = array('i', np.frombuffer(self.categories, dtype=np.int32)[keep].tobytes())
+        self.updated = array('d', np.frombuffer(self.updated, dtype=np.float64)[keep].tobytes())
+        self.alive = array('b', b'\x01' * len(keep))
+        self.docs = {blog_id: number for number, blog_id in enumerate(self.ids)}
+
+    # ---------------- QUERIES ----------------
+
+    def search(self, query, status=None, category=None, limit=20):
+        """Returns (hits, total): hits are (document number, score), best first."""
+        terms = [term for term in dict.fromkeys(words(query)) if term in self.postings]
+        if not terms or not self.live:
+            return [], 0
+
+        mask = np.frombuffer(self.alive, dtype=np.int8).astype(bool)
+        if status:
+            code = _lookup(self.status_names, status.upper())
+            mask &= np.frombuffer(self.statuses, dtype=np.int16) == code
+        if category:
+            code = _lookup(self.category_names, category)
+            mask &= np.frombuffer(self.categories, dtype=np.int32) == code
+
+        lengths = np.frombuffer(self.lengths, dtype=np.float32)
+        avg_length = max(self.total_length / self.live, 1.0)
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in terms:
+            docs, tfs = self.postings[term]
+            doc_numbers = np.frombuffer(docs, dtype=np.int32)
+            tf = np.frombuffer(tfs, dtype=np.uint16).astype(np.float32)
+            # df counts dead postings too until the next compaction; close enough for ranking
+            df = len(docs)
+            idf = math.log(1.0 + (self.live - df + 0.5) / (df + 0.5))
+            norm = self.K1 * (1.0 - self.B + self.B * lengths[doc_numbers] / avg_length)
+            # A document appears once per term, so fancy-index += is safe here
+            scores[doc_numbers] += idf * tf * (self.K1 + 1.0) / (tf + norm)
+            del doc_numbers
+        del lengths
+
+        scores[~mask] = 0
+        hits = np.flatnonzero(scores)
+        total = len(hits)
+        if total > limit:
+            hits = hits[np.argpartition(-scores[hits], limit)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(number), float(scores[number])) for number in hits], total
+
+    def document(self, number):
+        updated = self.updated[number]
+        return {
+            "id": self.ids[number],
+            "title": self.titles[number],
+            "status": self.status_names[self.statuses[number]] or None,
+            "category": self.category_names[self.categories[number]] or None,
+            "updated_at": datetime.fromtimestamp(updated, timezone.utc).isoformat() if updated else None
+        }
+
+    # ---------------- SNAPSHOTS ----------------
+
+    def to_arrays(self):
+        """Compacts, then flattens the postings into three arrays (terms, offsets, data)."""
+        self.compact()
+        terms = list(self.postings)
+        sizes = np.fromiter((len(self.postings[term][0]) for term in terms), dtype=np.int64, count=len(terms))
+        meta = {"terms": terms, "ids": self.ids, "titles": self.titles,
+                "status_names": self.status_names, "category_names": self.category_names}
+        return {
+            "meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+            "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            "docs": np.frombuffer(b"".join(self.postings[t][0].tobytes() for t in terms), dtype=np.int32),
+            "tfs": np.frombuffer(b"".join(self.postings[t][1].tobytes() for t in terms), dtype=np.uint16),
+            "lengths": np.frombuffer(self.lengths, dtype=np.float32).copy(),
+            "statuses": np.frombuffer(self.statuses, dtype=np.int16).copy(),
+            "categories": np.frombuffer(self.categories, dtype=np.int32).copy(),
+            "updated": np.frombuffer(self.updated, dtype=np.float64).copy()
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls()
+        meta = json.loads(arrays["meta"].tobytes().decode("utf-8"))
+        offsets, docs, tfs = arrays["offsets"], arrays["docs"].astype(np.int32), arrays["tfs"].astype(np.uint16)
+        for i, term in enumerate(meta["terms"]):
+            start, end = offsets[i], offsets[i + 1]
+            index.postings[term] = (array('i', docs[start:end].tobytes()), array('H', tfs[start:end].tobytes()))
+
+        index.ids = meta["ids"]
+        index.titles = meta["titles"]
+        index.status_names = meta["status_names"]
+        index.category_names = meta["category_names"]
+        index.docs = {blog_id: number for number, blog_id in enumerate(index.ids)}
+        index.lengths = array('f', arrays["lengths"].astype(np.float32).tobytes())
+        index.statuses = array('h', arrays["statuses"].astype(np.int16).tobytes())
+        index.categories = array('i', arrays["categories"].astype(np.int32).tobytes())
+        index.updated = array('d', arrays["updated"].astype(np.float64).tobytes())
+        index.alive = array('b', b'\x01' * len(index.ids))
+        index.live = len(index.ids)
+        index.total_length = float(arrays["lengths"].sum())
+        return index
+
+
+class SearchIndex:
+    """
+    Process-wide InvertedIndex behind /api/search. Loads a snapshot
+    (SEARCH_INDEX_PATH) and catches up on blogs updated since, or builds
+    from Firestore, in the background. Writes made by this process arrive
+    through FirestoreService.on_blog_change; every SEARCH_REFRESH_SECONDS
+    blogs updated elsewhere are pulled in (deletes made by other processes
+    are only noticed when the index is next loaded).
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    # Dead documents (re-indexed or deleted) tolerated before a compaction
+    COMPACT_RATIO = 0.25
+
+    @classmethod
+    def configure(cls, config, db_service):
+        with cls._lock:
+            cls._instance = cls(
+                enabled=config['SEARCH_ENABLED'],
+                path=config['SEARCH_INDEX_PATH'],
+                save_every=config['SEARCH_SAVE_EVERY'],
+                refresh_seconds=config['SEARCH_REFRESH_SECONDS'],
+                db_service=db_service
+            )
+        return cls._instance
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls(enabled=False)
+        return cls._instance
+
+    def __init__(self, enabled=True, path=None, save_every=50, refresh_seconds=300, db_service=None):
+        self.enabled = enabled
+        self.path = path
+        self.save_every = save_every
+        self.refresh_seconds = refresh_seconds
+        self.db_service = db_service
+
+        self.index = InvertedIndex()
+        self.ready = False
+        self._index_lock = threading.RLock()
+        self._pending = []  # Changes that arrive while the index is loading
+        self._unsaved = 0
+        self._saving = threading.Lock()
+        self._watermark = 0.0  # Newest updated_at seen, for refreshes
+
+        if self.enabled:
+            db_service.on_blog_change(self.blog_changed)
+            if self.path:
+                atexit.register(self.save)
+
+    # ---------------- LOADING ----------------
+
+    def load_in_background(self):
+        if self.enabled:
+            threading.Thread(target=self._load_and_refresh, name="search-index", daemon=True).start()
+
+    def _load_and_refresh(self):
+        self.load()
+        while self.ready and self.refresh_seconds:
+            time.sleep(self.refresh_seconds)
+            self.refresh()
+
+    def load(self):
+        """Snapshot plus the blogs changed since it was written, or a full build from Firestore."""
+        try:
+            start = time.time()
+            if self.path and os.path.exists(self.path):
+                with np.load(self.path) as arrays:
+                    index = InvertedIndex.from_arrays(arrays)
+                source = "snapshot"
+                # Blogs deleted while the snapshot was on disk
+                existing = set(self.db_service.iter_blog_ids())
+                for blog_id in [blog_id for blog_id in index.docs if blog_id not in existing]:
+                    index.remove(blog_id)
+                since = float(np.frombuffer(index.updated, dtype=np.float64).max()) if len(index.ids) else 0.0
+                self._add_documents(index, self.db_service.iter_blog_documents(
+                    updated_since=datetime.fromtimestamp(since, timezone.utc) if since else None))
+            else:
+                index = InvertedIndex()
+                source = "Firestore"
+                self._add_documents(index, self.db_service.iter_blog_documents())
+
+            with self._index_lock:
+                self.index = index
+                self._watermark = float(np.frombuffer(index.updated, dtype=np.float64).max()) if len(index.ids) else 0.0
+                self.ready = True
+                pending, self._pending = self._pending, []
+            for blog_id, fields in pending:
+                self.blog_changed(blog_id, fields)
+
+            print(f"--- Search index ready ({source}): {len(index)} blogs, {len(index.postings)} terms "
+                  f"in {time.time() - start:.2f}s ---")
+            if source == "Firestore" or index.dead:
+                self.save()
+        except Exception as e:
+            print(f"❌ Search index unavailable: {e}")
+
+    def _add_documents(self, index, documents):
+        for blog_id, fields, body in documents:
+            index.add(blog_id, fields.get('title'), body, fields.get('status'),
+                      fields.get('category'), _epoch(fields.get('updated_at')))
+
+    def refresh(self):
+        """Indexes blogs updated since the newest one seen (writes from other processes)."""
+        try:
+            since = datetime.fromtimestamp(self._watermark, timezone.utc) if self._watermark else None
+            documents = list(self.db_service.iter_blog_documents(updated_since=since))
+            if not documents:
+                return
+            with self._index_lock:
+                self._add_documents(self.index, documents)
+                self._watermark = max(self._watermark, max(_epoch(f.get('updated_at')) for _, f, _ in documents))
+            self._changed(len(documents))
+        except Exception as e:
+            print(f"⚠️ Search index refresh failed: {e}")
+
+    def save(self):
+        if not (self.enabled and self.ready and self.path):
+            return
+        if not self._saving.acquire(blocking=False):
+            return  # A save is already running
+        try:
+            with self._index_lock:
+                arrays = self.index.to_arrays()
+                self._unsaved = 0
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp.npz"
+            np.savez_compressed(tmp_path, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"❌ Error saving search index snapshot: {e}")
+        finally:
+            self._saving.release()
+
+    # ---------------- UPDATES ----------------
+
+    def blog_changed(self, blog_id, fields):
+        """FirestoreService.on_blog_change callback."""
+        with self._index_lock:
+            if not self.ready:
+                self._pending.append((blog_id, fields))
+                return
+            if fields is None:
+                self.index.remove(blog_id)
+                handled = True
+            elif 'body' in fields:
+                self.index.add(blog_id, fields.get('title'), fields['body'], fields.get('status'),
+                               fields.get('category'), _epoch(fields.get('updated_at')))
+                handled = True
+            else:
+                handled = self.index.update_fields(blog_id, fields.get('title'), fields.get('status'),
+                                                   fields.get('category'), _epoch(fields.get('updated_at')))
+
+        if not handled:
+            # Title changed without the body, or a blog we have not seen: index the stored document
+            blog = self.db_service.get_blog_by_id(blog_id)
+            with self._index_lock:
+                if blog:
+                    self.index.add(blog_id, blog.get('title'), extract_markdown(blog.get('content')),
+                                   blog.get('status'), blog.get('category'), _epoch(blog.get('updated_at')))
+                else:
+                    self.index.remove(blog_id)
+        self._changed()
+
+    def _changed(self, n=1):
+        with self._index_lock:
+            self._unsaved += n
+            bloated = self.index.dead > self.COMPACT_RATIO * max(len(self.index.ids), 1)
+            due = self._unsaved >= self.save_every
+        if (due or bloated) and not self._saving.locked():
+            # Snapshots and compactions of a large index take a while: keep them off the request thread
+            threading.Thread(target=self._maintain, name="search-index-save", daemon=True).start()
+
+    def _maintain(self):
+        """Saves a snapshot (which compacts first), or just compacts when there is no snapshot path."""
+        if self.path:
+            self.save()
+            return
+        if not self._saving.acquire(blocking=False):
+            return
+        try:
+            with self._index_lock:
+                self.index.compact()
+        finally:
+            self._saving.release()
+
+    # ---------------- QUERIES ----------------
+
+    def search(self, query, status=None, category=None, limit=20):
+        """Returns (results, total) or None while the index is not ready. Results are dicts, best first."""
+        if not (self.enabled and self.ready):
+            return None
+        with self._index_lock:
+            hits, total = self.index.search(query, status=status, category=category, limit=limit)
+            results = [dict(self.index.document(number), score=round(score, 4)) for number, score in hits]
+        return results, total
+
+    def stats(self):
+        with self._index_lock:
+            return {"ready": self.ready, "blogs": len(self.index), "terms": len(self.index.postings),
+                    "dead": self.index.dead}
+
+
+def _code(names, name):
+    """Index of name in names, appending it the first time."""
+    try:
+        return names.index(name)
+    except ValueError:
+        names.append(name)
+        return len(names) - 1
+
+
+def _lookup(names, name):
+    try:
+        return names.index(name)
+    except ValueError:
+        return -1
+
+
+def _epoch(value):
+    """Epoch seconds for a Firestore timestamp (naive datetimes are UTC)."""
+    if not isinstance(value, datetime):
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
@@ -2,6 +2,57 @@
  * Scriptly AI - Main Application Logic
  */
 
+/**
+ * Random key identifying one generation request (sent as Idempotency-Key).
+ * crypto.randomUUID only exists on secure origins, hence the fallback.
+ */
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
+/**
+ * Posts to /api/generate with one Idempotency-Key per submission. A network
+ * failure is retried with the same key, so the server never starts the
+ * pipeline twice for one click.
+ */
+async function postGenerate(body, retries = 2) {
+    const key = newIdempotencyKey();
+    for (let attempt = 0; ; attempt++) {
+        try {
+            return await fetch('/api/generate', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key },
+                body: JSON.stringify(body)
+            });
+        } catch (err) {
+            if (attempt >= retries) throw err;
+            await new Promise(r => setTimeout(r, 1000 * (attempt + 1)));
+        }
+    }
+}
+
+/**
+ * Polls a generation job until it completes or fails.
+ * onUpdate receives every status payload (stage, progress) while waiting.
+ */
+async function pollJob(statusUrl, onUpdate, intervalMs = 2000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const job = await response.json();
+
+        if (!job.success) {
+            throw new Error(job.error || "Job not found.");
+        }
+        if (onUpdate) onUpdate(job);
+
+        if (job.status === 'COMPLETED') return job;
+        if (job.status === 'FAILED') throw new Error(job.error || "Generation failed.");
+
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 async function handleGeneration() {
     const promptInput = document.getElementById('prompt');
     const genBtn = document.getElementById('genBtn');
@@ -18,28 +69,19 @@ async function handleGeneration() {
     promptInput.classList.add('opacity-50');
 
     try {
-        const response = await fetch('/api/generate', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                prompt: promptInput.value,
-                user_id: 'admin_user_01' // In production, get from auth context
-            })
-        });
+        const response = await postGenerate({ prompt: promptInput.value });
 
         const result = await response.json();
 
-        if (result.success) {
-            // UI: Success feedback
-            console.log("Success! Blog ID:", result.blog_id);
-            // Redirect to Approval Queue automatically
-            window.location.href = result.redirect;
-        } else {
+        if (!result.success) {
             throw new Error(result.error || "Generation failed.");
         }
 
+        // The pipeline runs in the background; wait for the job to finish
+        const job = await pollJob(result.status_url);
+        console.log("Success! Blog ID:", job.blog_id);
+        window.location.href = job.redirect;
+
     } catch (error) {
         console.error("API Error:", error);
         alert("Oops! Something went wrong: " + error.message);
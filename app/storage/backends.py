@@ -0,0 +1,74 @@
+import threading
+
+from app.firebase.firebase_admin import FirebaseLoader
+
+BACKENDS = ("firestore", "sqlite")
+
+
+def create_storage_service(config, backend=None):
+    """The StorageService for backend (default: STORAGE_BACKEND)."""
+    backend = (backend or config['STORAGE_BACKEND']).lower()
+    # Only the selected backend is imported (the Firestore SDK is slow to import)
+    if backend == "sqlite":
+        from app.storage.sqlite_service import SqliteService
+        return SqliteService(
+            config['SQLITE_PATH'],
+            activity_ttl_days=config['ACTIVITY_TTL_DAYS'],
+            rollup_ttl_days=config['ACTIVITY_ROLLUP_TTL_DAYS'],
+            idempotency_ttl_hours=config['IDEMPOTENCY_TTL_HOURS']
+        )
+    if backend == "firestore":
+        from app.firebase.firestore_service import FirestoreService
+        FirebaseLoader.get_instance(config['FIREBASE_SERVICE_ACCOUNT'])
+        return FirestoreService(
+            category_listener=config['CATEGORY_INDEX_LISTENER'],
+            blog_cache_size=config['BLOG_CACHE_SIZE'],
+            blog_cache_listener=config['BLOG_CACHE_LISTENER'],
+            activity_write_behind=config['ACTIVITY_WRITE_BEHIND'],
+            activity_ttl_days=config['ACTIVITY_TTL_DAYS'],
+            rollup_ttl_days=config['ACTIVITY_ROLLUP_TTL_DAYS'],
+            idempotency_ttl_hours=config['IDEMPOTENCY_TTL_HOURS']
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND '{backend}' (expected one of: {', '.join(BACKENDS)})")
+
+
+class LazyStorageService:
+    """
+    Stands in for a StorageService until it is first used: the first
+    attribute access calls factory() (importing the SDK and opening
+    Firestore/SQLite). Blueprints and background components can hold it
+    from import time without slowing startup down. on_blog_change
+    listeners registered before then are attached to the real service.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._service = None
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.loaded = threading.Event()  # Set once the real service exists
+
+    def resolve(self):
+        """The real service (created on the first call)."""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    service = self._factory()
+                    for callback in self._listeners:
+                        service.on_blog_change(callback)
+                    self._service = service
+                    self.loaded.set()
+        return self._service
+
+    def is_loaded(self):
+        return self._service is not None
+
+    def on_blog_change(self, callback):
+        with self._lock:
+            if self._service is None:
+                self._listeners.append(callback)
+                return
+        self._service.on_blog_change(callback)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
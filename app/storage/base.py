@@ -0,0 +1,178 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+
+class StorageService:
+    """
+    What the routes, jobs and agents call as db_service. Backends
+    (FirestoreService, SqliteService) implement the same public methods
+    with the same return shapes: documents are dicts with an 'id', stored
+    timestamps come back as UTC datetimes, and a failed call prints an
+    error and returns the method's empty value instead of raising.
+
+    export_documents/import_documents move raw documents between backends
+    (see app/storage/migrate.py); they use Firestore's layout:
+    (collection path, document id, fields).
+    """
+    # Statuses tracked by the dashboard counters
+    STATUSES = ["DRAFT", "UNDER_REVIEW", "PUBLISHED", "REJECTED"]
+
+    # Fields list views need; content and outline stay on the server (edit page only)
+    SUMMARY_FIELDS = ["title", "category", "status", "updated_at", "created_at", "author_id"]
+
+    # Top-level collections copied by the migration tool (batch items are batches/<id>/items)
+    COLLECTIONS = ["blogs", "blog_contents", "categories", "stats", "activities", "activity_rollups",
+                   "users", "jobs", "batches", "idempotency_keys"]
+
+    def __init__(self):
+        # Called after blogs are created, changed or deleted by this process (search index)
+        self._blog_listeners = []
+
+    def on_blog_change(self, callback):
+        """
+        Registers callback(blog_id, fields), called after a blog write commits.
+        fields holds title, category, status and updated_at, plus 'body'
+        (markdown) when the text was written; it is None for deletes.
+        """
+        self._blog_listeners.append(callback)
+
+    def _blog_changed(self, blog_id, fields):
+        for callback in self._blog_listeners:
+            try:
+                callback(blog_id, fields)
+            except Exception as e:
+                print(f"⚠️ Blog change listener failed for {blog_id}: {e}")
+
+    def iter_blog_texts(self, chunk_size=100, sources=None):
+        """
+        Yields (blog_id, category, title, markdown) for every blog (trains the
+        local categorizer). sources keeps the blogs whose category_source is
+        one of them; blogs saved before that field existed count as "llm".
+        """
+        for blog_id, data, body in self.iter_blog_documents(chunk_size):
+            if sources is None or (data.get('category_source') or "llm") in sources:
+                yield blog_id, data.get('category'), data.get('title'), body
+
+    # ---------------- MIGRATION ----------------
+
+    def export_documents(self):
+        """Yields (collection path, document id, fields) for every stored document."""
+        raise NotImplementedError
+
+    def import_documents(self, documents, batch_size=400):
+        """Writes (collection path, document id, fields) tuples as they are; returns how many."""
+        raise NotImplementedError
+
+    # ---------------- CURSORS ----------------
+
+    def _encode_token(self, payload):
+        """Opaque, URL-safe cursor token."""
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+    def _decode_token(self, token):
+        if not token:
+            return None
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            return json.loads(base64.urlsafe_b64decode(padded.encode()))
+        except (ValueError, TypeError):
+            return None
+
+    def _encode_page_token(self, blog, direction):
+        return self._encode_token({"u": blog['updated_at'].isoformat(), "id": blog['id'], "d": direction})
+
+    def _decode_page_token(self, token):
+        """Returns {'d': 'next'|'prev', 'values': cursor dict} or None for the first page."""
+        payload = self._decode_token(token)
+        if not payload:
+            return None
+        try:
+            return {
+                "d": payload["d"],
+                "values": {
+                    "updated_at": datetime.fromisoformat(payload["u"]),
+                    "__name__": payload["id"]
+                }
+            }
+        except (ValueError, KeyError, TypeError):
+            # Tampered or stale token: start from the first page
+            return None
+
+    def _page_result(self, blogs, cursor, page_size):
+        """
+        Trims a page fetched with one extra blog (page_size + 1, in display
+        order) and builds its tokens: (blogs, next_token, prev_token).
+        """
+        if cursor is not None and cursor['d'] == 'prev':
+            has_prev = len(blogs) > page_size
+            blogs = blogs[-page_size:]
+            has_next = True
+        else:
+            has_next = len(blogs) > page_size
+            blogs = blogs[:page_size]
+            has_prev = cursor is not None
+
+        next_token = self._encode_page_token(blogs[-1], 'next') if has_next and blogs else None
+        prev_token = self._encode_page_token(blogs[0], 'prev') if has_prev and blogs else None
+        return blogs, next_token, prev_token
+
+    # ---------------- DASHBOARD STATS ----------------
+
+    def _format_stats(self, data):
+        by_status = data.get("by_status", {})
+        return {
+            "total_blogs": data.get("total_blogs", 0),
+            "drafts": by_status.get("DRAFT", 0),
+            "pending": by_status.get("UNDER_REVIEW", 0),
+            "published": by_status.get("PUBLISHED", 0),
+            "categories": data.get("categories", 0),
+            "version": data.get("version", 0),
+            "updated_at": data.get("updated_at")
+        }
+
+    def _stats_drift(self, stored, actual):
+        """{field: (stored, actual)} for every counter reconcile_stats had to correct."""
+        drift = {}
+        for field in ("total_blogs", "categories"):
+            if stored.get(field, 0) != actual[field]:
+                drift[field] = (stored.get(field, 0), actual[field])
+        for s, n in actual["by_status"].items():
+            old = stored.get("by_status", {}).get(s, 0)
+            if old != n:
+                drift[f"by_status.{s}"] = (old, n)
+        return drift
+
+
+def _bulk_result(blog_ids, written):
+    return {
+        "succeeded": [blog_id for blog_id in blog_ids if blog_id in written],
+        "failed": [blog_id for blog_id in blog_ids if blog_id not in written]
+    }
+
+
+def _iso_utc(value):
+    """ISO-8601 UTC string for a stored timestamp (naive datetimes are UTC)."""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat() + 'Z'
+
+
+def _apply_field_paths(data, update_data):
+    """Applies a Firestore-style update (dotted field paths) to a plain dict."""
+    for path, value in update_data.items():
+        target = data
+        parts = path.split('.')
+        for part in parts[:-1]:
+            if not isinstance(target.get(part), dict):
+                target[part] = {}
+            target = target[part]
+        target[parts[-1]] = value
+    return data
+
+
+def _change_fields(blog):
+    """The blog fields passed to on_blog_change listeners."""
+    return {key: blog.get(key) for key in ("title", "category", "category_source", "status", "updated_at")}
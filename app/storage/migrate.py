@@ -0,0 +1,20 @@
+def copy_documents(source, target, batch_size=400):
+    """
+    Copies every document of source (a StorageService) into target, e.g.
+    Firestore -> SQLite for an on-prem install or back. Ids are kept, so
+    links, jobs and the search index snapshot stay valid; documents already
+    in target with the same id are overwritten and others are kept. The
+    target's dashboard counters are reconciled at the end.
+    Returns ({collection: documents copied}, reconcile result).
+    """
+    counts = {}
+
+    def counted(documents):
+        for collection, doc_id, data in documents:
+            # batches/<id>/items are reported together
+            name = "batch_items" if collection.endswith("/items") else collection
+            counts[name] = counts.get(name, 0) + 1
+            yield collection, doc_id, data
+
+    target.import_documents(counted(source.export_documents()), batch_size=batch_size)
+    return counts, target.reconcile_stats()
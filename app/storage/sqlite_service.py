@@ -0,0 +1,1119 @@
+import base64
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import string
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from app.firebase import blog_content
+from app.storage.base import StorageService, _bulk_result, _iso_utc, _apply_field_paths, _change_fields
+
+# One table per Firestore collection: id, the columns queries filter or sort
+# on (copied out of the document on every write), and the document as JSON.
+# Batch items live in one table keyed "<batch_id>/<item_id>".
+TABLES = {
+    "blogs": {"status": "TEXT", "category": "TEXT", "updated_at": "INTEGER"},
+    "blog_contents": {},
+    "categories": {"name": "TEXT"},
+    "stats": {},
+    "activities": {"timestamp": "INTEGER"},
+    "activity_rollups": {"expire_at": "INTEGER"},
+    "users": {},
+    "jobs": {"status": "TEXT"},
+    "batches": {"status": "TEXT"},
+    "batch_items": {"batch_id": "TEXT", "status": "TEXT", "idx": "INTEGER"},
+    "idempotency_keys": {"expire_at": "INTEGER"}
+}
+
+INDEXES = [
+    # Status pages: WHERE status = ? ORDER BY updated_at DESC, id DESC (scanned backwards)
+    "CREATE INDEX IF NOT EXISTS blogs_status_updated ON blogs (status, updated_at, id)",
+    "CREATE INDEX IF NOT EXISTS blogs_category ON blogs (category)",
+    "CREATE INDEX IF NOT EXISTS blogs_updated ON blogs (updated_at)",
+    "CREATE INDEX IF NOT EXISTS categories_name ON categories (name)",
+    "CREATE INDEX IF NOT EXISTS activities_timestamp ON activities (timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS activity_rollups_expire ON activity_rollups (expire_at)",
+    "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)",
+    "CREATE INDEX IF NOT EXISTS batches_status ON batches (status)",
+    "CREATE INDEX IF NOT EXISTS batch_items_batch ON batch_items (batch_id, idx)",
+    "CREATE INDEX IF NOT EXISTS idempotency_keys_expire ON idempotency_keys (expire_at)"
+]
+
+UNFINISHED = ("QUEUED", "RUNNING")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+class SqliteService(StorageService):
+    """
+    The embedded backend of StorageService (STORAGE_BACKEND=sqlite) for
+    single-node and on-prem installs: one SQLite file in WAL mode, so
+    readers never wait for the writer and a page view costs microseconds
+    instead of a Firestore round trip. Every user action is one
+    BEGIN IMMEDIATE transaction, which also keeps the dashboard counters
+    exact. Connections are pooled and shared by request and job threads.
+    """
+
+    # Activity entries compacted per transaction
+    ROLLUP_CHUNK = 1000
+
+    def __init__(self, path, activity_ttl_days=30, rollup_ttl_days=365, idempotency_ttl_hours=24,
+                 pool_size=8, busy_timeout=10.0):
+        super().__init__()
+        self.path = path
+        self.activity_ttl_days = activity_ttl_days
+        self.rollup_ttl_days = rollup_ttl_days
+        self.idempotency_ttl_hours = idempotency_ttl_hours
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._put_sql = {
+            table: "INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                table, ", ".join(["id", *columns, "data"]), ", ".join("?" * (len(columns) + 2)))
+            for table, columns in TABLES.items()
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._create_schema()
+
+    # ---------------- CONNECTIONS ----------------
+
+    def _create_schema(self):
+        statements = [
+            "CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, {}data TEXT NOT NULL)".format(
+                table, "".join(f"{name} {kind}, " for name, kind in columns.items()))
+            for table, columns in TABLES.items()
+        ]
+        with self._connection() as conn:
+            conn.executescript(";\n".join(statements + INDEXES) + ";")
+
+    def _connect(self):
+        # Autocommit mode: transactions are explicit (see _write)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints; a power loss can only drop the last commits, never corrupt the file
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._pool_lock:
+                if len(self._pool) < self.pool_size:
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def _write(self):
+        """One write transaction; the write lock is taken up front so read-modify-writes never conflict."""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---------------- DOCUMENTS ----------------
+
+    def _get(self, conn, table, doc_id):
+        row = conn.execute(f"SELECT data FROM {table} WHERE id = ?", (doc_id,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def _put(self, conn, table, doc_id, data):
+        conn.execute(self._put_sql[table], (doc_id, *_columns(table, doc_id, data), _dumps(data)))
+
+    def _patch(self, conn, table, doc_id, fields):
+        """Firestore-style update: the document must exist; dotted paths set nested fields."""
+        data = self._get(conn, table, doc_id)
+        if data is None:
+            raise KeyError(f"{table}/{doc_id} does not exist")
+        self._put(conn, table, doc_id, _apply_field_paths(data, fields))
+        return data
+
+    def _increment(self, conn, table, doc_id, field, n, fields=None):
+        data = self._get(conn, table, doc_id)
+        if data is None:
+            raise KeyError(f"{table}/{doc_id} does not exist")
+        data[field] = data.get(field, 0) + n
+        data.update(fields or {})
+        self._put(conn, table, doc_id, data)
+
+    def _delete(self, conn, table, doc_id):
+        return conn.execute(f"DELETE FROM {table} WHERE id = ?", (doc_id,)).rowcount
+
+    def _rows(self, sql, params=()):
+        """[(id, document)] for a SELECT id, data query."""
+        with self._connection() as conn:
+            return [(row[0], _loads(row[1])) for row in conn.execute(sql, params)]
+
+    def _scan(self, table, chunk_size=500):
+        """(id, document) for every row, read chunk_size rows at a time (no connection held between chunks)."""
+        last_id = ""
+        while True:
+            rows = self._rows(f"SELECT id, data FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, chunk_size))
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    # ---------------- BLOG METHODS ----------------
+
+    def get_blog_by_id(self, blog_id):
+        try:
+            # Metadata and body in one query
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT b.data, c.data FROM blogs b LEFT JOIN blog_contents c ON c.id = b.id WHERE b.id = ?",
+                    (blog_id,)
+                ).fetchone()
+            if row is None:
+                return None
+            data = _loads(row[0])
+            data['id'] = blog_id
+            if row[1] is not None:
+                content_doc = _loads(row[1])
+                data['content'] = blog_content.as_content(blog_content.decode(content_doc), content_doc.get('hash'))
+            return data
+        except Exception as e:
+            print(f"❌ Error fetching blog {blog_id}: {e}")
+            return None
+
+    def create_draft(self, blog_data, user_id, activity=None):
+        """
+        Saves blog as DRAFT and increments category count. The blog, the
+        category/dashboard counters and the optional activity entry
+        (dict of user, type, action_text) are committed in one transaction.
+        """
+        try:
+            with self._write() as conn:
+                blog_id, change = self._insert_blog(conn, blog_data, user_id)
+                category_name = blog_data.get('category')
+                created = self._count_category(conn, category_name, 1) if category_name else 0
+                self._bump_stats(conn, total=1, status_deltas={blog_data['status']: 1}, categories=created)
+                if activity:
+                    self._insert_activity(conn, blog_title=blog_data.get('title', 'Untitled'), **activity)
+            self._blog_changed(blog_id, change)
+            return blog_id
+        except Exception as e:
+            print(f"❌ SQLite Error creating draft: {e}")
+            return None
+
+    def _insert_blog(self, conn, blog_data, user_id):
+        """Writes a new blog and its body; returns (blog_id, on_blog_change fields). Counters are the caller's."""
+        now = datetime.utcnow()
+        blog_data['created_at'] = now
+        blog_data['updated_at'] = now
+        blog_data['author_id'] = user_id
+        blog_data['status'] = (blog_data.get('status') or 'DRAFT').upper()
+
+        markdown = blog_content.extract_markdown(blog_data.pop('content', None))
+        content_doc = blog_content.encode(markdown)
+        blog_data['content_hash'] = content_doc['hash']
+
+        blog_id = _new_id()
+        self._put(conn, "blogs", blog_id, blog_data)
+        self._put(conn, "blog_contents", blog_id, content_doc)
+        return blog_id, dict(_change_fields(blog_data), body=markdown)
+
+    def update_blog_status(self, blog_id, status, extra_fields=None, activity=None):
+        """
+        Changes a blog's status and moves it between the dashboard counters
+        in the same transaction. extra_fields are written along with it, and
+        so is the optional activity entry (dict of user, type, action_text).
+        A "content.body" key in extra_fields rewrites the blog's body.
+        Returns the updated blog document, or None if the update failed.
+        """
+        new_status = status.upper()
+        try:
+            with self._write() as conn:
+                blog = self._get(conn, "blogs", blog_id)
+                if blog is None:
+                    return None
+
+                old_status = (blog.get('status') or '').upper()
+                update_data = dict(extra_fields or {})
+                update_data.update({
+                    'status': new_status,
+                    'updated_at': datetime.utcnow()
+                })
+                new_body = update_data.pop('content.body', None)
+                if new_body is not None:
+                    content_doc = blog_content.encode(new_body)
+                    self._put(conn, "blog_contents", blog_id, content_doc)
+                    update_data['content_hash'] = content_doc['hash']
+                updated = _apply_field_paths(blog, update_data)
+                self._put(conn, "blogs", blog_id, updated)
+
+                # Written even without a status move: the version bump tells the
+                # list pages (ETag) that updated_at/ordering changed
+                status_deltas = {old_status: -1, new_status: 1} if old_status != new_status else None
+                self._bump_stats(conn, status_deltas=status_deltas)
+                if activity:
+                    self._insert_activity(conn, blog_title=blog.get('title', 'Untitled'), **activity)
+
+            updated['id'] = blog_id
+            fields = _change_fields(updated)
+            if new_body is not None:
+                updated['content'] = blog_content.as_content(new_body, update_data['content_hash'])
+                fields['body'] = new_body
+            self._blog_changed(blog_id, fields)
+            return updated
+        except Exception as e:
+            print(f"❌ Error updating status: {e}")
+            return None
+
+    def get_blogs_by_status(self, status, full=False):
+        """Blogs with a status as summaries (SUMMARY_FIELDS) unless full=True."""
+        try:
+            rows = self._rows("SELECT id, data FROM blogs WHERE status = ?", (status.upper(),))
+            return [dict(data if full else _project(data, self.SUMMARY_FIELDS), id=blog_id) for blog_id, data in rows]
+        except Exception as e:
+            print(f"❌ Error fetching blogs by status {status}: {e}")
+            return []
+
+    def get_total_blogs_count(self):
+        """Returns total number of blogs."""
+        try:
+            with self._connection() as conn:
+                return conn.execute("SELECT COUNT(*) FROM blogs").fetchone()[0]
+        except Exception as e:
+            print(f"❌ Error getting total blogs count: {e}")
+            return 0
+
+    def get_blogs_page(self, status, page_size=10, page_token=None):
+        """
+        Keyset pagination over blogs with a status, newest first, ordered by
+        (updated_at, id) on the blogs_status_updated index. page_token is the
+        opaque cursor from a previous call. Returns (blogs, next_token,
+        prev_token); tokens are None at the ends. Blogs are projected to
+        SUMMARY_FIELDS; full documents come from get_blog_by_id.
+        """
+        try:
+            cursor = self._decode_page_token(page_token)
+            params = [status.upper()]
+            # Fetch one extra blog to know whether another page exists
+            if cursor is None:
+                sql = "SELECT id, data FROM blogs WHERE status = ? ORDER BY updated_at DESC, id DESC LIMIT ?"
+            else:
+                params += [_micros(cursor['values']['updated_at']), cursor['values']['__name__']]
+                if cursor['d'] == 'next':
+                    sql = ("SELECT id, data FROM blogs WHERE status = ? AND (updated_at, id) < (?, ?) "
+                           "ORDER BY updated_at DESC, id DESC LIMIT ?")
+                else:
+                    sql = ("SELECT id, data FROM blogs WHERE status = ? AND (updated_at, id) > (?, ?) "
+                           "ORDER BY updated_at ASC, id ASC LIMIT ?")
+            rows = self._rows(sql, params + [page_size + 1])
+            if cursor is not None and cursor['d'] == 'prev':
+                rows.reverse()
+
+            blogs = [dict(_project(data, self.SUMMARY_FIELDS), id=blog_id) for blog_id, data in rows]
+            return self._page_result(blogs, cursor, page_size)
+        except Exception as e:
+            print(f"❌ Error fetching {status} page: {e}")
+            return [], None, None
+
+    def delete_blog(self, blog_id, activity=None):
+        """
+        Deletes a blog and returns the deleted document (None if nothing was deleted).
+        The optional activity entry is written in the same transaction.
+        """
+        try:
+            with self._write() as conn:
+                blog_data = self._get(conn, "blogs", blog_id)
+                if blog_data is None:
+                    return None
+
+                category_name = blog_data.get("category")
+                category = self._category_by_name(conn, category_name) if category_name else None
+                if category:
+                    self._increment(conn, "categories", category[0], "count", -1)
+
+                self._delete(conn, "blogs", blog_id)
+                self._delete(conn, "blog_contents", blog_id)
+                self._bump_stats(conn, total=-1, status_deltas={(blog_data.get("status") or "").upper(): -1})
+                if activity:
+                    self._insert_activity(conn, blog_title=blog_data.get('title', 'Untitled'), **activity)
+
+            blog_data['id'] = blog_id
+            self._blog_changed(blog_id, None)
+            return blog_data
+        except Exception as e:
+            print(f"❌ Error deleting blog: {e}")
+            return None
+
+    # ---------------- BULK METHODS ----------------
+
+    def bulk_update_status(self, blog_ids, status, activity=None):
+        """
+        Moves many blogs to status in one transaction, with the dashboard
+        counters and one summary activity entry.
+        Returns {"succeeded": [ids], "failed": [ids]}.
+        """
+        new_status = status.upper()
+        try:
+            now = datetime.utcnow()
+            changes = {}
+            status_deltas = {}
+            with self._write() as conn:
+                for blog_id in dict.fromkeys(blog_ids):
+                    blog = self._get(conn, "blogs", blog_id)
+                    if blog is None:
+                        continue
+                    old_status = (blog.get('status') or '').upper()
+                    if old_status != new_status:
+                        status_deltas[old_status] = status_deltas.get(old_status, 0) - 1
+                        status_deltas[new_status] = status_deltas.get(new_status, 0) + 1
+                    blog.update({'status': new_status, 'updated_at': now})
+                    self._put(conn, "blogs", blog_id, blog)
+                    changes[blog_id] = _change_fields(blog)
+
+                if changes:
+                    self._bump_stats(conn, status_deltas=status_deltas)
+                    if activity:
+                        self._insert_activity(conn, blog_title=_blogs_title(len(changes)), **activity)
+
+            for blog_id, fields in changes.items():
+                self._blog_changed(blog_id, fields)
+            return _bulk_result(blog_ids, changes)
+        except Exception as e:
+            print(f"❌ Error in bulk status update: {e}")
+            return _bulk_result(blog_ids, set())
+
+    def bulk_delete(self, blog_ids, activity=None):
+        """
+        Deletes many blogs in one transaction. Category counts are
+        decremented once per category, and the counters and one summary
+        activity entry are written with them.
+        Returns {"succeeded": [ids], "failed": [ids]}.
+        """
+        try:
+            deleted = set()
+            status_deltas = {}
+            by_category = {}
+            with self._write() as conn:
+                for blog_id in dict.fromkeys(blog_ids):
+                    blog = self._get(conn, "blogs", blog_id)
+                    if blog is None:
+                        continue
+                    self._delete(conn, "blogs", blog_id)
+                    self._delete(conn, "blog_contents", blog_id)
+                    deleted.add(blog_id)
+                    status = (blog.get('status') or '').upper()
+                    status_deltas[status] = status_deltas.get(status, 0) - 1
+                    if blog.get('category'):
+                        by_category[blog['category']] = by_category.get(blog['category'], 0) + 1
+
+                for category_name, n in by_category.items():
+                    category = self._category_by_name(conn, category_name)
+                    if category:
+                        self._increment(conn, "categories", category[0], "count", -n)
+                if deleted:
+                    self._bump_stats(conn, total=-len(deleted), status_deltas=status_deltas)
+                    if activity:
+                        self._insert_activity(conn, blog_title=_blogs_title(len(deleted)), **activity)
+
+            for blog_id in deleted:
+                self._blog_changed(blog_id, None)
+            return _bulk_result(blog_ids, deleted)
+        except Exception as e:
+            print(f"❌ Error in bulk delete: {e}")
+            return _bulk_result(blog_ids, set())
+
+    def iter_blog_documents(self, chunk_size=100, updated_since=None):
+        """
+        Yields (blog_id, fields, markdown) for every blog, or for the blogs
+        updated after updated_since. fields are title, category,
+        category_source, status and updated_at; rows are read chunk_size at a time.
+        """
+        since = _micros(updated_since) if updated_since is not None else -1
+        last_id = ""
+        while True:
+            with self._connection() as conn:
+                rows = conn.execute(
+                    "SELECT b.id, b.data, c.data FROM blogs b LEFT JOIN blog_contents c ON c.id = b.id "
+                    "WHERE b.id > ? AND b.updated_at > ? ORDER BY b.id LIMIT ?",
+                    (last_id, since, chunk_size)
+                ).fetchall()
+            for blog_id, data, content in rows:
+                body = blog_content.decode(_loads(content)) if content is not None else ""
+                yield blog_id, _change_fields(_loads(data)), body
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def iter_blog_ids(self):
+        """Ids of every blog."""
+        with self._connection() as conn:
+            blog_ids = [row[0] for row in conn.execute("SELECT id FROM blogs")]
+        yield from blog_ids
+
+    def migrate_content(self, batch_size=200):
+        """Bodies are always stored apart here (import_documents splits inline content): nothing to migrate."""
+        return 0
+
+    # ---------------- CATEGORY METHODS ----------------
+
+    def get_all_categories(self):
+        try:
+            return [dict(data, id=cat_id) for cat_id, data in self._rows("SELECT id, data FROM categories")]
+        except Exception as e:
+            print(f"❌ Error fetching categories: {e}")
+            return []
+
+    def get_category(self, category_id):
+        try:
+            with self._connection() as conn:
+                data = self._get(conn, "categories", category_id)
+            return dict(data, id=category_id) if data is not None else None
+        except Exception as e:
+            print(f"❌ Error fetching category {category_id}: {e}")
+            return None
+
+    def _category_by_name(self, conn, name):
+        row = conn.execute("SELECT id, data FROM categories WHERE name = ? LIMIT 1", (name,)).fetchone()
+        return (row[0], _loads(row[1])) if row else None
+
+    def _count_category(self, conn, category_name, increment_by):
+        """Adds increment_by to a category's count, creating it if needed. Returns 1 if it was created."""
+        category = self._category_by_name(conn, category_name)
+        if category:
+            self._increment(conn, "categories", category[0], "count", increment_by)
+            return 0
+        self._put(conn, "categories", _new_id(), {
+            "name": category_name,
+            "count": max(increment_by, 0),
+            "created_at": datetime.utcnow()
+        })
+        return 1
+
+    def update_category_count(self, category_name, increment_by):
+        try:
+            with self._write() as conn:
+                if self._count_category(conn, category_name, increment_by):
+                    self._bump_stats(conn, categories=1)
+        except Exception as e:
+            print(f"❌ Error updating category count: {e}")
+
+    def delete_category(self, category_id):
+        try:
+            with self._write() as conn:
+                if self._delete(conn, "categories", category_id):
+                    self._bump_stats(conn, categories=-1)
+            return True
+        except Exception as e:
+            print(f"❌ Error deleting category: {e}")
+            return False
+
+    def update_category(self, category_id, update_data):
+        try:
+            with self._write() as conn:
+                self._patch(conn, "categories", category_id, update_data)
+                # Renames change the categories page: bump the stats version it is cached on
+                self._bump_stats(conn)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating category: {e}")
+            return False
+
+    # ---------------- DASHBOARD STATS METHODS ----------------
+
+    def _bump_stats(self, conn, total=0, status_deltas=None, categories=0):
+        """Applies counter deltas to the stats row and bumps its version (inside the caller's transaction)."""
+        data = self._get(conn, "stats", "dashboard") or {}
+        data["total_blogs"] = data.get("total_blogs", 0) + total
+        data["categories"] = data.get("categories", 0) + categories
+        by_status = data.setdefault("by_status", {})
+        for s, n in (status_deltas or {}).items():
+            if s and n:
+                by_status[s] = by_status.get(s, 0) + n
+        data["version"] = data.get("version", 0) + 1
+        data["updated_at"] = datetime.utcnow()
+        self._put(conn, "stats", "dashboard", data)
+
+    def bump_stats(self, total=0, status_deltas=None, categories=0):
+        try:
+            with self._write() as conn:
+                self._bump_stats(conn, total, status_deltas, categories)
+        except Exception as e:
+            print(f"❌ Error updating dashboard stats: {e}")
+
+    def get_dashboard_stats(self):
+        """Single row read with every dashboard counter."""
+        try:
+            with self._connection() as conn:
+                data = self._get(conn, "stats", "dashboard")
+            if data is None:
+                # First run: build the counters with COUNT queries
+                return self.reconcile_stats()["stats"]
+            return self._format_stats(data)
+        except Exception as e:
+            print(f"❌ Error fetching dashboard stats: {e}")
+            return self._format_stats({})
+
+    def reconcile_stats(self):
+        """
+        Recomputes every counter with COUNT queries, overwrites the stats row
+        and returns {"stats": ..., "drift": {field: (stored, actual)}}.
+        """
+        with self._write() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM blogs GROUP BY status").fetchall())
+            actual = {
+                "total_blogs": conn.execute("SELECT COUNT(*) FROM blogs").fetchone()[0],
+                "categories": conn.execute("SELECT COUNT(*) FROM categories").fetchone()[0],
+                "by_status": {s: counts.get(s, 0) for s in self.STATUSES}
+            }
+            stored = self._get(conn, "stats", "dashboard") or {}
+            drift = self._stats_drift(stored, actual)
+
+            actual["version"] = stored.get("version", 0) + 1
+            now = datetime.utcnow()
+            self._put(conn, "stats", "dashboard", {**actual, "updated_at": now, "reconciled_at": now})
+        return {"stats": self._format_stats(actual), "drift": drift}
+
+    # ---------------- ACTIVITY METHODS ----------------
+
+    def _insert_activity(self, conn, user, type, action_text, blog_title):
+        now = datetime.utcnow()
+        self._put(conn, "activities", _new_id(), {
+            "user": user,
+            "type": type,
+            "action_text": action_text,
+            "blog_title": blog_title,
+            "timestamp": now,
+            "created_at": now,
+            "expire_at": now + timedelta(days=self.activity_ttl_days)
+        })
+
+    def log_activity(self, user, type, action_text, blog_title):
+        try:
+            with self._write() as conn:
+                self._insert_activity(conn, user, type, action_text, blog_title)
+            return True
+        except Exception as e:
+            print(f"❌ Error logging activity: {e}")
+            return False
+
+    def get_recent_activity(self, limit=10, since=None):
+        """
+        Newest activity entries first. since is the cursor returned by a
+        previous call: only entries logged after it are fetched. Timestamps
+        are returned as ISO-8601 UTC strings. Returns (activities, cursor).
+        """
+        try:
+            cursor = self._decode_token(since)
+            if cursor:
+                rows = self._rows(
+                    "SELECT id, data FROM activities WHERE (timestamp, id) > (?, ?) "
+                    "ORDER BY timestamp DESC, id DESC LIMIT ?",
+                    (_micros(datetime.fromisoformat(cursor["t"])), cursor["id"], limit)
+                )
+            else:
+                rows = self._rows("SELECT id, data FROM activities ORDER BY timestamp DESC, id DESC LIMIT ?", (limit,))
+
+            activities = []
+            for activity_id, data in rows:
+                data['id'] = activity_id
+                data['timestamp'] = _iso_utc(data.get('timestamp'))
+                data.pop('created_at', None)
+                data.pop('expire_at', None)
+                activities.append(data)
+
+            if activities and activities[0]['timestamp']:
+                newest = activities[0]
+                since = self._encode_token({"t": newest['timestamp'].rstrip('Z'), "id": newest['id']})
+            return activities, since
+        except Exception as e:
+            print(f"❌ Error fetching activities: {e}")
+            return [], since
+
+    def compact_activity(self, older_than_days=7, max_entries_per_day=2000):
+        """
+        Maintenance job: folds activity entries older than older_than_days
+        into one activity_rollups row per day (counts per type + compact
+        entries) and deletes the originals. There is no TTL policy here, so
+        expired rollups and idempotency keys are deleted too.
+        Returns the number of entries compacted.
+        """
+        cutoff = _micros(datetime.utcnow() - timedelta(days=older_than_days))
+        compacted = 0
+
+        while True:
+            with self._write() as conn:
+                rows = [(row[0], _loads(row[1])) for row in conn.execute(
+                    "SELECT id, data FROM activities WHERE timestamp < ? ORDER BY timestamp LIMIT ?",
+                    (cutoff, self.ROLLUP_CHUNK)
+                )]
+                if not rows:
+                    break
+
+                by_day = {}
+                for _, data in rows:
+                    by_day.setdefault(data['timestamp'].strftime("%Y-%m-%d"), []).append(data)
+
+                for day, entries in by_day.items():
+                    rollup = self._get(conn, "activity_rollups", day) or {"day": day, "total": 0, "counts": {}}
+                    room = max_entries_per_day - rollup["total"]
+                    for entry in entries:
+                        entry_type = entry.get('type', 'other')
+                        rollup["counts"][entry_type] = rollup["counts"].get(entry_type, 0) + 1
+                    rollup["total"] += len(entries)
+                    rollup["expire_at"] = datetime.strptime(day, "%Y-%m-%d") + timedelta(days=self.rollup_ttl_days)
+                    if room > 0:
+                        rollup.setdefault("entries", []).extend({
+                            "user": e.get('user'),
+                            "type": e.get('type'),
+                            "action_text": e.get('action_text'),
+                            "blog_title": e.get('blog_title'),
+                            "timestamp": e.get('timestamp')
+                        } for e in entries[:room])
+                    self._put(conn, "activity_rollups", day, rollup)
+
+                conn.executemany("DELETE FROM activities WHERE id = ?", [(activity_id,) for activity_id, _ in rows])
+            compacted += len(rows)
+
+        now = _micros(datetime.utcnow())
+        with self._write() as conn:
+            conn.execute("DELETE FROM activity_rollups WHERE expire_at < ?", (now,))
+            conn.execute("DELETE FROM idempotency_keys WHERE expire_at < ?", (now,))
+        return compacted
+
+    # ---------------- USER METHODS ----------------
+
+    def save_user(self, user_data):
+        try:
+            user_id = user_data.get('uid')
+            with self._write() as conn:
+                user = self._get(conn, "users", user_id) or {}
+                user.update({
+                    "name": user_data.get('name'),
+                    "email": user_data.get('email'),
+                    "profile_pic": user_data.get('picture'),
+                    "last_login": datetime.utcnow()
+                })
+                self._put(conn, "users", user_id, user)
+            return True
+        except Exception as e:
+            print(f"❌ Error saving user: {e}")
+            return False
+
+    # ---------------- JOB METHODS ----------------
+
+    def _queued_job(self, job_data):
+        now = datetime.utcnow()
+        job_data.update({
+            "status": "QUEUED",
+            "stage": "QUEUED",
+            "progress": 0,
+            "blog_id": None,
+            "error": None,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        return job_data
+
+    def create_job(self, job_data):
+        """Stores a new generation job in QUEUED state and returns its id."""
+        try:
+            job_id = _new_id()
+            with self._write() as conn:
+                self._put(conn, "jobs", job_id, self._queued_job(job_data))
+            return job_id
+        except Exception as e:
+            print(f"❌ Error creating job: {e}")
+            return None
+
+    def get_job(self, job_id):
+        try:
+            with self._connection() as conn:
+                data = self._get(conn, "jobs", job_id)
+            return dict(data, id=job_id) if data is not None else None
+        except Exception as e:
+            print(f"❌ Error fetching job {job_id}: {e}")
+            return None
+
+    def update_job(self, job_id, update_data):
+        try:
+            update_data['updated_at'] = datetime.utcnow()
+            with self._write() as conn:
+                self._patch(conn, "jobs", job_id, update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating job {job_id}: {e}")
+            return False
+
+    def get_unfinished_jobs(self):
+        """Returns jobs that are still QUEUED or RUNNING (e.g. after a restart)."""
+        try:
+            rows = self._rows("SELECT id, data FROM jobs WHERE status IN (?, ?)", UNFINISHED)
+            return [dict(data, id=job_id) for job_id, data in rows]
+        except Exception as e:
+            print(f"❌ Error fetching unfinished jobs: {e}")
+            return []
+
+    def claim_job(self, job_id, worker_id, lease_seconds):
+        """
+        Atomically marks a job RUNNING for this worker.
+        Fails if another worker holds a lease that has not expired yet.
+        """
+        return self._claim_lease("jobs", job_id, worker_id, lease_seconds)
+
+    def _claim_lease(self, table, doc_id, worker_id, lease_seconds):
+        try:
+            with self._write() as conn:
+                data = self._get(conn, table, doc_id)
+                if data is None:
+                    return False
+
+                now = datetime.utcnow()
+                lease = data.get('lease_expires_at')
+                if data.get('status') == 'RUNNING' and lease and lease.replace(tzinfo=None) > now:
+                    return False
+                if data.get('status') not in UNFINISHED:
+                    return False
+
+                data.update({
+                    "status": "RUNNING",
+                    "worker_id": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                    "attempts": data.get("attempts", 0) + 1,
+                    "updated_at": now
+                })
+                self._put(conn, table, doc_id, data)
+                return True
+        except Exception as e:
+            print(f"❌ Error claiming {table}/{doc_id}: {e}")
+            return False
+
+    # ---------------- IDEMPOTENCY METHODS ----------------
+
+    def create_job_once(self, job_data, user_id, key, request_hash):
+        """
+        create_job for a request carrying an Idempotency-Key: the job and the
+        (user_id, key) record pointing at it are written in one transaction,
+        unless the key was used before and has not expired.
+        Returns (record, created): created is False for a repeat (nothing is
+        written and record is the original one); record is None on errors.
+        """
+        doc_id = hashlib.sha256(f"{user_id}\x1f{key}".encode("utf-8")).hexdigest()
+        job_id = _new_id()
+        now = datetime.utcnow()
+        record = {
+            "user_id": user_id,
+            "request_hash": request_hash,
+            "job_id": job_id,
+            "created_at": now,
+            "expire_at": now + timedelta(hours=self.idempotency_ttl_hours)
+        }
+        try:
+            with self._write() as conn:
+                existing = self._get(conn, "idempotency_keys", doc_id)
+                if existing and existing['expire_at'].replace(tzinfo=None) > now:
+                    return existing, False
+                self._put(conn, "jobs", job_id, self._queued_job(job_data))
+                self._put(conn, "idempotency_keys", doc_id, record)
+            return record, True
+        except Exception as e:
+            print(f"❌ Error creating job for idempotency key: {e}")
+            return None, False
+
+    # ---------------- BATCH METHODS ----------------
+
+    def create_batch(self, batch_data, items):
+        """Stores a QUEUED batch and its items (dicts of prompt, auto_submit), numbered 0000... Returns the batch id."""
+        try:
+            batch_id = _new_id()
+            now = datetime.utcnow()
+            batch_data.update({
+                "status": "QUEUED",
+                "total": len(items),
+                "saved": 0,
+                "failed": 0,
+                "worker_id": None,
+                "lease_expires_at": None,
+                "created_at": now,
+                "updated_at": now
+            })
+            with self._write() as conn:
+                self._put(conn, "batches", batch_id, batch_data)
+                for index, item in enumerate(items):
+                    self._put(conn, "batch_items", _item_key(batch_id, f"{index:04d}"), {
+                        "index": index,
+                        "prompt": item['prompt'],
+                        "auto_submit": bool(item.get('auto_submit')),
+                        "status": "PENDING",
+                        "stage": None,
+                        "blog_id": None,
+                        "category": None,
+                        "error": None
+                    })
+            return batch_id
+        except Exception as e:
+            print(f"❌ Error creating batch: {e}")
+            return None
+
+    def get_batch(self, batch_id, with_items=False):
+        try:
+            with self._connection() as conn:
+                data = self._get(conn, "batches", batch_id)
+            if data is None:
+                return None
+            data['id'] = batch_id
+            if with_items:
+                data['items'] = self.get_batch_items(batch_id)
+            return data
+        except Exception as e:
+            print(f"❌ Error fetching batch {batch_id}: {e}")
+            return None
+
+    def get_batch_items(self, batch_id, statuses=None):
+        """Items of a batch in submission order, optionally only those in statuses."""
+        try:
+            sql = "SELECT id, data FROM batch_items WHERE batch_id = ?"
+            params = [batch_id]
+            if statuses:
+                sql += " AND status IN ({})".format(", ".join("?" * len(statuses)))
+                params += list(statuses)
+            rows = self._rows(sql + " ORDER BY idx", params)
+            return [dict(data, id=key.split("/", 1)[1]) for key, data in rows]
+        except Exception as e:
+            print(f"❌ Error fetching items of batch {batch_id}: {e}")
+            return []
+
+    def update_batch(self, batch_id, update_data):
+        try:
+            update_data['updated_at'] = datetime.utcnow()
+            with self._write() as conn:
+                self._patch(conn, "batches", batch_id, update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating batch {batch_id}: {e}")
+            return False
+
+    def update_batch_item(self, batch_id, item_id, update_data):
+        try:
+            with self._write() as conn:
+                self._patch(conn, "batch_items", _item_key(batch_id, item_id), update_data)
+            return True
+        except Exception as e:
+            print(f"❌ Error updating item {item_id} of batch {batch_id}: {e}")
+            return False
+
+    def fail_batch_item(self, batch_id, item_id, error):
+        """Marks one item FAILED and counts it on the batch, in one transaction."""
+        try:
+            with self._write() as conn:
+                self._patch(conn, "batch_items", _item_key(batch_id, item_id), {"status": "FAILED", "error": error})
+                self._increment(conn, "batches", batch_id, "failed", 1, {"updated_at": datetime.utcnow()})
+            return True
+        except Exception as e:
+            print(f"❌ Error failing item {item_id} of batch {batch_id}: {e}")
+            return False
+
+    def save_batch_drafts(self, batch_id, results, user_id, activity=None):
+        """
+        Creates the drafts of several finished batch items in one
+        transaction: blogs, bodies, category counts, dashboard counters,
+        item statuses and one summary activity entry. results is a list of
+        (item_id, prepared blog_data). Returns {item_id: blog_id}, or None
+        if the transaction failed.
+        """
+        if not results:
+            return {}
+        try:
+            blog_ids = {}
+            changes = []
+            status_deltas = {}
+            by_category = {}
+            with self._write() as conn:
+                for item_id, blog_data in results:
+                    blog_id, change = self._insert_blog(conn, blog_data, user_id)
+                    blog_ids[item_id] = blog_id
+                    changes.append((blog_id, change))
+                    status_deltas[blog_data['status']] = status_deltas.get(blog_data['status'], 0) + 1
+                    category_name = blog_data.get('category')
+                    if category_name:
+                        by_category[category_name] = by_category.get(category_name, 0) + 1
+                    self._patch(conn, "batch_items", _item_key(batch_id, item_id), {
+                        "status": "SAVED",
+                        "stage": "COMPLETED",
+                        "blog_id": blog_id,
+                        "category": category_name,
+                        "error": None
+                    })
+
+                created = sum(self._count_category(conn, name, n) for name, n in by_category.items())
+                self._bump_stats(conn, total=len(results), status_deltas=status_deltas, categories=created)
+                self._increment(conn, "batches", batch_id, "saved", len(results), {"updated_at": datetime.utcnow()})
+                if activity:
+                    self._insert_activity(conn, blog_title=_blogs_title(len(results)), **activity)
+
+            for blog_id, change in changes:
+                self._blog_changed(blog_id, change)
+            return blog_ids
+        except Exception as e:
+            print(f"❌ Error saving drafts of batch {batch_id}: {e}")
+            return None
+
+    def reset_failed_batch_items(self, batch_id):
+        """Puts FAILED items back to PENDING and re-queues the batch. Returns how many were reset."""
+        items = self.get_batch_items(batch_id, statuses=["FAILED"])
+        if not items:
+            return 0
+        try:
+            with self._write() as conn:
+                for item in items:
+                    self._patch(conn, "batch_items", _item_key(batch_id, item['id']),
+                                {"status": "PENDING", "stage": None, "error": None})
+                self._increment(conn, "batches", batch_id, "failed", -len(items), {
+                    "status": "QUEUED",
+                    "lease_expires_at": None,
+                    "updated_at": datetime.utcnow()
+                })
+            return len(items)
+        except Exception as e:
+            print(f"❌ Error resetting items of batch {batch_id}: {e}")
+            return 0
+
+    def get_unfinished_batches(self):
+        try:
+            rows = self._rows("SELECT id, data FROM batches WHERE status IN (?, ?)", UNFINISHED)
+            return [dict(data, id=batch_id) for batch_id, data in rows]
+        except Exception as e:
+            print(f"❌ Error fetching unfinished batches: {e}")
+            return []
+
+    def claim_batch(self, batch_id, worker_id, lease_seconds):
+        """Same lease protocol as claim_job, for a whole batch."""
+        return self._claim_lease("batches", batch_id, worker_id, lease_seconds)
+
+    # ---------------- MIGRATION METHODS ----------------
+
+    def export_documents(self):
+        """Every row of every table, in Firestore's layout (items as batches/<id>/items)."""
+        for collection in self.COLLECTIONS:
+            for doc_id, data in self._scan(collection):
+                yield collection, doc_id, data
+        for key, data in self._scan("batch_items"):
+            batch_id, item_id = key.split("/", 1)
+            yield f"batches/{batch_id}/items", item_id, data
+
+    def import_documents(self, documents, batch_size=400):
+        """
+        Overwrites rows with the same id, batch_size documents per
+        transaction. Inline content of blogs not migrated yet is moved to
+        blog_contents on the way. Unknown collections are skipped.
+        """
+        written = 0
+        chunk = []
+        for document in documents:
+            chunk.append(document)
+            if len(chunk) == batch_size:
+                written += self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            written += self._import_chunk(chunk)
+        return written
+
+    def _import_chunk(self, documents):
+        written = 0
+        with self._write() as conn:
+            for collection, doc_id, data in documents:
+                parts = collection.split("/")
+                if len(parts) == 3 and parts[0] == "batches" and parts[2] == "items":
+                    self._put(conn, "batch_items", _item_key(parts[1], doc_id), data)
+                elif collection in self.COLLECTIONS:
+                    if collection == "blogs" and 'content' in data:
+                        content_doc = blog_content.encode(blog_content.extract_markdown(data.pop('content')))
+                        data['content_hash'] = content_doc['hash']
+                        self._put(conn, "blog_contents", doc_id, content_doc)
+                    self._put(conn, collection, doc_id, data)
+                else:
+                    print(f"⚠️ Skipping {collection}/{doc_id}: no table for this collection")
+                    continue
+                written += 1
+        return written
+
+
+# ---------------- HELPERS ----------------
+
+def _new_id():
+    """20-character random id, like Firestore's auto ids."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+
+def _item_key(batch_id, item_id):
+    return f"{batch_id}/{item_id}"
+
+
+def _blogs_title(count):
+    return f"{count} blog{'s' if count != 1 else ''}"
+
+
+def _project(data, fields):
+    return {field: data[field] for field in fields if field in data}
+
+
+def _utc(value):
+    """Naive datetimes are UTC (what datetime.utcnow() returns)."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _micros(value):
+    """Index value of a timestamp: microseconds since the epoch (exact, unlike a float)."""
+    return (_utc(value) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _columns(table, doc_id, data):
+    if table == "batch_items":
+        return doc_id.split("/", 1)[0], data.get("status"), data.get("index")
+    values = []
+    for name in TABLES[table]:
+        value = data.get(name)
+        values.append(_micros(value) if isinstance(value, datetime) else value)
+    return values
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$dt": _utc(value).isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$b": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Cannot store {type(value).__name__} values")
+
+
+def _decode_value(obj):
+    if len(obj) == 1:
+        if "$dt" in obj:
+            return datetime.fromisoformat(obj["$dt"])
+        if "$b" in obj:
+            return base64.b64decode(obj["$b"])
+    return obj
+
+
+def _dumps(data):
+    # Timestamps and bytes (compressed bodies) are tagged; they come back as aware UTC datetimes and bytes
+    return json.dumps(data, default=_encode_value, separators=(",", ":"))
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode_value)
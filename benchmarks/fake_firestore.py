@@ -0,0 +1,626 @@
+import copy
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import cmp_to_key
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1 import transforms
+
+
+class FakeFirestore:
+    """
+    In-memory stand-in for the parts of the google-cloud-firestore Client
+    that FirestoreService uses: documents and subcollections, queries
+    (filters, projections, ordering, cursors, limits, count), write batches,
+    transactions, BulkWriter, get_all, preconditions and field transforms.
+
+    Every RPC sleeps `latency` seconds and is counted, together with the
+    documents it read and wrote, both globally and for the calling thread,
+    so the benchmark can report Firestore work per request. Transactions
+    are serialized with a lock instead of optimistic retries, and
+    on_snapshot is not supported (the benchmark turns the listeners off).
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self._collections = {}  # collection path -> {doc id: _Record}
+        self._lock = threading.Lock()  # Guards the data: every commit applies atomically
+        self._txn_lock = threading.RLock()  # One transaction at a time
+        self._local = threading.local()
+        self._totals = {"rpcs": 0, "reads": 0, "writes": 0}
+        self._totals_lock = threading.Lock()
+        # instrument_firestore wraps the RPCs it finds here; the fake has none to wrap
+        self._firestore_api = SimpleNamespace()
+
+    # ---------------- CLIENT API ----------------
+
+    def collection(self, path):
+        return CollectionReference(self, path)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, **kwargs):
+        return Transaction(self)
+
+    def bulk_writer(self, **kwargs):
+        return BulkWriter(self)
+
+    def write_option(self, **kwargs):
+        return SimpleNamespace(**kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        snaps = [ref._snapshot(field_paths) for ref in references]
+        self._rpc(reads=len(snaps))
+        return iter(snaps)
+
+    # ---------------- COUNTERS ----------------
+
+    def counters(self):
+        """Totals since start: {"rpcs", "reads", "writes"}."""
+        with self._totals_lock:
+            return dict(self._totals)
+
+    def thread_counters(self):
+        """Counters of the calling thread (requests run on one thread in the test client)."""
+        return dict(getattr(self._local, "counters", None) or {"rpcs": 0, "reads": 0, "writes": 0})
+
+    def _count(self, rpcs=0, reads=0, writes=0):
+        local = getattr(self._local, "counters", None)
+        if local is None:
+            local = self._local.counters = {"rpcs": 0, "reads": 0, "writes": 0}
+        for counters in (local, self._totals):
+            counters["rpcs"] += rpcs
+            counters["reads"] += reads
+            counters["writes"] += writes
+
+    def _rpc(self, reads=0, writes=0):
+        with self._totals_lock:
+            self._count(rpcs=1, reads=reads, writes=writes)
+        if self.latency:
+            time.sleep(self.latency)
+
+    # ---------------- STORAGE ----------------
+
+    # Records are never modified in place (a commit stores new ones), so reads share them;
+    # snapshots copy on to_dict()
+    def _record(self, path):
+        collection, doc_id = path.rsplit("/", 1)
+        with self._lock:
+            return self._collections.get(collection, {}).get(doc_id)
+
+    def _records(self, collection):
+        with self._lock:
+            return list(self._collections.get(collection, {}).items())
+
+    def _commit(self, writes):
+        """Applies [(kind, path, data, merge, option)] atomically. Returns one WriteResult per write."""
+        self._rpc(writes=len(writes))
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            staged = {}
+
+            def current(path):
+                if path in staged:
+                    return staged[path]
+                collection, doc_id = path.rsplit("/", 1)
+                return self._collections.get(collection, {}).get(doc_id)
+
+            for kind, path, data, merge, option in writes:
+                record = current(path)
+                last_update_time = getattr(option, "last_update_time", None)
+                if last_update_time is not None and (record is None or record.update_time != last_update_time):
+                    raise google_exceptions.FailedPrecondition(f"Document {path} was modified.")
+
+                if kind == "delete":
+                    staged[path] = None
+                elif kind == "create" and record is not None:
+                    raise google_exceptions.AlreadyExists(f"Document already exists: {path}")
+                elif kind == "update" and record is None:
+                    raise google_exceptions.NotFound(f"No document to update: {path}")
+                else:
+                    old = copy.deepcopy(record.data) if record else {}
+                    if kind == "update":
+                        new = _apply_field_paths(old, data, now)
+                    elif merge:
+                        new = _merge(old, data, now)
+                    else:
+                        new = _merge({}, data, now)
+                    staged[path] = _Record(new, record.create_time if record else now, now)
+
+            for path, record in staged.items():
+                collection, doc_id = path.rsplit("/", 1)
+                if record is None:
+                    self._collections.get(collection, {}).pop(doc_id, None)
+                else:
+                    self._collections.setdefault(collection, {})[doc_id] = record
+        return [SimpleNamespace(update_time=now) for _ in writes]
+
+
+class _Record:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data, create_time, update_time):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+# ---------------- REFERENCES ----------------
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit("/", 1)[1]
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._rpc(reads=1)
+        return self._snapshot(field_paths)
+
+    def _snapshot(self, field_paths=None):
+        record = self._client._record(self.path)
+        if record is None:
+            return DocumentSnapshot(self, None)
+        data = _project(record.data, field_paths) if field_paths is not None else record.data
+        return DocumentSnapshot(self, data, record.create_time, record.update_time)
+
+    def set(self, document_data, merge=False):
+        return self._client._commit([("set", self.path, document_data, merge, None)])[0]
+
+    def create(self, document_data):
+        return self._client._commit([("create", self.path, document_data, False, None)])[0]
+
+    def update(self, field_updates, option=None):
+        return self._client._commit([("update", self.path, field_updates, False, option)])[0]
+
+    def delete(self, option=None):
+        return self._client._commit([("delete", self.path, None, False, option)])[0]
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("FakeFirestore does not support listeners.")
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, create_time=None, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.create_time = create_time
+        self.update_time = update_time
+        self.read_time = datetime.now(timezone.utc)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path):
+        value = self._data
+        for part in field_path.split("."):
+            if not isinstance(value, dict) or part not in value:
+                raise KeyError(f"'{field_path}' is not contained in the data")
+            value = value[part]
+        return copy.deepcopy(value)
+
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, client, path, filters=(), projection=None, orders=(), limit=None,
+                 limit_to_last=False, start=None, end=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._projection = projection
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._limit_to_last = limit_to_last
+        self._start = start  # (cursor, before): start_at / start_after
+        self._end = end  # (cursor, before): end_before / end_at
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, projection=self._projection, orders=self._orders,
+                     limit=self._limit, limit_to_last=self._limit_to_last, start=self._start, end=self._end)
+        state.update(changes)
+        return Query(self._client, self._path, **state)
+
+    # ---------------- BUILDING ----------------
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, _normalize(value)),))
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count, limit_to_last=False)
+
+    def limit_to_last(self, count):
+        return self._copy(limit=count, limit_to_last=True)
+
+    def start_after(self, cursor):
+        return self._copy(start=(cursor, False))
+
+    def start_at(self, cursor):
+        return self._copy(start=(cursor, True))
+
+    def end_before(self, cursor):
+        return self._copy(end=(cursor, False))
+
+    def end_at(self, cursor):
+        return self._copy(end=(cursor, True))
+
+    def count(self, alias=None):
+        return AggregationQuery(self, alias or "count")
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("FakeFirestore does not support listeners.")
+
+    # ---------------- RUNNING ----------------
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def stream(self, transaction=None):
+        docs = self._run()
+        # Firestore bills one read for an empty result
+        self._client._rpc(reads=max(1, len(docs)))
+        return iter(docs)
+
+    def _run(self):
+        orders = self._effective_orders()
+        matches = []  # (sort key, doc id, record)
+        for doc_id, record in self._client._records(self._path):
+            if not all(_matches(record.data, doc_id, f) for f in self._filters):
+                continue
+            key = [doc_id if field == "__name__" else _lookup(record.data, field) for field, _ in orders]
+            if any(value is _MISSING for value in key):
+                continue  # Documents without an ordered field are not in the index
+            matches.append((key, doc_id, record))
+
+        compare = _order_comparator(orders)
+        matches.sort(key=cmp_to_key(lambda a, b: compare(a[0], b[0])))
+
+        if self._start is not None:
+            cursor, inclusive = self._start
+            values = self._cursor_values(cursor, orders)
+            matches = [m for m in matches if compare(m[0][:len(values)], values) > (-1 if inclusive else 0)]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            values = self._cursor_values(cursor, orders)
+            matches = [m for m in matches if compare(m[0][:len(values)], values) < (1 if inclusive else 0)]
+
+        if self._limit is not None:
+            matches = matches[-self._limit:] if self._limit_to_last else matches[:self._limit]
+
+        docs = []
+        for _, doc_id, record in matches:
+            data = _project(record.data, self._projection) if self._projection is not None else record.data
+            ref = DocumentReference(self._client, f"{self._path}/{doc_id}")
+            docs.append(DocumentSnapshot(ref, data, record.create_time, record.update_time))
+        return docs
+
+    def _effective_orders(self):
+        # Like Firestore: an inequality field is ordered first, document name breaks ties
+        orders = list(self._orders)
+        ordered = {field for field, _ in orders}
+        for field, op, _ in self._filters:
+            if op in ("<", "<=", ">", ">=", "!=", "not-in") and field not in ordered:
+                orders.insert(0, (field, Query.ASCENDING))
+                ordered.add(field)
+        if "__name__" not in ordered:
+            orders.append(("__name__", orders[-1][1] if orders else Query.ASCENDING))
+        return orders
+
+    def _cursor_values(self, cursor, orders):
+        if isinstance(cursor, DocumentSnapshot):
+            return [cursor.id if field == "__name__" else _lookup(cursor._data, field) for field, _ in orders]
+        if isinstance(cursor, dict):
+            values = []
+            for field, _ in orders:
+                if field not in cursor:
+                    break
+                value = cursor[field]
+                values.append(value.id if isinstance(value, DocumentReference) else _normalize(value))
+            return values
+        return [_normalize(value) for value in cursor]
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        if "/" not in self._path:
+            return None
+        return DocumentReference(self._client, self._path.rsplit("/", 1)[0])
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, f"{self._path}/{document_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        return ref.create(document_data), ref
+
+
+class AggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None):
+        n = len(self._query._run())
+        self._query._client._rpc(reads=max(1, n // 1000))
+        return [[SimpleNamespace(alias=self._alias, value=n)]]
+
+
+# ---------------- WRITES ----------------
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(("set", reference.path, document_data, merge, None))
+
+    def create(self, reference, document_data):
+        self._writes.append(("create", reference.path, document_data, False, None))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(("update", reference.path, field_updates, False, option))
+
+    def delete(self, reference, option=None):
+        self._writes.append(("delete", reference.path, None, False, option))
+
+    def commit(self, **kwargs):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes) if writes else []
+
+    def __len__(self):
+        return len(self._writes)
+
+
+class Transaction(WriteBatch):
+    """Satisfies firestore.transactional: _begin takes the transaction lock, _commit/_rollback release it."""
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._txn_lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _commit(self):
+        if self._id is None:
+            raise ValueError("Transaction not in progress.")
+        try:
+            return self.commit()
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._writes = []
+        if self._id is not None:
+            self._release()
+
+    def _release(self):
+        self._id = None
+        self._client._txn_lock.release()
+
+
+class BulkWriter(WriteBatch):
+    """Sends its writes one by one on close()/flush(), with the error callback deciding retries."""
+
+    def __init__(self, client):
+        super().__init__(client)
+        self._on_result = None
+        self._on_error = None
+
+    def on_write_result(self, callback):
+        self._on_result = callback
+
+    def on_write_error(self, callback):
+        self._on_error = callback
+
+    def flush(self):
+        writes, self._writes = self._writes, []
+        for write in writes:
+            attempt = 1
+            while True:
+                try:
+                    result = self._client._commit([write])[0]
+                except google_exceptions.GoogleAPICallError as e:
+                    code = e.grpc_status_code.value[0] if e.grpc_status_code else 2
+                    error = SimpleNamespace(code=code, attempts=attempt, message=str(e), operation=write)
+                    if self._on_error and self._on_error(error, self):
+                        attempt += 1
+                        continue
+                    break
+                if self._on_result:
+                    ref = DocumentReference(self._client, write[1])
+                    self._on_result(ref, result, self)
+                break
+
+    def close(self):
+        self.flush()
+
+
+# ---------------- VALUES ----------------
+
+_MISSING = object()
+
+
+def _normalize(value):
+    """Stored like Firestore returns them: timestamps are UTC-aware."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _resolve(value, old, now):
+    """A written value with its transform (Increment, ArrayUnion, SERVER_TIMESTAMP...) applied to old."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, transforms.Increment):
+        base = old if isinstance(old, (int, float)) and not isinstance(old, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(old) if isinstance(old, list) else []
+        result.extend(v for v in _normalize(list(value.values)) if v not in result)
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        removed = _normalize(list(value.values))
+        return [v for v in (old if isinstance(old, list) else []) if v not in removed]
+    if isinstance(value, dict):
+        return _merge({}, value, now)
+    return _normalize(value)
+
+
+def _merge(target, data, now):
+    """set(..., merge=True) semantics: nested maps merge, DELETE_FIELD removes."""
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and value:
+            existing = target.get(key)
+            target[key] = _merge(existing if isinstance(existing, dict) else {}, value, now)
+        else:
+            target[key] = _resolve(value, target.get(key), now)
+    return target
+
+
+def _apply_field_paths(target, data, now):
+    """update() semantics: dotted paths address nested fields, maps replace the field."""
+    for path, value in data.items():
+        parts = path.split(".")
+        node = target
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is transforms.DELETE_FIELD:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = _resolve(value, node.get(parts[-1]), now)
+    return target
+
+
+def _lookup(data, field_path):
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _project(data, field_paths):
+    projected = {}
+    for path in field_paths:
+        value = _lookup(data, path)
+        if value is not _MISSING:
+            projected[path] = copy.deepcopy(value)
+    return projected
+
+
+# Firestore's cross-type ordering
+def _rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, list):
+        return 8
+    return 9
+
+
+def _compare(a, b):
+    ra, rb = _rank(a), _rank(b)
+    if ra != rb:
+        return -1 if ra < rb else 1
+    if isinstance(a, dict):
+        a, b = sorted(a.items()), sorted(b.items())
+    if a == b:
+        return 0
+    try:
+        return -1 if a < b else 1
+    except TypeError:
+        return -1 if repr(a) < repr(b) else 1
+
+
+def _order_comparator(orders):
+    def compare(a, b):
+        for (_, direction), x, y in zip(orders, a, b):
+            result = _compare(x, y)
+            if result:
+                return -result if direction == Query.DESCENDING else result
+        return 0
+    return compare
+
+
+def _matches(data, doc_id, condition):
+    field, op, expected = condition
+    value = doc_id if field == "__name__" else _lookup(data, field)
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return _compare(value, expected) == 0
+    if op == "!=":
+        return _compare(value, expected) != 0 and value is not None
+    if op == "in":
+        return any(_compare(value, e) == 0 for e in expected)
+    if op == "not-in":
+        return all(_compare(value, e) != 0 for e in expected) and value is not None
+    if op == "array-contains":
+        return isinstance(value, list) and expected in value
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(e in value for e in expected)
+    # Range filters only match values of the same type
+    if _rank(value) != _rank(expected):
+        return False
+    result = _compare(value, expected)
+    return {"<": result < 0, "<=": result <= 0, ">": result > 0, ">=": result >= 0}[op]
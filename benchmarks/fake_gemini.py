@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from types import SimpleNamespace
+
+# Vocabulary the fake writes with (deterministic per prompt)
+WORDS = """
+growth strategy team customer product market data cloud platform workflow design content search
+brand launch pricing revenue insight model pipeline automation security privacy budget hiring remote
+culture feedback metric dashboard roadmap release quality testing performance latency cost scale
+""".split()
+
+CATEGORIES = ["Technology", "Marketing", "Business", "Productivity", "Design", "Finance"]
+
+
+class FakeGenerativeModel:
+    """
+    Deterministic stand-in for genai.GenerativeModel. The answer depends
+    only on the prompt (seeded by its hash) and is shaped like what each
+    agent expects: a JSON outline, a category name, or markdown of about
+    the requested length. A call takes latency + tokens / tokens_per_second,
+    and streamed calls pace their chunks the same way. generate_content_async
+    waits with asyncio.sleep, like the SDK's async client.
+    """
+
+    def __init__(self, model_name="fake-gemini", latency=0.3, tokens_per_second=400.0, chunk_words=40):
+        self.model_name = model_name
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.chunk_words = chunk_words
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        text = self._answer(prompt, generation_config)
+        prompt_tokens = _tokens(prompt)
+        if stream:
+            return self._stream(text, prompt_tokens)
+
+        time.sleep(self.latency + _tokens(text) / self.tokens_per_second)
+        return _response(text, prompt_tokens)
+
+    def _stream(self, text, prompt_tokens):
+        time.sleep(self.latency)
+        words = text.split(" ")
+        sent = 0
+        for i in range(0, len(words), self.chunk_words):
+            chunk = " ".join(words[i:i + self.chunk_words]) + (" " if i + self.chunk_words < len(words) else "")
+            time.sleep(_tokens(chunk) / self.tokens_per_second)
+            sent += _tokens(chunk)
+            yield _response(chunk, prompt_tokens, total_tokens=sent)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        text = self._answer(prompt, generation_config)
+        prompt_tokens = _tokens(prompt)
+        if stream:
+            return self._stream_async(text, prompt_tokens)
+
+        await asyncio.sleep(self.latency + _tokens(text) / self.tokens_per_second)
+        return _response(text, prompt_tokens)
+
+    async def _stream_async(self, text, prompt_tokens):
+        await asyncio.sleep(self.latency)
+        words = text.split(" ")
+        sent = 0
+        for i in range(0, len(words), self.chunk_words):
+            chunk = " ".join(words[i:i + self.chunk_words]) + (" " if i + self.chunk_words < len(words) else "")
+            await asyncio.sleep(_tokens(chunk) / self.tokens_per_second)
+            sent += _tokens(chunk)
+            yield _response(chunk, prompt_tokens, total_tokens=sent)
+
+    # ---------------- ANSWERS ----------------
+
+    def _answer(self, prompt, generation_config):
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        max_tokens = (generation_config or {}).get("max_output_tokens")
+
+        if "blog outline" in prompt:
+            sections = ["Introduction"] + [_phrase(rng, 3).title() for _ in range(rng.randint(4, 6))] + ["Conclusion"]
+            # One title per line, as Gemini usually formats it
+            return json.dumps(sections, indent=0)
+        if "Content Taxonomist" in prompt:
+            return rng.choice(CATEGORIES)
+
+        match = re.search(r"approx (\d+) words", prompt)
+        n_words = int(match.group(1)) if match else 400
+        if max_tokens:
+            n_words = min(n_words, max_tokens)
+        paragraphs = []
+        while n_words > 0:
+            size = min(n_words, rng.randint(40, 90))
+            paragraphs.append(_phrase(rng, size).capitalize() + ".")
+            n_words -= size
+        heading = re.search(r"'## ([^']+)'", prompt)
+        if heading:
+            paragraphs.insert(0, f"## {heading.group(1)}")
+        return "\n\n".join(paragraphs)
+
+
+def _phrase(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _tokens(text):
+    # Roughly what Gemini reports for English prose
+    return max(1, int(len(text.split()) * 1.3))
+
+
+def _response(text, prompt_tokens, total_tokens=None):
+    tokens = _tokens(text)
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(token_count=tokens)],
+        usage_metadata=SimpleNamespace(prompt_token_count=prompt_tokens,
+                                       candidates_token_count=total_tokens or tokens)
+    )
@@ -0,0 +1,411 @@
+import contextlib
+import io
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from config import Config
+from app.firebase.firebase_admin import FirebaseLoader
+from benchmarks.fake_firestore import FakeFirestore
+from benchmarks.fake_gemini import FakeGenerativeModel, WORDS, CATEGORIES
+
+TOPICS = [
+    "remote team onboarding", "pricing page experiments", "cloud cost reviews", "customer interview notes",
+    "design system adoption", "quarterly roadmap planning", "search ranking basics", "hiring a first engineer",
+    "data privacy for startups", "automating release notes", "latency budgets for apps", "brand voice guides"
+]
+
+# Weights of each scenario in a traffic mix
+MIXES = {
+    "default": {"dashboard": 25, "drafts": 20, "approval": 15, "edit": 10, "review": 10, "search": 10,
+                "activity": 5, "generate": 5},
+    "read_heavy": {"dashboard": 35, "drafts": 25, "approval": 20, "edit": 10, "search": 10},
+    "write_heavy": {"dashboard": 10, "drafts": 10, "review": 40, "generate": 40},
+    "generate": {"generate": 100}
+}
+
+
+class BenchmarkError(RuntimeError):
+    """Raised when the benchmark environment cannot be set up."""
+
+
+def build_app(options):
+    """
+    create_app() on the in-memory Firestore (or the emulator, or the SQLite
+    backend) with a fake Gemini model. Snapshots and the LLM cache go to a temporary directory,
+    so every run starts from the same state. Returns (app, db).
+    """
+    workdir = tempfile.mkdtemp(prefix="scriptly-bench-")
+
+    class BenchConfig(Config):
+        GEMINI_API_KEY = "benchmark"
+        WARMUP_ON_START = False
+        # The fake has no listeners; these fall back to reads, like a listener-less deployment
+        CATEGORY_INDEX_LISTENER = False
+        BLOG_CACHE_LISTENER = False
+        LLM_CACHE_PATH = os.path.join(workdir, "llm_cache.sqlite3")
+        CATEGORIZER_PATH = os.path.join(workdir, "categorizer.npz")
+        SEARCH_INDEX_PATH = os.path.join(workdir, "search_index.npz")
+        SEARCH_REFRESH_SECONDS = 0
+        # The fake model has no quota; the gateway's concurrency limit still applies
+        LLM_RATE_PER_MINUTE = options.llm_rate
+        LLM_BURST = max(10, options.llm_rate // 60)
+        SECRET_KEY = "benchmark"
+        STORAGE_BACKEND = options.storage
+        SQLITE_PATH = os.path.join(workdir, "scriptly.sqlite3")
+        GENERATION_ASYNC = options.generation == "async"
+
+    if options.storage == "sqlite":
+        # Firebase Admin is still initialized (logins); the fake just stands in for it
+        db = None
+        FirebaseLoader._instance = FakeFirestore()
+    elif options.firestore == "memory":
+        db = FakeFirestore(latency=options.firestore_latency / 1000.0)
+        FirebaseLoader._instance = db
+    else:
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            raise BenchmarkError("--firestore emulator needs FIRESTORE_EMULATOR_HOST (e.g. localhost:8080).")
+        db = None
+
+    model = FakeGenerativeModel(latency=options.llm_latency / 1000.0, tokens_per_second=options.token_rate)
+
+    with quiet(not options.verbose):
+        from app import create_app
+        app = create_app(BenchConfig)
+        from app.registry import ClientRegistry
+        registry = ClientRegistry.get_instance()
+        registry.model = lambda name=None: model
+        if db is None and options.storage == "firestore":
+            db = registry.db
+            _clear_emulator(db)
+
+    if not options.verbose:
+        # Errors are counted per route instead; Flask would print a traceback for each
+        logging.getLogger("scriptly").setLevel(logging.WARNING)
+        app.logger.setLevel(logging.CRITICAL)
+    return app, db
+
+
+def _clear_emulator(db):
+    import requests
+    url = (f"http://{os.environ['FIRESTORE_EMULATOR_HOST']}/emulator/v1/projects/"
+           f"{db.project}/databases/(default)/documents")
+    requests.delete(url, timeout=10)
+
+
+def seed(app, n_blogs, seed_value=1):
+    """
+    Stores n_blogs blogs through FirestoreService (spread over the statuses
+    and CATEGORIES, with generated bodies; categories are created on the
+    way), reconciles the dashboard counters and waits for the categorizer and
+    search index to load them. Returns {status: [blog ids]}.
+    """
+    from app.registry import ClientRegistry
+    from app.ml.categorizer import LocalCategorizer
+    from app.search.index import SearchIndex
+
+    db_service = ClientRegistry.get_instance().db_service
+    rng = random.Random(seed_value)
+    statuses = ["DRAFT"] * 4 + ["UNDER_REVIEW"] * 3 + ["PUBLISHED"] * 2 + ["REJECTED"]
+    ids = {}
+    for i in range(n_blogs):
+        topic = rng.choice(TOPICS)
+        status = rng.choice(statuses)
+        body = "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(60, 120)))
+                           for _ in range(rng.randint(4, 10)))
+        blog = {
+            "title": f"{topic.title()} #{i}",
+            "category": rng.choice(CATEGORIES),
+            "status": status,
+            "content": {"markdown": body},
+            "outline": [],
+            "metadata": {"word_count": len(body.split()), "model_used": "fake-gemini", "status": "success"}
+        }
+        with app.app_context():
+            blog_id = db_service.create_draft(blog, "bench-user", activity={
+                "user": "Bench", "type": "generated", "action_text": "seeded"
+            })
+        if blog_id:
+            ids.setdefault(status, []).append(blog_id)
+    db_service.reconcile_stats()
+
+    # Both load in the background from what was just written
+    deadline = time.time() + 120
+    for component in (LocalCategorizer.get_instance(), SearchIndex.get_instance()):
+        if component.enabled and not component.ready:
+            component.load()
+        while component.enabled and not component.ready and time.time() < deadline:
+            time.sleep(0.1)
+    return ids
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silences the app's print() progress lines (process-wide) while enabled."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# ---------------- LOAD ----------------
+
+class Recorder:
+    """Per-request samples: (scenario route, seconds, status, firestore reads, rpcs)."""
+
+    def __init__(self):
+        self.samples = []
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, route, seconds, status, reads, rpcs):
+        with self._lock:
+            self.samples.append((route, seconds, status, reads, rpcs))
+
+    def error(self, route, message):
+        with self._lock:
+            key = (route, message[:120])
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+class Session:
+    """
+    One simulated user: a logged-in test client that revalidates pages with
+    their ETags like a browser. Samples go to recorder if measuring (an
+    Event) is set when the request starts, and are dropped otherwise.
+    """
+
+    def __init__(self, app, db, recorder, rng, blog_ids, revalidate=True, measuring=None):
+        self.client = app.test_client()
+        self.db = db
+        self.recorder = recorder
+        self.measuring = measuring
+        self.rng = rng
+        self.blog_ids = blog_ids
+        self.revalidate = revalidate
+        self.etags = {}
+        with self.client.session_transaction() as session:
+            session['logged_in'] = True
+            session['user_id'] = f"bench-{rng.randint(0, 10 ** 6)}"
+            session['user_name'] = "Bench"
+
+    def recorder_now(self):
+        """Where a request starting now records its sample (warmup samples go nowhere)."""
+        if self.measuring is None or self.measuring.is_set():
+            return self.recorder
+        return Recorder()
+
+    def request(self, route, method, url, **kwargs):
+        recorder = self.recorder_now()
+        headers = kwargs.pop("headers", {})
+        if self.revalidate and method == "GET" and url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+        counters = self.db.thread_counters() if hasattr(self.db, "thread_counters") else None
+
+        start = time.perf_counter()
+        try:
+            response = self.client.open(url, method=method, headers=headers, **kwargs)
+        except Exception as e:
+            recorder.error(route, f"{type(e).__name__}: {e}")
+            recorder.add(route, time.perf_counter() - start, 599, 0, 0)
+            return None
+        seconds = time.perf_counter() - start
+
+        reads = rpcs = None
+        if counters is not None:
+            after = self.db.thread_counters()
+            reads, rpcs = after["reads"] - counters["reads"], after["rpcs"] - counters["rpcs"]
+        if response.status_code >= 400:
+            recorder.error(route, f"HTTP {response.status_code}")
+        elif response.headers.get("ETag"):
+            self.etags[url] = response.headers["ETag"]
+        recorder.add(route, seconds, response.status_code, reads, rpcs)
+        return response
+
+    def pick(self, *statuses):
+        pool = [blog_id for status in statuses for blog_id in self.blog_ids.get(status, [])]
+        return self.rng.choice(pool) if pool else None
+
+
+# ---------------- SCENARIOS ----------------
+# Each one is a user action: a page load or an API call, as the frontend makes them
+
+def dashboard(s):
+    s.request("dashboard", "GET", "/dashboard")
+    s.request("activity", "GET", "/api/activity?limit=10")
+
+
+def drafts(s):
+    s.request("drafts", "GET", "/drafts")
+
+
+def approval(s):
+    s.request("approval", "GET", "/approval")
+
+
+def edit(s):
+    blog_id = s.pick("DRAFT", "UNDER_REVIEW")
+    if blog_id:
+        s.request("edit", "GET", f"/edit/{blog_id}")
+
+
+def review(s):
+    # Approve or send back a blog waiting for review, or submit a draft
+    blog_id = s.pick("UNDER_REVIEW")
+    if blog_id and s.rng.random() < 0.5:
+        status = s.rng.choice(["PUBLISHED", "DRAFT"])
+        s.request("update_status", "POST", f"/api/update_status/{blog_id}", json={"status": status})
+    else:
+        blog_id = s.pick("DRAFT")
+        if blog_id:
+            s.request("submit_for_review", "POST", f"/api/submit_for_review/{blog_id}")
+
+
+def search(s):
+    query = " ".join(s.rng.sample(WORDS, 2))
+    s.request("search", "GET", f"/api/search?q={query}&limit=10")
+
+
+def activity(s):
+    s.request("activity", "GET", "/api/activity?limit=10")
+
+
+def generate(s):
+    """Submits a prompt and polls the job like create_blog.html; the job's end-to-end time is recorded too."""
+    prompt = f"{s.rng.choice(TOPICS)} {s.rng.randint(0, s.unique_prompts)}"
+    recorder = s.recorder_now()  # The job counts if it was submitted while measuring
+    start = time.perf_counter()
+    response = s.request("generate", "POST", "/api/generate", json={"prompt": prompt})
+    if response is None or response.status_code != 202:
+        return
+    status_url = response.get_json()["status_url"]
+    deadline = time.time() + s.job_timeout
+    while time.time() < deadline:
+        time.sleep(s.poll_interval)
+        poll = s.request("job_status", "GET", status_url)
+        job = poll.get_json() if poll is not None and poll.status_code == 200 else {}
+        if job.get("status") in ("COMPLETED", "FAILED"):
+            route = "generate_job" if job["status"] == "COMPLETED" else "generate_job_failed"
+            recorder.add(route, time.perf_counter() - start, 200, None, None)
+            return
+    recorder.error("generate_job", "timed out")
+
+
+SCENARIOS = {
+    "dashboard": dashboard, "drafts": drafts, "approval": approval, "edit": edit, "review": review,
+    "search": search, "activity": activity, "generate": generate
+}
+
+
+def run_level(app, db, blog_ids, mix, concurrency, duration, warmup, seed_value, options):
+    """
+    Closed-loop load: `concurrency` users each run scenarios drawn from mix
+    (with a per-user seeded RNG) back to back for duration seconds after a
+    warmup. Returns (recorder, elapsed seconds, firestore totals).
+    """
+    scenarios = [name for name in mix if mix[name] > 0]
+    weights = [mix[name] for name in scenarios]
+    recorder = Recorder()
+    measuring = threading.Event()
+    stop = threading.Event()
+
+    def user(index):
+        rng = random.Random(seed_value * 1000 + index)
+        session = Session(app, db, recorder, rng, blog_ids, revalidate=options.revalidate, measuring=measuring)
+        session.unique_prompts = options.unique_prompts
+        session.job_timeout = options.job_timeout
+        session.poll_interval = options.poll_interval
+        while not stop.is_set():
+            SCENARIOS[rng.choices(scenarios, weights)[0]](session)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    with quiet(not options.verbose):
+        for thread in threads:
+            thread.start()
+        time.sleep(warmup)
+        before = db.counters() if hasattr(db, "counters") else None
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(duration)
+        # Requests started from now on (job polls) are not measured
+        measuring.clear()
+        stop.set()
+        elapsed = time.perf_counter() - started
+        after = db.counters() if hasattr(db, "counters") else None
+        for thread in threads:
+            thread.join(timeout=options.job_timeout + 5)
+
+    totals = {k: after[k] - before[k] for k in after} if before is not None else None
+    return recorder, elapsed, totals
+
+
+# ---------------- STATS ----------------
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), int(round(q / 100.0 * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def summarize(recorder, elapsed, totals):
+    """Per-route and overall throughput, latency percentiles (ms) and Firestore work per request."""
+    by_route = {}
+    for route, seconds, status, reads, rpcs in recorder.samples:
+        by_route.setdefault(route, []).append((seconds, status, reads, rpcs))
+
+    def stats(samples):
+        latencies = sorted(s[0] * 1000 for s in samples)
+        reads = [s[2] for s in samples if s[2] is not None]
+        rpcs = [s[3] for s in samples if s[3] is not None]
+        return {
+            "requests": len(samples),
+            "errors": sum(1 for s in samples if s[1] >= 400),
+            "not_modified": sum(1 for s in samples if s[1] == 304),
+            "throughput_rps": round(len(samples) / elapsed, 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "reads_per_request": round(sum(reads) / len(reads), 2) if reads else None,
+            "rpcs_per_request": round(sum(rpcs) / len(rpcs), 2) if rpcs else None
+        }
+
+    routes = {route: stats(samples) for route, samples in sorted(by_route.items())}
+    # Job completion times are not requests
+    requests = [(r, *rest) for r, *rest in recorder.samples if not r.startswith("generate_job")]
+    overall = stats([tuple(s[1:]) for s in requests]) if requests else None
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "overall": overall,
+        "routes": routes,
+        "firestore_totals": totals,
+        "errors": [{"route": route, "error": message, "count": n}
+                   for (route, message), n in sorted(recorder.errors.items())]
+    }
+
+
+def git_revision():
+    try:
+        import subprocess
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_metadata(options):
+    return {
+        "date": datetime.utcnow().isoformat() + "Z",
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "options": {k: v for k, v in vars(options).items() if k not in ("save", "compare", "output")}
+    }
@@ -0,0 +1,184 @@
+"""
+Load test for Scriptly: create_app() on an in-memory Firestore (or the
+emulator) with a deterministic fake Gemini model, driven by concurrent
+logged-in users running a weighted mix of page loads and API calls.
+
+    python -m benchmarks.run --concurrency 1,8,32 --duration 20 --save baseline
+    python -m benchmarks.run --concurrency 1,8,32 --duration 20 --compare baseline
+
+Reports throughput, p50/p95/p99 per route and Firestore reads per request.
+--save writes benchmarks/baselines/<name>.json; --compare exits 1 when a
+route's p95 or reads per request regressed beyond --tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks import harness
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Scriptly load test")
+    parser.add_argument("--concurrency", default="1,8,32",
+                        help="Comma-separated numbers of concurrent users, one run per level")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default="default",
+                        help=f"Traffic mix: one of {', '.join(harness.MIXES)}, or name=weight,... "
+                             f"over {', '.join(harness.SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the data and the users' choices")
+    parser.add_argument("--blogs", type=int, default=500, help="Blogs to seed")
+    parser.add_argument("--firestore", choices=("memory", "emulator"), default="memory",
+                        help="In-memory fake, or the emulator at FIRESTORE_EMULATOR_HOST (reads are n/a)")
+    parser.add_argument("--storage", choices=("firestore", "sqlite"), default="firestore",
+                        help="STORAGE_BACKEND for the run (sqlite uses a temporary file; reads are n/a)")
+    parser.add_argument("--generation", choices=("async", "sync"), default="async",
+                        help="GENERATION_ASYNC for the run: jobs on the event loop, or one worker thread each")
+    parser.add_argument("--firestore-latency", type=float, default=2.0, help="Milliseconds per fake Firestore RPC")
+    parser.add_argument("--llm-latency", type=float, default=300.0, help="Milliseconds before a fake Gemini answer")
+    parser.add_argument("--token-rate", type=float, default=400.0, help="Fake Gemini output tokens per second")
+    parser.add_argument("--llm-rate", type=int, default=6000, help="LLM_RATE_PER_MINUTE for the run")
+    parser.add_argument("--unique-prompts", type=int, default=50,
+                        help="Distinct generate prompts per topic (lower means more LLM cache hits)")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="Seconds between job status polls")
+    parser.add_argument("--job-timeout", type=float, default=60.0, help="Seconds to wait for a generate job")
+    parser.add_argument("--no-revalidate", dest="revalidate", action="store_false",
+                        help="Don't send If-None-Match with the ETags of earlier responses")
+    parser.add_argument("--save", metavar="NAME", help="Save the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME|PATH", help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="Allowed regression in percent for p95 and reads per request")
+    parser.add_argument("--output", metavar="PATH", help="Also write the results as JSON here")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's output")
+    options = parser.parse_args(argv)
+
+    try:
+        options.levels = [int(n) for n in options.concurrency.split(",") if n.strip()]
+        options.mix_weights = parse_mix(options.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    return options
+
+
+def parse_mix(value):
+    if value in harness.MIXES:
+        return dict(harness.MIXES[value])
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in harness.SCENARIOS:
+            raise ValueError(f"unknown scenario '{name.strip()}'")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def baseline_path(name):
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+# ---------------- REPORTING ----------------
+
+def print_level(concurrency, summary):
+    overall = summary["overall"] or {}
+    print(f"\n=== {concurrency} concurrent users: {overall.get('requests', 0)} requests in "
+          f"{summary['elapsed_seconds']}s, {overall.get('throughput_rps', 0)} req/s ===")
+    header = f"{'route':<22}{'count':>7}{'err':>5}{'304':>6}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}" \
+             f"{'p99 ms':>9}{'max ms':>9}{'reads/req':>11}{'rpcs/req':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(summary["routes"].items()) + ([("ALL", overall)] if overall else [])
+    for route, r in rows:
+        print(f"{route:<22}{r['requests']:>7}{r['errors']:>5}{r['not_modified']:>6}{r['throughput_rps']:>8}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}"
+              f"{_na(r['reads_per_request']):>11}{_na(r['rpcs_per_request']):>10}")
+    for error in summary["errors"][:10]:
+        print(f"⚠️  {error['route']}: {error['error']} (x{error['count']})")
+
+
+def _na(value):
+    return "n/a" if value is None else value
+
+
+def compare(results, baseline, tolerance):
+    """Routes whose p95 or reads per request grew more than tolerance percent. Returns the regressions."""
+    regressions = []
+    limit = 1 + tolerance / 100.0
+    for level, summary in results["levels"].items():
+        old_level = baseline["levels"].get(level)
+        if not old_level:
+            print(f"⚠️  No baseline for {level} users")
+            continue
+        print(f"\n--- {level} users vs baseline ({baseline['metadata'].get('revision') or '?'}) ---")
+        for route, new in summary["routes"].items():
+            old = old_level["routes"].get(route)
+            if not old:
+                continue
+            changes = []
+            for metric in ("p95_ms", "reads_per_request", "throughput_rps"):
+                before, after = old.get(metric), new.get(metric)
+                if before is None or after is None:
+                    continue
+                delta = (after - before) / before * 100 if before else 0.0
+                changes.append(f"{metric} {before} -> {after} ({delta:+.1f}%)")
+                # Tiny latencies are noise; 1ms of slack keeps them from flapping
+                worse = after > before * limit and (metric != "p95_ms" or after - before > 1.0)
+                if metric != "throughput_rps" and worse:
+                    regressions.append((level, route, metric, before, after))
+            print(f"{route:<22}" + "; ".join(changes))
+    return regressions
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    backend = "SQLite" if options.storage == "sqlite" else f"{options.firestore} Firestore"
+    print(f"--- Seeding {options.blogs} blogs ({backend}) ---")
+    try:
+        app, db = harness.build_app(options)
+        with harness.quiet(not options.verbose):
+            blog_ids = harness.seed(app, options.blogs, options.seed)
+    except harness.BenchmarkError as e:
+        print(f"❌ {e}")
+        return 2
+
+    results = {"metadata": harness.run_metadata(options), "levels": {}}
+    for concurrency in options.levels:
+        recorder, elapsed, totals = harness.run_level(app, db, blog_ids, options.mix_weights, concurrency,
+                                                      options.duration, options.warmup, options.seed, options)
+        summary = harness.summarize(recorder, elapsed, totals)
+        results["levels"][str(concurrency)] = summary
+        print_level(concurrency, summary)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.save:
+        path = baseline_path(options.save)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Baseline saved to {path}")
+
+    if options.compare:
+        path = baseline_path(options.compare)
+        if not os.path.exists(path):
+            print(f"❌ Baseline not found: {path}")
+            return 2
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {options.tolerance}%:")
+            for level, route, metric, before, after in regressions:
+                print(f"   {level} users {route} {metric}: {before} -> {after}")
+            return 1
+        print(f"\n✅ No regressions beyond {options.tolerance}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Cold-start benchmark: every run is a fresh interpreter that imports the
+app, calls create_app() and serves one request, as a new container does.
+
+    python -m benchmarks.startup --runs 10 --save startup
+    python -m benchmarks.startup --runs 10 --compare startup
+
+Reports the median/p90 of each step and of the whole process (spawn to
+first response), and which heavy SDKs were loaded by then. --profile
+also prints one run's STARTUP_PROFILE breakdown. The default Firestore
+backend is measured against the in-memory fake (loaded on first use, like
+the real client), so nothing is contacted over the network; --storage
+sqlite uses a temporary directory and --real-firestore the configured
+project.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+from benchmarks.run import baseline_path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use; a cold start that serves a page should not need them
+HEAVY_MODULES = ["google.generativeai", "firebase_admin", "google.cloud.firestore", "grpc", "numpy"]
+
+STEPS = ["import", "create_app", "first_response", "process"]
+
+CHILD = """
+import json, os, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+if os.getenv("BENCH_FAKE_FIRESTORE") == "true":
+    # Stands in for the Firestore client; imported (like the SDK) on first use only
+    from app.firebase.firebase_admin import FirebaseLoader
+
+    class LazyFakeFirestore:
+        db = None
+
+        def __getattr__(self, name):
+            if LazyFakeFirestore.db is None:
+                from benchmarks.fake_firestore import FakeFirestore
+                LazyFakeFirestore.db = FakeFirestore()
+            return getattr(LazyFakeFirestore.db, name)
+
+    FirebaseLoader._instance = LazyFakeFirestore()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get({path!r})
+served = time.perf_counter()
+print("RESULT " + json.dumps({{
+    "import": imported - started,
+    "create_app": created - imported,
+    "first_response": served - created,
+    "status": response.status_code,
+    "loaded": [m for m in {heavy!r} if m in sys.modules]
+}}), flush=True)
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Scriptly cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters to start")
+    parser.add_argument("--path", default="/login", help="First request each process serves")
+    parser.add_argument("--storage", choices=("firestore", "sqlite"), default="firestore",
+                        help="STORAGE_BACKEND (firestore runs against an in-memory fake by default)")
+    parser.add_argument("--real-firestore", action="store_true",
+                        help="Connect to the project in FIREBASE_SERVICE_ACCOUNT instead of the fake")
+    parser.add_argument("--warmup-on-start", action="store_true", help="Run with WARMUP_ON_START=true")
+    parser.add_argument("--profile", action="store_true", help="Print one run's STARTUP_PROFILE breakdown")
+    parser.add_argument("--save", metavar="NAME", help="Save the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME|PATH", help="Compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="Allowed regression of the medians in percent")
+    parser.add_argument("--output", metavar="PATH", help="Also write the results as JSON here")
+    return parser.parse_args(argv)
+
+
+def child_env(options, workdir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "STORAGE_BACKEND": options.storage,
+        "SQLITE_PATH": os.path.join(workdir, "scriptly.sqlite3"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+        "CATEGORIZER_PATH": os.path.join(workdir, "categorizer.npz"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.npz"),
+        "WARMUP_ON_START": "true" if options.warmup_on_start else "false",
+        "STARTUP_PROFILE": "false",
+        "BENCH_FAKE_FIRESTORE": "true" if options.storage == "firestore" and not options.real_firestore else "false"
+    })
+    env.setdefault("SECRET_KEY", "benchmark")
+    return env
+
+
+def start_once(options, env):
+    """One cold start. Returns the child's timings plus 'process' (spawn to response)."""
+    code = CHILD.format(path=options.path, heavy=HEAVY_MODULES)
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env, text=True,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    result = None
+    for line in child.stdout:
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+            result["process"] = time.perf_counter() - started
+            break
+    child.kill()
+    child.wait()
+    if result is None:
+        raise harness.BenchmarkError("The app did not start (run it with STARTUP_PROFILE=true to see why).")
+    return result
+
+
+def print_profile(env):
+    env = dict(env, STARTUP_PROFILE="true")
+    code = CHILD.split("flask_app = app.create_app()")[0] + "app.create_app()"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True).stdout
+    start = output.find("--- Startup profile")
+    print(output[start:] if start >= 0 else output)
+
+
+def summarize(samples):
+    summary = {}
+    for step in STEPS:
+        values = sorted(s[step] * 1000 for s in samples)
+        summary[step] = {
+            "median_ms": round(values[len(values) // 2], 1),
+            "p90_ms": round(harness.percentile(values, 90), 1),
+            "min_ms": round(values[0], 1)
+        }
+    summary["loaded"] = {m: sum(m in s["loaded"] for s in samples) for m in HEAVY_MODULES}
+    summary["statuses"] = sorted({s["status"] for s in samples})
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """Steps whose median grew more than tolerance percent (and 5ms). Returns the regressions."""
+    regressions = []
+    limit = 1 + tolerance / 100.0
+    print(f"\n--- vs baseline ({baseline['metadata'].get('revision') or '?'}) ---")
+    for step in STEPS:
+        before = baseline["startup"][step]["median_ms"]
+        after = summary[step]["median_ms"]
+        delta = (after - before) / before * 100 if before else 0.0
+        print(f"{step:<16}median {before} -> {after} ms ({delta:+.1f}%)")
+        if after > before * limit and after - before > 5.0:
+            regressions.append((step, before, after))
+    return regressions
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="scriptly-startup-")
+    env = child_env(options, workdir)
+
+    backend = "firestore (fake)" if env["BENCH_FAKE_FIRESTORE"] == "true" else options.storage
+    print(f"--- {options.runs} cold starts ({backend}, first request GET {options.path}) ---")
+    try:
+        samples = [start_once(options, env) for _ in range(options.runs)]
+    except harness.BenchmarkError as e:
+        print(f"❌ {e}")
+        return 2
+    summary = summarize(samples)
+
+    print(f"{'step':<16}{'median ms':>11}{'p90 ms':>9}{'min ms':>9}")
+    for step in STEPS:
+        s = summary[step]
+        print(f"{step:<16}{s['median_ms']:>11}{s['p90_ms']:>9}{s['min_ms']:>9}")
+    print(f"Status of the first response: {', '.join(str(s) for s in summary['statuses'])}")
+    loaded = [f"{m} ({n}/{options.runs})" for m, n in summary["loaded"].items() if n]
+    print(f"Loaded by the first response: {', '.join(loaded) or 'none'}")
+    if options.profile:
+        print()
+        print_profile(env)
+
+    results = {"metadata": harness.run_metadata(options), "startup": summary}
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if options.save:
+        path = baseline_path(options.save)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Baseline saved to {path}")
+
+    if options.compare:
+        path = baseline_path(options.compare)
+        if not os.path.exists(path):
+            print(f"❌ Baseline not found: {path}")
+            return 2
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, options.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {options.tolerance}%:")
+            for step, before, after in regressions:
+                print(f"   {step}: {before} -> {after} ms")
+            return 1
+        print(f"\n✅ No regressions beyond {options.tolerance}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,116 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
     FIREBASE_SERVICE_ACCOUNT = os.getenv('FIREBASE_SERVICE_ACCOUNT')
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-3-flash-preview')
+
+    # Where blogs, jobs and activity live: 'firestore' or 'sqlite' (one local file, single node).
+    # Copy data between them with `flask copy-storage` (see app/storage/migrate.py)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'firestore').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'instance/scriptly.sqlite3')
+
+    # Keep the in-process category index fresh with a Firestore on_snapshot listener
+    CATEGORY_INDEX_LISTENER = os.getenv('CATEGORY_INDEX_LISTENER', 'true').lower() == 'true'
+
+    # Read-through cache for single blog documents (0 disables it). Edits and deletes made by other
+    # workers or in the Firebase console stay cached until evicted unless the optional listener is on.
+    # It watches the whole blogs collection: every document is read on start and on each reconnect,
+    # and every write is received, so it only pays off for small collections.
+    BLOG_CACHE_SIZE = int(os.getenv('BLOG_CACHE_SIZE', 256))
+    BLOG_CACHE_LISTENER = os.getenv('BLOG_CACHE_LISTENER', 'false').lower() == 'true'
+
+    # Buffer activity feed entries and write them in bulk from a background thread
+    ACTIVITY_WRITE_BEHIND = os.getenv('ACTIVITY_WRITE_BEHIND', 'false').lower() == 'true'
+    # expire_at on activity entries / daily rollups (pair with a Firestore TTL policy on expire_at)
+    ACTIVITY_TTL_DAYS = int(os.getenv('ACTIVITY_TTL_DAYS', 30))
+    ACTIVITY_ROLLUP_TTL_DAYS = int(os.getenv('ACTIVITY_ROLLUP_TTL_DAYS', 365))
+    # Entries older than this are folded into rollups by `flask compact-activity`
+    ACTIVITY_COMPACT_AFTER_DAYS = int(os.getenv('ACTIVITY_COMPACT_AFTER_DAYS', 7))
+
+    # Load the SDKs and open Firestore/Gemini channels in the background once create_app returns,
+    # so the first request that needs them after a deploy is not slow (they are lazy otherwise)
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'false').lower() == 'true'
+    # The categorizer/search index loads and the job/batch resume open storage. They start when a
+    # request first uses storage, or this many seconds after startup at the latest (a quiet worker)
+    BACKGROUND_START_DELAY = float(os.getenv('BACKGROUND_START_DELAY', 10))
+    # Print an import-time breakdown and create_app phase timings at startup
+    STARTUP_PROFILE = os.getenv('STARTUP_PROFILE', 'false').lower() == 'true'
+
+    # Background generation jobs (see app/jobs/job_queue.py)
+    GENERATION_WORKERS = int(os.getenv('GENERATION_WORKERS', 4))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 600))
+    # How often to look for jobs/batches whose worker died mid-run (lease lapsed); 0 = only at startup
+    JOB_SWEEP_SECONDS = int(os.getenv('JOB_SWEEP_SECONDS', 60))
+    # Await Gemini on one asyncio event loop (app/llm/event_loop.py) instead of a worker thread per job
+    GENERATION_ASYNC = os.getenv('GENERATION_ASYNC', 'true').lower() == 'true'
+    # Async jobs running at once (0 = LLM_MAX_CONCURRENCY). More jobs than Gemini can serve would
+    # only queue inside the gateway; the rest wait here, in order, without a deadline
+    GENERATION_MAX_CONCURRENT = int(os.getenv('GENERATION_MAX_CONCURRENT', 0))
+    ASYNC_IO_WORKERS = int(os.getenv('ASYNC_IO_WORKERS', 16))  # Threads for storage calls made by async jobs
+    # How long an Idempotency-Key on /api/generate replays the original job
+    IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', 24))
+
+    # Batch generation (see app/jobs/batch_runner.py)
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))  # Default per-batch parallelism
+    BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', 8))
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+    BATCH_SAVE_CHUNK = int(os.getenv('BATCH_SAVE_CHUNK', 20))  # Drafts created per commit
+    BATCH_RUNNERS = int(os.getenv('BATCH_RUNNERS', 2))  # Batches running at the same time
+
+    # Content expansion: 'single' (one long completion) or 'parallel' (one call per section)
+    CONTENT_EXPANSION_MODE = os.getenv('CONTENT_EXPANSION_MODE', 'single')
+    CONTENT_SECTION_WORKERS = int(os.getenv('CONTENT_SECTION_WORKERS', 6))
+    CONTENT_SECTION_RETRIES = int(os.getenv('CONTENT_SECTION_RETRIES', 2))
+    CONTENT_TARGET_WORDS = int(os.getenv('CONTENT_TARGET_WORDS', 1200))
+
+    # LLM response cache (see app/llm/cache.py)
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'instance/llm_cache.sqlite3')
+    LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 7 * 24 * 3600))
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 512))
+    # Comma separated agents that never use the cache: outline, content, category
+    LLM_CACHE_DISABLED_AGENTS = os.getenv('LLM_CACHE_DISABLED_AGENTS', '').split(',')
+
+    # Local categorizer (see app/ml/categorizer.py): the LLM is only asked below the threshold
+    CATEGORIZER_ENABLED = os.getenv('CATEGORIZER_ENABLED', 'true').lower() == 'true'
+    CATEGORIZER_THRESHOLD = float(os.getenv('CATEGORIZER_THRESHOLD', 0.35))
+    CATEGORIZER_TOP_K = int(os.getenv('CATEGORIZER_TOP_K', 5))  # Candidates offered to the LLM
+    CATEGORIZER_MIN_DOCS = int(os.getenv('CATEGORIZER_MIN_DOCS', 3))  # Blogs a category needs to be predicted
+    CATEGORIZER_FEATURES = int(os.getenv('CATEGORIZER_FEATURES', 2 ** 16))
+    CATEGORIZER_PATH = os.getenv('CATEGORIZER_PATH', 'instance/categorizer.npz')
+    CATEGORIZER_SAVE_EVERY = int(os.getenv('CATEGORIZER_SAVE_EVERY', 25))
+
+    # Observability: Prometheus /metrics, per-stage/per-method timings, trace ids in JSON logs
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Bearer token for /metrics (empty = open)
+    STRUCTURED_LOGS = os.getenv('STRUCTURED_LOGS', 'true').lower() == 'true'  # false = plain text lines
+
+    # BM25 search index behind /api/search (see app/search/index.py)
+    SEARCH_ENABLED = os.getenv('SEARCH_ENABLED', 'true').lower() == 'true'
+    SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'instance/search_index.npz')
+    SEARCH_SAVE_EVERY = int(os.getenv('SEARCH_SAVE_EVERY', 50))  # Changes between snapshots
+    SEARCH_REFRESH_SECONDS = int(os.getenv('SEARCH_REFRESH_SECONDS', 300))  # Pull in writes from other processes (0 = off)
+    SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 50))
+
+    # Gemini call gateway (see app/llm/gateway.py): sized to the API quota
+    LLM_RATE_PER_MINUTE = int(os.getenv('LLM_RATE_PER_MINUTE', 60))
+    LLM_BURST = int(os.getenv('LLM_BURST', 10))
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 120))  # Per-attempt deadline in seconds, from when it is sent
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 300))  # Longest wait (in order) for a rate token and slot
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+    LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 1.0))
+    LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', 20.0))
+    LLM_MIN_CONCURRENCY = int(os.getenv('LLM_MIN_CONCURRENCY', 2))  # Floor when backing off; it starts at the max
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 12))
+    # Calls slower than this per output token shrink the concurrency limit (so do throttling and upstream errors)
+    LLM_SLOW_MS_PER_TOKEN = float(os.getenv('LLM_SLOW_MS_PER_TOKEN', 40))
+    LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', 5))
+    LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+
+    # Response compression (Flask-Compress); brotli is preferred when the client supports it
+    COMPRESS_ALGORITHM = os.getenv('COMPRESS_ALGORITHM', 'br,gzip').split(',')
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 500))
+    # Streamed responses (SSE generation progress) must reach the browser chunk by chunk
+    COMPRESS_STREAMS = False
 
     # Reconstruct the JS object for the frontend
     FIREBASE_CONFIG = {
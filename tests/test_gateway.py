@@ -0,0 +1,378 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.llm.gateway import (
+    AdaptiveLimiter, CircuitBreaker, LLMGateway, LLMTimeoutError, LLMUnavailableError, TokenBucket
+)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+# ---------------- CIRCUIT BREAKER ----------------
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "CLOSED" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "OPEN"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "CLOSED"
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    open_breaker(breaker)
+
+    assert breaker.allow() == "trial"
+    assert breaker.state == "HALF_OPEN"
+    assert not breaker.allow()
+
+
+def test_trial_success_closes_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    open_breaker(breaker)
+    breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "CLOSED"
+    assert breaker.allow() is True
+
+
+def test_trial_failure_reopens_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=5, cooldown=0)
+    open_breaker(breaker)
+    breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "OPEN"
+    breaker.cooldown = 60
+    assert not breaker.allow()
+
+
+def test_released_trial_goes_to_the_next_caller():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    open_breaker(breaker)
+    breaker.allow()
+
+    breaker.release_trial()
+    assert breaker.state == "HALF_OPEN"
+    assert breaker.allow() == "trial"
+
+
+# ---------------- GATEWAY ----------------
+
+class FakeModel:
+    def __init__(self, chunks=(), stall=None):
+        self.chunks = list(chunks)
+        self.stall = stall
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if not stream:
+            return "text"
+        return self._stream()
+
+    def _stream(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.stall is not None:
+            self.stall.wait()
+
+
+def half_open_gateway(**options):
+    gateway = LLMGateway(breaker_failures=1, breaker_cooldown=0, **options)
+    open_breaker(gateway.breaker)
+    return gateway
+
+
+def test_trial_is_released_when_waiting_for_a_slot_times_out():
+    gateway = half_open_gateway(min_concurrency=1, max_concurrency=1, queue_timeout=0.05)
+    gateway.limiter.in_flight = 1  # Every slot taken
+
+    with pytest.raises(LLMTimeoutError):
+        gateway.generate(FakeModel(), "prompt")
+
+    assert gateway.breaker.state == "HALF_OPEN"
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_trial_is_released_when_waiting_for_the_rate_limit_times_out():
+    gateway = half_open_gateway(rate_per_minute=1, burst=1, queue_timeout=0.05)
+    gateway.bucket.tokens = 0
+
+    with pytest.raises(LLMTimeoutError):
+        gateway.generate(FakeModel(), "prompt")
+
+    assert gateway.bucket.tokens >= 0  # Nothing was reserved
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_open_circuit_rejects_without_calling():
+    gateway = LLMGateway(breaker_failures=1, breaker_cooldown=60)
+    open_breaker(gateway.breaker)
+
+    with pytest.raises(LLMUnavailableError):
+        gateway.generate(FakeModel(), "prompt")
+    assert gateway.stats()["calls"] == 0
+
+
+def wait_until(condition, timeout=2):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_stalled_stream_times_out_and_frees_its_slot_once_the_read_returns():
+    stall = threading.Event()
+    gateway = LLMGateway()
+    chunks = []
+    try:
+        with pytest.raises(LLMTimeoutError):
+            for chunk in gateway.stream(FakeModel(["a", "b"], stall=stall), "prompt", timeout=0.2):
+                chunks.append(chunk)
+        # The read is still stuck in the SDK: its thread keeps the slot
+        assert gateway.limiter.in_flight == 1
+    finally:
+        stall.set()
+
+    assert chunks == ["a", "b"]
+    assert wait_until(lambda: gateway.limiter.in_flight == 0)
+    assert gateway.stats()["timeouts"] == 1
+
+
+class HangingModel:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.release.wait()
+        return "text"
+
+
+def test_hung_calls_keep_their_slots_so_the_pool_never_fills():
+    gateway = LLMGateway(min_concurrency=2, max_concurrency=2, timeout=0.05, queue_timeout=0.1, max_retries=0)
+    model = HangingModel()
+    try:
+        for _ in range(2):
+            with pytest.raises(LLMTimeoutError):
+                gateway.generate(model, "prompt")
+        # Both pool threads are stuck, so the next call is not sent into a full pool
+        with pytest.raises(LLMTimeoutError, match="slot"):
+            gateway.generate(FakeModel(), "prompt")
+        assert gateway.stats()["calls"] == 2
+    finally:
+        model.release.set()
+
+    assert wait_until(lambda: gateway.limiter.in_flight == 0)
+    assert gateway.generate(FakeModel(), "prompt") == "text"
+
+
+def test_closed_stream_is_not_counted_as_a_success():
+    gateway = half_open_gateway()
+    stream = gateway.stream(FakeModel(["a", "b"]), "prompt")
+    assert next(stream) == "a"
+
+    stream.close()
+    assert gateway.limiter.in_flight == 0
+    assert gateway.stats()["succeeded"] == 0
+    assert gateway.breaker.state == "HALF_OPEN"
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_finished_stream_closes_the_circuit():
+    gateway = half_open_gateway()
+    assert list(gateway.stream(FakeModel(["a", "b"]), "prompt")) == ["a", "b"]
+
+    assert gateway.breaker.state == "CLOSED"
+    assert gateway.limiter.in_flight == 0
+
+
+# ---------------- ASYNC GATEWAY ----------------
+
+class FakeAsyncModel:
+    def __init__(self, chunks=(), delay=0, stall=0):
+        self.chunks = list(chunks)
+        self.delay = delay
+        self.stall = stall
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        await asyncio.sleep(self.delay)
+        if not stream:
+            return "text"
+        return self._stream()
+
+    async def _stream(self):
+        for chunk in self.chunks:
+            yield chunk
+        await asyncio.sleep(self.stall)
+
+
+def test_async_trial_is_released_when_waiting_for_a_slot_times_out():
+    gateway = half_open_gateway(min_concurrency=1, max_concurrency=1, queue_timeout=0.05)
+    gateway.limiter.in_flight = 1
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(gateway.generate_async(FakeAsyncModel(), "prompt"))
+
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_cancelled_async_trial_is_released():
+    gateway = half_open_gateway()
+
+    async def cancel_mid_call():
+        task = asyncio.ensure_future(gateway.generate_async(FakeAsyncModel(delay=10), "prompt"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_mid_call())
+    assert gateway.limiter.in_flight == 0
+    assert gateway.breaker.state == "HALF_OPEN"
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_closed_async_stream_is_not_counted_as_a_success():
+    gateway = half_open_gateway()
+
+    async def read_one():
+        stream = gateway.stream_async(FakeAsyncModel(["a", "b"]), "prompt")
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+
+    asyncio.run(read_one())
+    assert gateway.limiter.in_flight == 0
+    assert gateway.stats()["succeeded"] == 0
+    assert gateway.breaker.allow() == "trial"
+
+
+def test_stalled_async_stream_times_out():
+    gateway = LLMGateway()
+
+    chunks = []
+
+    async def read_all():
+        async for chunk in gateway.stream_async(FakeAsyncModel(["a"], stall=10), "prompt", timeout=0.2):
+            chunks.append(chunk)
+
+    with pytest.raises(LLMTimeoutError):
+        asyncio.run(read_all())
+    assert chunks == ["a"]
+    assert gateway.limiter.in_flight == 0
+    assert gateway.stats()["timeouts"] == 1
+
+
+# ---------------- QUEUEING ----------------
+
+def test_rate_limit_serves_callers_in_order():
+    bucket = TokenBucket(rate_per_minute=600, burst=1)
+    waits = [bucket._reserve(time.monotonic() + 10) for _ in range(3)]
+    assert waits[0] == 0
+    assert waits[0] < waits[1] < waits[2]
+
+
+def test_slots_are_handed_over_in_arrival_order():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=1, slow_per_token=0.04)
+    order = []
+
+    async def call(name):
+        await limiter.acquire_async(time.monotonic() + 5)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        limiter.release()
+
+    async def run():
+        await asyncio.gather(*(call(i) for i in range(5)))
+
+    asyncio.run(run())
+    assert order == list(range(5))
+    assert limiter.in_flight == 0
+
+
+def test_cancelled_slot_waiter_leaves_the_queue():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=1, slow_per_token=0.04)
+    limiter.in_flight = 1
+
+    async def run():
+        task = asyncio.ensure_future(limiter.acquire_async(time.monotonic() + 5))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert not limiter._waiters
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_queued_time_does_not_count_against_the_call_deadline():
+    # More calls than the rate limit lets through within one call timeout
+    gateway = LLMGateway(rate_per_minute=6000, burst=10, timeout=0.3, min_concurrency=4, max_concurrency=4)
+
+    async def run():
+        return await asyncio.gather(
+            *(gateway.generate_async(FakeAsyncModel(delay=0.02), "prompt") for _ in range(100)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert results == ["text"] * 100
+    assert gateway.breaker.failures == 0
+
+
+# ---------------- ADAPTIVE LIMIT ----------------
+
+def test_limit_starts_at_the_max():
+    assert AdaptiveLimiter(min_limit=2, max_limit=12, slow_per_token=0.04).limit == 12
+
+
+def test_long_completion_at_a_normal_pace_does_not_shrink_the_limit():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=12, slow_per_token=0.04)
+    limiter.in_flight = 1
+    # 60 seconds for 1600 tokens is ~38ms a token
+    limiter.release(limiter.outcome(latency=60, tokens=1600))
+    assert limiter.limit == 12
+
+
+def test_slow_tokens_and_throttling_shrink_the_limit():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=10, slow_per_token=0.04)
+    limiter.in_flight = 2
+    limiter.release(limiter.outcome(latency=20, tokens=200))
+    assert limiter.limit == 7
+    limiter.release("overloaded")
+    assert limiter.limit == pytest.approx(4.9)
+
+
+def test_short_outputs_are_not_judged_per_token():
+    limiter = AdaptiveLimiter(min_limit=2, max_limit=10, slow_per_token=0.04)
+    assert limiter.outcome(latency=2, tokens=5) == "ok"
+
+
+def test_queue_timeouts_do_not_count_as_upstream_failures():
+    gateway = LLMGateway(min_concurrency=1, max_concurrency=1, queue_timeout=0.02)
+    gateway.limiter.in_flight = 1
+
+    for _ in range(gateway.breaker.failure_threshold + 1):
+        with pytest.raises(LLMTimeoutError):
+            gateway.generate(FakeModel(), "prompt")
+    assert gateway.breaker.state == "CLOSED"
+    assert gateway.breaker.failures == 0
+    assert gateway.limiter.limit == 1
@@ -5,8 +5,7 @@ from flask import Flask
 
 # Import system components
 from config import Config
-from app.firebase.firebase_admin import FirebaseLoader
-from app.firebase.firestore_service import FirestoreService  # New Import
+from app.registry import ClientRegistry
 from app.agents.blog_agent import BlogAgent
 
 def verify_all():
@@ -21,9 +20,8 @@ def verify_all():
         # 1. TEST FIREBASE ADMIN SDK & FIRESTORE SERVICE
         print("\n[1/3] Initializing Firestore Service...")
         try:
-            # This ensures the Firebase Admin SDK starts
-            FirebaseLoader.get_instance(app.config['FIREBASE_SERVICE_ACCOUNT'])
-            db_service = FirestoreService()
+            # Clients are lazy: resolve() starts the Firebase Admin SDK and the storage service now
+            db_service = ClientRegistry.configure(app.config).db_service.resolve()
             print("✅ FIREBASE: Service initialized and connected.")
         except Exception as e:
             print(f"❌ FIREBASE ERROR: {e}")